@@ -1,25 +1,534 @@
-import pyaudio
 import numpy as np
 import logging
 import collections
+import threading
 import time
 from model_inference import run_inference  # Import model inference module
+from detection_cascade import CALIBRATION_OFFSET_DB
+import metrics
+
+try:
+    import pyaudio
+except ImportError:  # Headless use: file, synthetic and network sources still work
+    pyaudio = None
+
+
+class RingBuffer:
+    """
+    Preallocated float32 ring buffer shared by one producer and one consumer.
+
+    The producer only ever advances `write_pos` and the consumer only ever advances
+    `read_pos` (both count samples since the start of the stream), so no lock is needed.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self._data = np.zeros(self.capacity, dtype=np.float32)
+        self._bytes = memoryview(self._data).cast("B")
+        self.itemsize = self._data.itemsize
+        self.write_pos = 0
+        self.read_pos = 0
+        self.overruns = 0  # Times the consumer fell more than a buffer behind
+        self.dropped_samples = 0  # Samples overwritten before they were read
+        self.underruns = 0  # Reads that found fewer samples than requested
+
+    def write(self, samples):
+        """
+        Copy float32 samples into the buffer (producer side).
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        self.write_bytes(memoryview(samples).cast("B"))
+
+    def write_bytes(self, raw):
+        """
+        Copy raw float32 bytes (as delivered by PyAudio) into the buffer without
+        creating an intermediate array.
+        """
+        raw = memoryview(raw).cast("B")
+        n = len(raw) // self.itemsize
+        if n > self.capacity:
+            # Only the newest `capacity` samples can be kept
+            raw = raw[(n - self.capacity) * self.itemsize:]
+            self.write_pos += n - self.capacity
+            n = self.capacity
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._bytes[start * self.itemsize:(start + first) * self.itemsize] = raw[:first * self.itemsize]
+        if first < n:
+            self._bytes[:(n - first) * self.itemsize] = raw[first * self.itemsize:n * self.itemsize]
+        self.write_pos += n
+
+    def available(self):
+        """
+        Number of unread samples.
+        """
+        return self.write_pos - self.read_pos
+
+    def check_overrun(self):
+        lag = self.write_pos - self.read_pos
+        if lag > self.capacity:
+            # Skip ahead so the unread region is the newest half of the buffer
+            skip_to = self.write_pos - self.capacity // 2
+            self.overruns += 1
+            self.dropped_samples += skip_to - self.read_pos
+            metrics.inc("dropped_samples_total", skip_to - self.read_pos)
+            self.read_pos = skip_to
+
+    def release(self, pos):
+        """
+        Mark everything before absolute position `pos` as consumed. Consumers that keep
+        a history behind their read cursor use this instead of `read`.
+        """
+        if pos > self.read_pos:
+            self.read_pos = min(pos, self.write_pos)
+
+    def copy_at(self, pos, n, out):
+        """
+        Copy `n` samples starting at absolute stream position `pos` into `out`.
+        Returns False if that region has already been overwritten or not yet written.
+        """
+        if pos < self.write_pos - self.capacity or pos + n > self.write_pos:
+            return False
+        start = pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._data[start:start + first]
+        if first < n:
+            out[first:n] = self._data[:n - first]
+        # The producer may have lapped us while we were copying
+        return pos >= self.write_pos - self.capacity
+
+    def read(self, n, out=None, advance=None):
+        """
+        Copy the next `n` unread samples into `out` and advance the read position by
+        `advance` samples (defaults to `n`; use a smaller value for overlapping windows).
+        Returns None when fewer than `n` samples are available.
+        """
+        self.check_overrun()
+        if self.available() < n:
+            self.underruns += 1
+            return None
+        if out is None:
+            out = np.empty(n, dtype=np.float32)
+        if not self.copy_at(self.read_pos, n, out):
+            self.check_overrun()
+            return None
+        self.read_pos += n if advance is None else advance
+        return out[:n]
+
+    def latest(self, n, out=None):
+        """
+        Copy the newest `n` samples into `out` without consuming anything.
+        """
+        n = min(n, self.write_pos, self.capacity)
+        if out is None:
+            out = np.empty(n, dtype=np.float32)
+        self.copy_at(self.write_pos - n, n, out)
+        return out[:n]
+
+    def stats(self):
+        return {
+            "written": self.write_pos,
+            "read": self.read_pos,
+            "overruns": self.overruns,
+            "dropped_samples": self.dropped_samples,
+            "underruns": self.underruns,
+        }
+
+
+class SharedRingBuffer(RingBuffer):
+    """
+    RingBuffer in a multiprocessing.shared_memory block, so one process can capture into
+    it while others read windows in place.
+
+    The write and read positions live in the block's header and double as sequence
+    numbers: readers address audio by absolute stream position and, once done with a
+    window, call `valid(pos)` to learn whether the writer lapped it in the meantime.
+    Like a seqlock, the writer publishes the end of the region it is about to overwrite
+    before copying and the new write position after, so `valid` also fails for a window
+    that is being overwritten while it is read. The
+    first `mirror` samples are repeated after the end of the buffer, so `view` returns
+    any window of up to `mirror` samples as a contiguous array without copying. Create
+    the buffer in the owning process; other processes attach by `name` (passing the
+    buffer to a multiprocessing.Process does this). Only the owner unlinks the block.
+    """
+
+    HEADER = 5  # int64 slots: write_pos, read_pos, capacity, mirror, reserved_pos
+
+    def __init__(self, capacity=None, mirror=0, name=None):
+        from multiprocessing import shared_memory
+
+        self.owner = name is None
+        if self.owner:
+            capacity, mirror = int(capacity), int(mirror)
+            size = self.HEADER * 8 + (capacity + mirror) * np.dtype(np.float32).itemsize
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._header = np.ndarray(self.HEADER, dtype=np.int64, buffer=self._shm.buf)
+        if self.owner:
+            self._header[:] = (0, 0, capacity, mirror, 0)
+        self.capacity = int(self._header[2])
+        self.mirror = int(self._header[3])
+        self._storage = np.ndarray(self.capacity + self.mirror, dtype=np.float32, buffer=self._shm.buf,
+                                   offset=self.HEADER * 8)
+        self._data = self._storage[:self.capacity]
+        self._bytes = memoryview(self._data).cast("B")
+        self.itemsize = self._data.itemsize
+        self.overruns = 0
+        self.dropped_samples = 0
+        self.underruns = 0
+
+    def __reduce__(self):
+        # Child processes attach to the same block instead of receiving a copy
+        return SharedRingBuffer, (None, 0, self.name)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def write_pos(self):
+        return int(self._header[0])
+
+    @write_pos.setter
+    def write_pos(self, value):
+        self._header[0] = value
+
+    @property
+    def read_pos(self):
+        return int(self._header[1])
+
+    @read_pos.setter
+    def read_pos(self, value):
+        self._header[1] = value
+
+    @property
+    def reserved_pos(self):
+        """
+        End of the region the writer may be overwriting; equals write_pos between writes.
+        """
+        return int(self._header[4])
+
+    def write_bytes(self, raw):
+        raw = memoryview(raw).cast("B")
+        n = len(raw) // self.itemsize
+        pos = self.write_pos
+        if n > self.capacity:
+            raw = raw[(n - self.capacity) * self.itemsize:]
+            pos += n - self.capacity
+            n = self.capacity
+        samples = np.frombuffer(raw, dtype=np.float32, count=n)
+        # Announce the overwrite before touching any sample
+        self._header[4] = pos + n
+        start = pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        if first < n:
+            self._data[:n - first] = samples[first:]
+        # Keep the mirrored copy of the buffer's head in step
+        for lo, hi in ((start, start + first), (0, n - first)):
+            hi = min(hi, self.mirror)
+            if lo < hi:
+                self._storage[self.capacity + lo:self.capacity + hi] = self._data[lo:hi]
+        # Publish the new position only once the samples are in place
+        self.write_pos = pos + n
+
+    def view(self, pos, n):
+        """
+        Read-only view of `n` samples from absolute position `pos`, without copying.
+        Returns None if the region is not in the buffer or `n` exceeds the mirror.
+        Check `valid(pos)` after using the view.
+        """
+        write_pos = self.write_pos
+        if pos < self.reserved_pos - self.capacity or pos + n > write_pos:
+            return None
+        start = pos % self.capacity
+        if start + n > self.capacity + self.mirror:
+            return None
+        view = self._storage[start:start + n]
+        view.flags.writeable = False
+        return view
+
+    def valid(self, pos):
+        """
+        True while the audio at absolute position `pos` has not been overwritten, nor is
+        being overwritten.
+        """
+        return pos >= self.reserved_pos - self.capacity
+
+    def close(self):
+        """
+        Detach from the block (views must be released first); the owner also unlinks it.
+        """
+        self._bytes.release()
+        self._header = self._storage = self._data = self._bytes = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+
+class DeviceSource:
+    """
+    Captures from a PyAudio input device in callback mode straight into a RingBuffer.
+    """
+
+    def __init__(self, device_index=None, rate=44100, chunk=2048, channels=1):
+        self.device_index = device_index
+        self.rate = rate
+        self.chunk = chunk
+        self.channels = channels
+        self.p = None
+        self.stream = None
+        self.ring = None
+        self.input_overflows = 0
+
+    def _callback(self, in_data, frame_count, time_info, status_flags):
+        self.ring.write_bytes(in_data)
+        if status_flags & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+            metrics.inc("input_overflows_total")
+        return None, pyaudio.paContinue
+
+    def start(self, ring):
+        if pyaudio is None:
+            raise RuntimeError("PyAudio is required to capture from an input device")
+        self.ring = ring
+        self.p = pyaudio.PyAudio()
+        self.stream = self.p.open(format=pyaudio.paFloat32,
+                                  channels=self.channels,
+                                  rate=self.rate,
+                                  input=True,
+                                  frames_per_buffer=self.chunk,
+                                  input_device_index=self.device_index,
+                                  stream_callback=self._callback)
+        self.stream.start_stream()
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.p:
+            self.p.terminate()
+            self.p = None
+
+
+class _ThreadedSource:
+    """
+    Base class for sources that feed the ring buffer from a background thread,
+    either paced at real time or as fast as the consumer allows.
+    """
+
+    def __init__(self, rate=44100, chunk=2048, realtime=True):
+        self.rate = rate
+        self.chunk = chunk
+        self.realtime = realtime
+        self.input_overflows = 0
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def blocks(self):
+        raise NotImplementedError
+
+    def _run(self, ring):
+        period = self.chunk / self.rate
+        next_time = time.monotonic()
+        for block in self.blocks():
+            if self._stop.is_set():
+                break
+            if not self.realtime:
+                # Never overwrite unread audio when replaying faster than real time
+                while ring.write_pos + len(block) - ring.read_pos > ring.capacity and not self._stop.is_set():
+                    time.sleep(period / 4)
+            ring.write(block)
+            if self.realtime:
+                next_time += len(block) / self.rate
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        self.finished.set()
+
+    def start(self, ring):
+        self._stop.clear()
+        self.finished.clear()
+        self._thread = threading.Thread(target=self._run, args=(ring,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+
+class FileSource(_ThreadedSource):
+    """
+    Replays a WAV file (resampled to the capture rate) as if it came from a microphone.
+    """
+
+    def __init__(self, path, rate=44100, chunk=2048, realtime=True, loop=False):
+        super().__init__(rate=rate, chunk=chunk, realtime=realtime)
+        self.path = path
+        self.loop = loop
+
+    def blocks(self):
+        import librosa
+        audio, _ = librosa.load(self.path, sr=self.rate, mono=True)
+        audio = audio.astype(np.float32)
+        while True:
+            for start in range(0, len(audio), self.chunk):
+                yield audio[start:start + self.chunk]
+            if not self.loop:
+                break
+
+
+class SyntheticSource(_ThreadedSource):
+    """
+    Generates background noise with short impulsive bursts every `burst_interval` seconds.
+    """
+
+    def __init__(self, rate=44100, chunk=2048, realtime=True, duration=None,
+                 noise_level=0.01, burst_interval=3.0, burst_level=0.8, seed=0):
+        super().__init__(rate=rate, chunk=chunk, realtime=realtime)
+        self.duration = duration
+        self.noise_level = noise_level
+        self.burst_interval = burst_interval
+        self.burst_level = burst_level
+        self.seed = seed
+
+    def blocks(self):
+        rng = np.random.default_rng(self.seed)
+        burst_len = int(0.05 * self.rate)
+        burst = (self.burst_level * rng.standard_normal(burst_len)
+                 * np.exp(-np.arange(burst_len) / (0.01 * self.rate))).astype(np.float32)
+        interval = int(self.burst_interval * self.rate) if self.burst_interval else 0
+        total = int(self.duration * self.rate) if self.duration else None
+        pos = 0
+        while total is None or pos < total:
+            block = (self.noise_level * rng.standard_normal(self.chunk)).astype(np.float32)
+            if interval:
+                # Mix in any bursts overlapping this block
+                first = (pos // interval) * interval
+                for onset in range(first, pos + self.chunk, interval):
+                    lo = max(onset, pos)
+                    hi = min(onset + burst_len, pos + self.chunk)
+                    if onset > 0 and lo < hi:
+                        block[lo - pos:hi - pos] += burst[lo - onset:hi - onset]
+            if total is not None:
+                block = block[:total - pos]
+            pos += len(block)
+            yield block
+
+
+class NetworkSource:
+    """
+    Receives little-endian float32 mono PCM over UDP datagrams or a TCP stream
+    (see pcm_sender.py) and writes it straight into the ring buffer.
+    """
+
+    def __init__(self, port, host="127.0.0.1", protocol="udp", rate=44100, chunk=2048):
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.rate = rate
+        self.chunk = chunk
+        self.input_overflows = 0
+        self.bytes_received = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._socket = None
+
+    def start(self, ring):
+        import socket
+        kind = socket.SOCK_DGRAM if self.protocol == "udp" else socket.SOCK_STREAM
+        self._socket = socket.socket(socket.AF_INET, kind)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.settimeout(0.5)
+        if self.protocol != "udp":
+            self._socket.listen(1)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(ring,), daemon=True)
+        self._thread.start()
+
+    def _receive(self, conn, ring, buffer):
+        view = memoryview(buffer)
+        leftover = 0  # Bytes of a partial sample carried over from the previous read
+        while not self._stop.is_set():
+            try:
+                n = conn.recv_into(view[leftover:])
+            except TimeoutError:
+                continue
+            except OSError:
+                return
+            if n == 0 and self.protocol != "udp":
+                return  # Sender disconnected
+            self.bytes_received += n
+            n += leftover
+            usable = n - n % ring.itemsize
+            ring.write_bytes(view[:usable])
+            leftover = n - usable
+            if leftover:
+                view[:leftover] = view[usable:n]
+
+    def _run(self, ring):
+        buffer = bytearray(self.chunk * ring.itemsize * 4)
+        if self.protocol == "udp":
+            self._receive(self._socket, ring, buffer)
+            return
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._socket.accept()
+            except (TimeoutError, OSError):
+                continue
+            with conn:
+                conn.settimeout(0.5)
+                self._receive(conn, ring, buffer)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
 
 
 class AudioCapture:
-    FORMAT = pyaudio.paFloat32
+    FORMAT = pyaudio.paFloat32 if pyaudio is not None else None
     CHANNELS = 1
     RATE = 44100
     CHUNK = 2048  # Buffer size
     DEVICE_INDEX = 0  # Default device (adjust as needed)
+    BUFFER_SECONDS = 10  # Ring buffer length
 
-    def __init__(self, threshold_db=-27, cooldown_time=2):
-        self.p = pyaudio.PyAudio()
-        self.stream = None
-        self.threshold_db = threshold_db
+    def __init__(self, threshold_db=-27, cooldown_time=2, source=None, buffer_seconds=BUFFER_SECONDS,
+                 cascade=None, calibration_offset_db=CALIBRATION_OFFSET_DB, ring=None):
+        self.source = source
+        self.threshold_db = threshold_db  # dBFS; only used when no cascade is configured
+        self.cascade = cascade
+        self.calibration_offset_db = calibration_offset_db
         self.cooldown_time = cooldown_time
         self.last_detection_time = 0
         self.rms_values = collections.deque(maxlen=10)
+        # A SharedRingBuffer lets other processes read the captured audio
+        self.ring = ring if ring is not None else RingBuffer(int(buffer_seconds * self.RATE))
+        self._chunk_buffer = np.empty(self.CHUNK, dtype=np.float32)
+        self.started = False
+
+    def start(self):
+        """
+        Start filling the ring buffer from the configured source (the default input
+        device in callback mode if none was given).
+        """
+        if self.started:
+            return
+        if self.source is None:
+            self.source = DeviceSource(self.DEVICE_INDEX, rate=self.RATE, chunk=self.CHUNK, channels=self.CHANNELS)
+        self.source.start(self.ring)
+        self.started = True
 
     def get_rms(self, indata):
         return np.sqrt(np.mean(np.square(indata)))
@@ -31,39 +540,86 @@ class AudioCapture:
     def calculate_db(self, rms):
         return 20 * np.log10(rms) if rms > 0 else -np.inf
 
+    def to_spl(self, db):
+        """
+        Convert a dBFS reading to calibrated dB SPL.
+        """
+        return None if db is None else db + self.calibration_offset_db
+
+    def should_trigger(self, block, volume_db):
+        """
+        Decide whether `block` is worth scoring: the detection cascade when one is
+        configured, otherwise the plain dBFS level threshold.
+        """
+        if self.cascade is not None:
+            return self.cascade.evaluate(block)
+        return volume_db > self.threshold_db
+
+    def read_window(self, n, hop=None, out=None, timeout=None):
+        """
+        Wait until `n` unread samples are available and copy them into `out`, advancing
+        by `hop` samples. Returns None on timeout or once a finite source is exhausted.
+        """
+        self.ring.check_overrun()
+        if not self.wait_for(self.ring.read_pos + n, timeout=timeout):
+            return None
+        return self.ring.read(n, out=out, advance=hop)
+
+    def wait_for(self, pos, timeout=None):
+        """
+        Block until the stream has been written up to absolute position `pos`.
+        Returns False on timeout or once a finite source is exhausted.
+        """
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        poll = self.CHUNK / self.RATE / 4
+        with metrics.timer("capture_wait_seconds"):
+            while self.ring.write_pos < pos:
+                finished = getattr(self.source, "finished", None)
+                if finished is not None and finished.is_set() and self.ring.write_pos < pos:
+                    return False
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.ring.underruns += 1
+                    return False
+                time.sleep(poll)
+        return True
+
     def get_audio_data(self):
         try:
-            if self.stream is None:
-                self.stream = self.p.open(format=self.FORMAT,
-                                          channels=self.CHANNELS,
-                                          rate=self.RATE,
-                                          input=True,
-                                          frames_per_buffer=self.CHUNK,
-                                          input_device_index=self.DEVICE_INDEX)
-            data = np.frombuffer(self.stream.read(self.CHUNK, exception_on_overflow=False), dtype=np.float32)
+            data = self.read_window(self.CHUNK, out=self._chunk_buffer, timeout=1.0)
+            if data is None:
+                return None, None
             rms = self.get_rms(data)
             smoothed_rms = self.moving_average(rms)
             volume_db = self.calculate_db(smoothed_rms)
     
             # Always return the volume_db for real-time display
-            if volume_db > self.threshold_db and (time.time() - self.last_detection_time > self.cooldown_time):
+            if (time.time() - self.last_detection_time > self.cooldown_time) and self.should_trigger(data, volume_db):
                 self.last_detection_time = time.time()
-                return data, volume_db  # Return data and volume when threshold is exceeded
+                metrics.inc("triggers_total")
+                return data.copy(), volume_db  # Return data and volume when threshold is exceeded
     
             # If threshold is not exceeded, return None for data but still return volume
             return None, volume_db
     
         except Exception as e:
-            print(f"Error capturing audio data: {e}")
+            logging.error(f"Error capturing audio data: {e}")
             return None, None
 
-
+    def stats(self):
+        """
+        Overrun/underrun counters for the capture path.
+        """
+        stats = self.ring.stats()
+        stats["input_overflows"] = getattr(self.source, "input_overflows", 0)
+        if self.cascade is not None:
+            stats["cascade"] = self.cascade.stats()
+        return stats
 
     def cleanup(self):
-        if self.stream:
-            self.stream.stop_stream()
-            self.stream.close()
-        self.p.terminate()
+        if self.source is not None:
+            self.source.stop()
+        self.started = False
 
 
 def start_audio_stream_process():
@@ -71,18 +627,21 @@ def start_audio_stream_process():
     print("Audio stream started... Press Ctrl+C to stop.")
     try:
         while True:
+            # Blocks until the next chunk is in the ring buffer; capture keeps running meanwhile
             audio_data, volume_db = audio_capture.get_audio_data()
+            if volume_db is None:
+                continue
             print(f"Volume: {volume_db:.2f} dB")
             if audio_data is not None:
                 print(f"LOUD SOUND DETECTED! Volume: {volume_db:.2f} dB")
                 label, confidence = run_inference(audio_data)
                 print(f"Prediction: {label} | Confidence: {confidence:.2f}%")
-            time.sleep(0.1)
     except KeyboardInterrupt:
         print("KeyboardInterrupt received. Exiting audio stream.")
     except Exception as e:
         logging.error(f"Error during audio stream process: {e}")
     finally:
+        print(f"Capture stats: {audio_capture.stats()}")
         audio_capture.cleanup()
         print("Audio stream stopped.")
 
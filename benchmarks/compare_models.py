@@ -0,0 +1,201 @@
+"""
+Side-by-side comparison of registered model variants on a WAV set: model size, load
+time, single-window latency, batched throughput, peak RSS, and how well each variant
+agrees with the reference (first) model. When files sit under a directory named after a
+class label (e.g. `Gunshot/`, `Other/`), clip-level accuracy is reported as well.
+
+Each model is measured in a fresh process so memory figures are not shared.
+
+    python benchmarks/compare_models.py recordings/ [--models float int8] [--hop 0.5] [--output compare.json]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_windows(paths, hop_seconds):
+    import soundfile as sf
+    from model_inference import split_windows
+
+    windows = {}
+    for path in paths:
+        audio, sr = sf.read(path, dtype="float32", always_2d=True)
+        audio = audio.mean(axis=1) * 32768.0
+        windows[path] = split_windows(audio, sr, int(hop_seconds * sr))
+    return windows
+
+
+def probe(model, paths, hop_seconds, threads, batch_size):
+    """
+    Measure one model in this process and return its results as a dict.
+    """
+    import model_inference
+    windows = load_windows(paths, hop_seconds)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    model_path, labels = model_inference.resolve_model(model)
+    start = time.perf_counter()
+    single = model_inference.BatchScorer(model_path, num_threads=threads, labels=labels)
+    load_s = time.perf_counter() - start
+    batched = model_inference.BatchScorer(model_path, num_threads=threads, labels=labels)
+
+    latencies = []
+    predictions = {}
+    for path, file_windows in windows.items():
+        file_labels, file_confidences = [], []
+        for window in file_windows:
+            t = time.perf_counter()
+            label, confidence = single.score(window, batch_size=1)
+            latencies.append(time.perf_counter() - t)
+            file_labels.append(str(label[0]))
+            file_confidences.append(float(confidence[0]))
+        predictions[path] = {"labels": file_labels, "confidences": file_confidences}
+
+    # Batched throughput, one run per window length (files may differ in sample rate)
+    by_length = {}
+    for file_windows in windows.values():
+        if len(file_windows):
+            by_length.setdefault(file_windows.shape[1], []).append(file_windows)
+    scored, elapsed = 0, 0.0
+    for groups in by_length.values():
+        stacked = np.concatenate(groups)
+        batched.score(stacked[:batch_size], batch_size=batch_size)  # Warm up the resized interpreter
+        t = time.perf_counter()
+        batched.score(stacked, batch_size=batch_size)
+        elapsed += time.perf_counter() - t
+        scored += len(stacked)
+    throughput = scored / elapsed if elapsed else None
+
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "model": model,
+        "path": model_path,
+        "size_kb": os.path.getsize(model_path) / 1024,
+        "load_s": load_s,
+        "windows": len(latencies),
+        "latency_p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+        "latency_p95_ms": float(np.percentile(latencies_ms, 95)) if len(latencies) else None,
+        "batched_windows_per_s": throughput,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "model_rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024,
+        "input_dtype": np.dtype(single.interpreter.get_input_details()[0]["dtype"]).name,
+        "predictions": predictions,
+    }
+
+
+def run_probe(model, args, paths):
+    command = [sys.executable, os.path.abspath(__file__), "--probe", model, "--hop", str(args.hop),
+               "--threads", str(args.threads), "--batch-size", str(args.batch_size), "--files", *paths]
+    proc = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    return {"model": model, "error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+
+
+def true_label(path, class_labels):
+    """
+    The class label named by the nearest enclosing directory, if any.
+    """
+    names = {label.lower(): label for label in class_labels}
+    for part in reversed(os.path.normpath(os.path.dirname(path)).split(os.sep)):
+        if part.lower() in names:
+            return names[part.lower()]
+    return None
+
+
+def compare(reference, result, class_labels):
+    """
+    Window agreement with the reference model and clip-level accuracy on labelled files.
+    """
+    from model_inference import summarize_predictions
+
+    same = total = 0
+    confidence_diffs = []
+    correct = labelled = 0
+    for path, prediction in result["predictions"].items():
+        ref = reference["predictions"][path]
+        for label, confidence, ref_label, ref_confidence in zip(prediction["labels"], prediction["confidences"],
+                                                                ref["labels"], ref["confidences"]):
+            total += 1
+            same += label == ref_label
+            if label == ref_label:
+                confidence_diffs.append(abs(confidence - ref_confidence))
+        expected = true_label(path, class_labels)
+        if expected is not None and prediction["labels"]:
+            clip_label, _ = summarize_predictions(np.asarray(prediction["labels"], dtype=object),
+                                                  np.asarray(prediction["confidences"]))
+            labelled += 1
+            correct += clip_label == expected
+    return {
+        "window_agreement": same / total if total else None,
+        "mean_confidence_diff": float(np.mean(confidence_diffs)) if confidence_diffs else None,
+        "labelled_files": labelled,
+        "clip_accuracy": correct / labelled if labelled else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare model variants on latency, memory and accuracy.")
+    parser.add_argument("data", nargs="*", help="WAV files or directories")
+    parser.add_argument("--models", nargs="+", help="Registered names or .tflite paths (default: all registered)")
+    parser.add_argument("--hop", type=float, default=0.5, help="Hop between 1 s windows in seconds")
+    parser.add_argument("--threads", type=int, default=0, help="Interpreter threads (0 = runtime default)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Windows per invoke for the throughput run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    parser.add_argument("--files", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        result = probe(args.probe, args.files, args.hop, args.threads or None, args.batch_size)
+        print("RESULT " + json.dumps(result))
+        return
+
+    from bulk_scan import find_wav_files
+
+    paths = []
+    for item in args.data:
+        if os.path.isdir(item):
+            paths.extend(os.path.abspath(path) for path, _ in find_wav_files(item))
+        else:
+            paths.append(os.path.abspath(item))
+    if not paths:
+        parser.error("no WAV files given")
+    # The model registry and its paths are relative to the repository root
+    os.chdir(ROOT)
+    import model_inference
+    registry = model_inference.load_model_registry()
+    models = args.models or [name for name, spec in registry["models"].items() if os.path.isfile(spec["path"])]
+
+    results = [run_probe(model, args, paths) for model in models]
+    reference = next((r for r in results if "error" not in r), None)
+    print(f"{len(paths)} files, reference model: {reference['model'] if reference else '-'}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['model']:>10s} | error: {result['error']}")
+            continue
+        result.update(compare(reference, result, model_inference.resolve_model(result["model"])[1]))
+        accuracy = "-" if result["clip_accuracy"] is None else f"{result['clip_accuracy'] * 100:.1f}%"
+        throughput = result["batched_windows_per_s"] or 0
+        print(f"{result['model']:>10s} | {result['size_kb']:7.0f} KiB | {result['input_dtype']:>7s} | "
+              f"p50 {result['latency_p50_ms']:6.2f} ms | p95 {result['latency_p95_ms']:6.2f} ms | "
+              f"{throughput:7.0f} windows/s | RSS {result['peak_rss_mb']:6.1f} MB | "
+              f"agreement {result['window_agreement'] * 100:5.1f}% | accuracy {accuracy}")
+    if args.output:
+        for result in results:
+            result.pop("predictions", None)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Parity check and micro-benchmark for the precomputed Featurizer against the original
+librosa/scipy preprocessing path.
+
+    python benchmarks/featurizer_parity.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_inference import Featurizer, preprocess_audio_reference  # noqa: E402
+
+# Maximum absolute difference (dB) allowed for the exact-parity FFT resampler
+FFT_TOLERANCE_DB = 0.01
+
+
+def test_signals(length, rng):
+    t = np.arange(length) / 44100
+    burst = np.zeros(length)
+    onset = length // 2
+    burst[onset:] = 20000 * rng.standard_normal(length - onset) * np.exp(-np.arange(length - onset) / 2000)
+    return {
+        "silence": np.zeros(length),
+        "noise": 3000 * rng.standard_normal(length),
+        "tone": 10000 * np.sin(2 * np.pi * 1000 * t),
+        "impulse": burst + 100 * rng.standard_normal(length),
+    }
+
+
+def time_call(fn, repeats):
+    fn()  # Warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    failed = False
+    for length in (44100, 16000, 2048):
+        featurizers = {mode: Featurizer(length, resampler=mode) for mode in ("fft", "polyphase")}
+        for name, signal in test_signals(length, rng).items():
+            audio = signal.astype(np.float32)
+            reference = preprocess_audio_reference(audio)
+            for mode, featurizer in featurizers.items():
+                diff = np.abs(featurizer(audio) - reference)
+                line = f"{length:6d} {name:8s} {featurizer.resampler:9s} max {diff.max():8.4f} dB  mean {diff.mean():.4f} dB"
+                if mode == "fft" and diff.max() > FFT_TOLERANCE_DB:
+                    failed = True
+                    line += "  FAIL"
+                print(line)
+
+    audio = test_signals(44100, rng)["impulse"].astype(np.float32)
+    repeats = 50
+    reference_ms = time_call(lambda: preprocess_audio_reference(audio), repeats)
+    print(f"\nreference (librosa/scipy): {reference_ms:.2f} ms/call")
+    for mode in ("fft", "polyphase"):
+        featurizer = Featurizer(44100, resampler=mode)
+        ms = time_call(lambda: featurizer(audio), repeats)
+        print(f"featurizer ({mode}): {ms:.2f} ms/call ({reference_ms / ms:.1f}x)")
+
+    if failed:
+        print("\nParity check FAILED")
+        sys.exit(1)
+    print("\nParity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Idle CPU and memory of the headless daemon versus the GUI app.
+
+Each target is started in its own process, left to settle, then sampled from /proc for
+a fixed period: CPU is the share of one core used over the period, RSS the mean and
+peak resident set. "Idle" means audio keeps flowing but nothing triggers: the daemon
+gets a synthetic source without impulses, the app listens to the default input device.
+The app needs a display and PyAudio, so it is skipped when neither DISPLAY nor
+WAYLAND_DISPLAY is set. Linux only.
+
+    python benchmarks/idle_footprint.py [--targets daemon app app-connected] [--seconds 30] [--output idle.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 8479  # Daemon port for the app-connected target
+
+TARGETS = {
+    "daemon": [[sys.executable, "daemon.py", "--synthetic", "--burst-interval", "0", "--no-log", "--port", "0"]],
+    "app": [[sys.executable, "main.py"]],
+    # Both processes together: the daemon does the work, the GUI only draws
+    "app-connected": [[sys.executable, "daemon.py", "--synthetic", "--burst-interval", "0", "--no-log",
+                       "--port", str(PORT)],
+                      [sys.executable, "main.py", "--connect", f"127.0.0.1:{PORT}"]],
+}
+GUI_TARGETS = ("app", "app-connected")
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime are fields 14 and 15 of the whole line
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure(commands, settle, seconds, interval=0.5):
+    processes = []
+    for command in commands:
+        processes.append(subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        time.sleep(1)  # Let a daemon bind its port before a subscriber starts
+    try:
+        time.sleep(settle)
+        if any(p.poll() is not None for p in processes):
+            return {"error": "process exited during start-up"}
+        pids = [p.pid for p in processes]
+        start_cpu = sum(cpu_seconds(pid) for pid in pids)
+        start = time.monotonic()
+        samples = []
+        while time.monotonic() - start < seconds:
+            samples.append(sum(rss_mb(pid) for pid in pids))
+            time.sleep(interval)
+        elapsed = time.monotonic() - start
+        cpu = sum(cpu_seconds(pid) for pid in pids) - start_cpu
+    finally:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+    return {
+        "cpu_percent": cpu / elapsed * 100,
+        "rss_mean_mb": sum(samples) / len(samples),
+        "rss_peak_mb": max(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare idle CPU and memory of the daemon and the GUI app.")
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), help="Default: every runnable target")
+    parser.add_argument("--settle", type=float, default=5, help="Seconds to wait before sampling")
+    parser.add_argument("--seconds", type=float, default=30, help="Sampling period")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    has_display = bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+    targets = args.targets or [name for name in TARGETS if has_display or name not in GUI_TARGETS]
+    results = {}
+    for name in targets:
+        if name in GUI_TARGETS and not has_display:
+            print(f"{name:>14s} | skipped: no display")
+            continue
+        result = measure(TARGETS[name], args.settle, args.seconds)
+        results[name] = result
+        if "error" in result:
+            print(f"{name:>14s} | error: {result['error']}")
+            continue
+        print(f"{name:>14s} | CPU {result['cpu_percent']:5.1f}% | RSS mean {result['rss_mean_mb']:6.1f} MB "
+              f"| peak {result['rss_peak_mb']:6.1f} MB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Sustained-stream scaling for the multi-microphone ingestion engine.
+
+Runs N synthetic real-time microphones in continuous mode (every hop is scored) for a
+fixed time and checks whether the shared scheduler keeps up: no dropped windows and a
+bounded lag behind the live stream. N doubles until a run is no longer sustained.
+
+    python benchmarks/ingestion_scaling.py [--duration 10] [--hop 0.25] [--max-streams 64]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_capture import SyntheticSource  # noqa: E402
+from ingestion import IngestionEngine, MicrophoneChannel  # noqa: E402
+
+MAX_LAG_MS = 1000  # p95 lag behind the live stream still counted as keeping up
+
+
+def run(streams, duration, hop, workers, batch_size):
+    lags = []
+    lock = threading.Lock()
+
+    def on_result(result):
+        with lock:
+            lags.append(result["lag_ms"])
+
+    channels = [MicrophoneChannel(f"Syn{i:03d}", SyntheticSource(seed=i, duration=duration), continuous=True,
+                                  hop_seconds=hop) for i in range(streams)]
+    engine = IngestionEngine(channels, on_result, num_workers=workers, batch_size=batch_size)
+    engine.start()
+    engine.wait(timeout=duration + 5)
+    engine.stop()
+    stats = engine.stats()
+    expected = streams * int((duration - 1.0) / hop + 1)
+    dropped = sum(s["scheduler_dropped"] + s["windows_missed"] for s in stats.values())
+    p95 = float(np.percentile(lags, 95)) if lags else float("inf")
+    return {
+        "streams": streams,
+        "scored": len(lags),
+        "expected": expected,
+        "dropped": dropped,
+        "p95_lag_ms": p95,
+        "sustained": dropped == 0 and p95 < MAX_LAG_MS and len(lags) >= 0.95 * expected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure sustained microphone streams per core.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of audio per run")
+    parser.add_argument("--hop", type=float, default=0.25, help="Hop between scored windows")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Scheduler worker threads")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-streams", type=int, default=64)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    best = 0
+    streams = 1
+    while streams <= args.max_streams:
+        result = run(streams, args.duration, args.hop, args.workers, args.batch_size)
+        results.append(result)
+        print(f"{streams:4d} streams | {result['scored']:6d}/{result['expected']:<6d} windows | "
+              f"{result['dropped']:5d} dropped | p95 lag {result['p95_lag_ms']:8.1f} ms | "
+              f"{'sustained' if result['sustained'] else 'NOT sustained'}")
+        if not result["sustained"]:
+            break
+        best = streams
+        streams *= 2
+    cores = os.cpu_count() or 1
+    print(f"\nMax sustained: {best} streams on {cores} cores ({best / cores:.1f} streams/core, hop {args.hop}s)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cores": cores, "hop": args.hop, "max_sustained": best, "runs": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Event-log write throughput: the SQLite LogStore against the legacy whole-file JSON
+rewrite, at growing numbers of already-stored events.
+
+    python benchmarks/log_store_bench.py [--sizes 1000 10000 100000] [--events 5000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_store import LogStore  # noqa: E402
+
+
+def make_entry(i):
+    return {"id": f"RT-{i}", "time": "2024-12-26 17:58:53", "volume": "-27.00", "prediction": "Gunshot"}
+
+
+def bench_store(directory, stored, events):
+    store = LogStore(os.path.join(directory, f"store_{stored}.db"))
+    for i in range(stored):
+        store.append(make_entry(i))
+    store.flush()
+    commits = store.commits
+    start = time.perf_counter()
+    for i in range(events):
+        store.append(make_entry(stored + i))
+    store.flush()
+    elapsed = time.perf_counter() - start
+    result = {"events_per_s": events / elapsed, "commits": store.commits - commits}
+    store.close()
+    return result
+
+
+def bench_json(directory, stored, events):
+    # The original save_log: read everything, append one entry, rewrite everything
+    path = os.path.join(directory, f"legacy_{stored}.json")
+    with open(path, "w") as f:
+        json.dump([make_entry(i) for i in range(stored)], f, indent=4)
+    start = time.perf_counter()
+    for i in range(events):
+        with open(path, "r") as f:
+            logs = json.load(f)
+        logs.append(make_entry(stored + i))
+        with open(path, "w") as f:
+            json.dump(logs, f, indent=4)
+    return {"events_per_s": events / (time.perf_counter() - start)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark event-log write throughput.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Events already stored")
+    parser.add_argument("--events", type=int, default=5000, help="Events appended per measurement")
+    parser.add_argument("--json-events", type=int, default=20, help="Events appended with the legacy JSON path")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for stored in args.sizes:
+            store = bench_store(directory, stored, args.events)
+            legacy = bench_json(directory, stored, args.json_events)
+            results.append({"stored": stored, "sqlite": store, "json": legacy})
+            print(f"{stored:>9d} stored | sqlite {store['events_per_s']:>10.0f} events/s "
+                  f"({store['commits']} commits) | json rewrite {legacy['events_per_s']:>8.1f} events/s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Headless benchmark of the capture -> features -> inference -> log pipeline.
+
+Reports p50/p95/p99 latency per stage, the sustained realtime factor of the streaming
+pipeline (audio seconds processed per wall second), peak RSS and log-write throughput at
+growing history sizes. Needs neither PyAudio nor Tk: audio comes from the synthetic
+source or a replayed WAV file. Results are written as JSON so runs can be compared.
+
+    python benchmarks/pipeline_bench.py [--wav replay.wav] [--duration 60] [--output results.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import model_inference  # noqa: E402
+from audio_capture import AudioCapture, FileSource, SyntheticSource  # noqa: E402
+from detection_cascade import DetectionCascade  # noqa: E402
+from log_store import LogStore  # noqa: E402
+from stream_detector import StreamingDetector  # noqa: E402
+
+WARMUP = 5
+
+
+def percentiles(samples_ns):
+    ms = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def time_stage(fn, inputs, iterations):
+    for i in range(WARMUP):
+        fn(inputs[i % len(inputs)])
+    samples = np.empty(iterations, dtype=np.int64)
+    for i in range(iterations):
+        x = inputs[i % len(inputs)]
+        start = time.perf_counter_ns()
+        fn(x)
+        samples[i] = time.perf_counter_ns() - start
+    return percentiles(samples)
+
+
+def make_source(args, realtime=False):
+    if args.wav:
+        return FileSource(args.wav, realtime=realtime)
+    return SyntheticSource(realtime=realtime, duration=args.duration)
+
+
+def load_audio(args):
+    return np.concatenate(list(make_source(args).blocks()))
+
+
+def score(model_input):
+    interpreter, input_details, output_details = model_inference.get_interpreter()
+    # Quantized variants take and return integer tensors
+    interpreter.set_tensor(input_details[0]["index"], model_inference.quantize_input(model_input, input_details[0]))
+    interpreter.invoke()
+    output = model_inference.dequantize_output(interpreter.get_tensor(output_details[0]["index"]),
+                                               output_details[0])[0]
+    index = int(np.argmax(output))
+    return model_inference.CLASS_LABELS[index], float(output[index]) * 100
+
+
+def bench_stages(audio, iterations):
+    capture = AudioCapture()
+    chunk = capture.CHUNK
+    chunks = [audio[i:i + chunk] for i in range(0, len(audio) - chunk + 1, chunk)]
+    window = capture.RATE
+    windows = [audio[i:i + window] * 32768.0 for i in range(0, len(audio) - window + 1, window // 4)]
+    cascade = DetectionCascade.from_config(rate=capture.RATE)
+    features = np.empty((1, model_inference.N_MELS, model_inference.N_FRAMES, 1), dtype=np.float32)
+    model_input = model_inference.preprocess_audio(windows[0])
+    interpreter, input_details, _ = model_inference.get_interpreter()
+    interpreter.set_tensor(input_details[0]["index"], model_inference.quantize_input(model_input, input_details[0]))
+
+    stages = {
+        "get_rms": time_stage(capture.get_rms, chunks, iterations),
+        "moving_average": time_stage(capture.moving_average, [0.01, 0.02, 0.5], iterations),
+        "calculate_db": time_stage(capture.calculate_db, [0.01, 0.02, 0.5], iterations),
+        "cascade": time_stage(cascade.evaluate, chunks, iterations),
+        "preprocess_audio": time_stage(lambda w: model_inference.preprocess_audio(w, out=features), windows,
+                                       max(iterations // 10, 20)),
+        "invoke": time_stage(lambda _: interpreter.invoke(), [None], max(iterations // 10, 20)),
+        "score_window": time_stage(lambda w: score(model_inference.preprocess_audio(w, out=features)), windows,
+                                   max(iterations // 10, 20)),
+    }
+    stages["cascade"]["stage_stats"] = cascade.stats()
+    return stages
+
+
+def bench_pipeline(args, directory):
+    """
+    Stream the whole source through the detector in continuous mode, scoring every hop
+    and logging every result, as fast as the pipeline allows.
+    """
+    capture = AudioCapture(source=make_source(args))
+    detector = StreamingDetector(capture, hop_seconds=args.hop, continuous=True)
+    store = LogStore(os.path.join(directory, "pipeline.db"))
+    features = np.empty((1, model_inference.N_MELS, model_inference.N_FRAMES, 1), dtype=np.float32)
+    audio_end = 0.0
+    start = time.perf_counter()
+    while True:
+        windows = detector.advance()
+        if windows is None:
+            # advance() also gives up after a second without audio, e.g. while a file loads
+            if detector.finished and not detector.ready():
+                break
+            continue
+        for window in windows:
+            label, confidence = score(model_inference.preprocess_audio(window["audio"], out=features))
+            result = detector.make_result(window, label, confidence)
+            store.append({"time": f"{result['start']:.2f}", "volume": f"{result['volume_db']:.2f}",
+                          "prediction": label, "confidence": f"{confidence:.2f}"}, id_prefix="Bench")
+            audio_end = result["end"]
+    store.flush()
+    elapsed = time.perf_counter() - start
+    capture.cleanup()
+    store.close()
+    return {
+        "audio_s": audio_end,
+        "wall_s": elapsed,
+        "realtime_factor": audio_end / elapsed if elapsed else 0.0,
+        "windows": detector.windows_scored,
+        "windows_missed": detector.windows_missed,
+    }
+
+
+def make_entry(i):
+    return {"time": "2024-12-26 17:58:53", "volume": "93.00", "prediction": "Gunshot", "microphone": "Mic001"}
+
+
+def bench_log_store(directory, sizes, events):
+    results = []
+    for stored in sizes:
+        store = LogStore(os.path.join(directory, f"history_{stored}.db"))
+        for i in range(stored):
+            store.append(make_entry(i), id_prefix="Hist")
+        store.flush()
+        append_ns = np.empty(events, dtype=np.int64)
+        start = time.perf_counter()
+        for i in range(events):
+            t = time.perf_counter_ns()
+            store.append(make_entry(i), id_prefix="RT")
+            append_ns[i] = time.perf_counter_ns() - t
+        store.flush()
+        elapsed = time.perf_counter() - start
+        query_ns = []
+        for _ in range(50):
+            t = time.perf_counter_ns()
+            store.query(limit=100)
+            query_ns.append(time.perf_counter_ns() - t)
+        store.close()
+        results.append({
+            "stored": stored,
+            "events_per_s": events / elapsed,
+            "append": percentiles(append_ns),
+            "query_page": percentiles(query_ns),
+        })
+    return results
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    runtime, _ = model_inference.load_runtime(model_inference.RUNTIME)
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "runtime": runtime,
+        "model": model_inference.MODEL_PATH,
+        "num_threads": model_inference.NUM_THREADS,
+        "resampler": model_inference.RESAMPLER,
+        "source": args.wav or f"synthetic:{args.duration}s",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection pipeline headlessly.")
+    parser.add_argument("--wav", help="Replay this WAV file instead of the synthetic source")
+    parser.add_argument("--duration", type=float, default=60, help="Synthetic source length in seconds")
+    parser.add_argument("--hop", type=float, default=0.25, help="Hop between scored windows in seconds")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per cheap stage")
+    parser.add_argument("--log-sizes", type=int, nargs="+", default=[0, 10000, 100000], help="Events already stored")
+    parser.add_argument("--log-events", type=int, default=5000, help="Events appended per log measurement")
+    parser.add_argument("--output", default="pipeline_bench.json", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    # MODEL_PATH is relative to the repository root
+    model_inference.configure(model_path=os.path.join(ROOT, model_inference.MODEL_PATH))
+    audio = load_audio(args)
+    results = {"meta": metadata(args)}
+    results["stages"] = bench_stages(audio, args.iterations)
+    for name, stats in results["stages"].items():
+        print(f"{name:>18s} | p50 {stats['p50_ms']:9.4f} ms | p95 {stats['p95_ms']:9.4f} ms "
+              f"| p99 {stats['p99_ms']:9.4f} ms")
+    with tempfile.TemporaryDirectory() as directory:
+        results["pipeline"] = bench_pipeline(args, directory)
+        pipeline = results["pipeline"]
+        print(f"pipeline | {pipeline['audio_s']:.1f} s of audio in {pipeline['wall_s']:.2f} s "
+              f"| realtime factor {pipeline['realtime_factor']:.1f}x | {pipeline['windows']} windows")
+        results["log_store"] = bench_log_store(directory, args.log_sizes, args.log_events)
+        for entry in results["log_store"]:
+            print(f"log | {entry['stored']:>9d} stored | {entry['events_per_s']:>10.0f} events/s "
+                  f"| append p99 {entry['append']['p99_ms']:.4f} ms | page query p50 {entry['query_page']['p50_ms']:.3f} ms")
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS {results['peak_rss_mb']:.1f} MB")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
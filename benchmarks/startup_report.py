@@ -0,0 +1,75 @@
+"""
+Cold-start report: import time, first-inference time and peak RSS for each installed
+TFLite runtime, measured in fresh interpreter processes.
+
+    python benchmarks/startup_report.py [--threads N] [--no-xnnpack]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh process so imports and RSS are not shared between measurements
+PROBE = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+import model_inference
+import_time = time.perf_counter() - start
+import_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+model_inference.configure(runtime=sys.argv[1], num_threads=int(sys.argv[2]) or None,
+                          use_xnnpack=sys.argv[3] == "1")
+import numpy as np
+start = time.perf_counter()
+model_inference.get_interpreter()
+load_time = time.perf_counter() - start
+start = time.perf_counter()
+model_inference.run_inference(np.zeros(44100, dtype=np.float32))
+first_time = time.perf_counter() - start
+print("RESULT " + json.dumps({
+    "import_s": import_time,
+    "import_rss_mb": import_rss / 1024,
+    "interpreter_load_s": load_time,
+    "first_inference_s": first_time,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def probe(runtime, threads, xnnpack):
+    proc = subprocess.run([sys.executable, "-c", PROBE, runtime, str(threads), "1" if xnnpack else "0"],
+                          cwd=ROOT, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    return {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=0, help="Interpreter threads (0 = runtime default)")
+    parser.add_argument("--no-xnnpack", action="store_true", help="Disable the default XNNPACK delegate")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from model_inference import RUNTIMES
+
+    results = {}
+    print(f"{'runtime':15s} {'import':>8s} {'load':>8s} {'1st inf':>8s} {'RSS@imp':>9s} {'peak RSS':>9s}")
+    for runtime, _ in RUNTIMES:
+        result = results[runtime] = probe(runtime, args.threads, not args.no_xnnpack)
+        if "error" in result:
+            print(f"{runtime:15s} unavailable ({result['error']})")
+            continue
+        print(f"{runtime:15s} {result['import_s']:7.3f}s {result['interpreter_load_s']:7.3f}s "
+              f"{result['first_inference_s']:7.3f}s {result['import_rss_mb']:7.1f}MB {result['peak_rss_mb']:7.1f}MB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
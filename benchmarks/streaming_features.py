@@ -0,0 +1,109 @@
+"""
+Per-hop feature cost of the incremental StreamingMelSpectrogram against recomputing
+the whole 1 s window with Featurizer at every hop, plus a parity check of the two.
+
+    python benchmarks/streaming_features.py [--seconds 30] [--hops 0.05 0.1 0.25]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_inference import HOP_LENGTH, TARGET_SR, Featurizer, StreamingMelSpectrogram  # noqa: E402
+
+RATE = 44100
+# Mean absolute difference (dB) allowed for the worst window. Featurizer resamples each
+# window on its own, so its resampling filter sees zeros past the window edges where the
+# incremental one sees audio; the frames nearest the edges are left out of the
+# comparison, and when the loudest frame sits near an edge the small difference in it
+# still shifts power_to_db's reference for the whole window (up to ~0.05 dB here)
+PARITY_TOLERANCE_DB = 0.1
+EDGE_FRAMES = 10
+
+
+def test_stream(seconds, rng):
+    audio = (0.01 * rng.standard_normal(int(seconds * RATE))).astype(np.float32)
+    burst_len = int(0.05 * RATE)
+    burst = 0.8 * rng.standard_normal(burst_len) * np.exp(-np.arange(burst_len) / (0.01 * RATE))
+    for onset in range(RATE, len(audio) - burst_len, 3 * RATE):
+        audio[onset:onset + burst_len] += burst.astype(np.float32)
+    return audio
+
+
+def time_hops(audio, hop, step):
+    """
+    Average ms per hop of `step(end)`, called once per hop of audio after the first window.
+    """
+    ends = range(RATE, len(audio), hop)
+    start = time.perf_counter()
+    for end in ends:
+        step(end)
+    return (time.perf_counter() - start) / len(ends) * 1000
+
+
+def parity(audio):
+    """
+    Compare incremental features with Featurizer("polyphase") on windows aligned to a frame.
+    """
+    diffs = []
+    # Window starts must fall on an input sample: (frames - n_frames) * HOP_LENGTH * RATE / TARGET_SR
+    stride = TARGET_SR // np.gcd(HOP_LENGTH * RATE, TARGET_SR)
+    featurizer = Featurizer(RATE, resampler="polyphase")
+    spectrogram = StreamingMelSpectrogram(RATE)
+    pos = 0
+    target = spectrogram.n_frames + stride
+    while True:
+        while spectrogram.frames < target and pos < len(audio):
+            spectrogram.push(audio[pos:pos + 64])
+            pos += 64
+        start = (spectrogram.frames - spectrogram.n_frames) * HOP_LENGTH * RATE // TARGET_SR
+        if spectrogram.frames != target or start + RATE > len(audio):
+            break
+        reference = featurizer(audio[start:start + RATE] * 32768.0)
+        diff = np.abs(spectrogram.features() - reference)[0, :, EDGE_FRAMES:spectrogram.n_frames - EDGE_FRAMES, 0]
+        diffs.append(diff.mean())
+        target += stride * 8
+    return np.array(diffs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental vs per-window feature cost.")
+    parser.add_argument("--seconds", type=float, default=30, help="Length of the synthetic stream")
+    parser.add_argument("--hops", type=float, nargs="+", default=[0.05, 0.1, 0.25], help="Hop sizes in seconds")
+    args = parser.parse_args()
+
+    audio = test_stream(args.seconds, np.random.default_rng(0))
+    scaled = audio * 32768.0
+    print(f"{'hop':>6} {'full fft':>10} {'full poly':>10} {'incremental':>12} {'speedup':>8}")
+    for hop_seconds in args.hops:
+        hop = int(hop_seconds * RATE)
+        full = {}
+        for mode in ("fft", "polyphase"):
+            featurizer = Featurizer(RATE, resampler=mode)
+            full[mode] = time_hops(audio, hop, lambda end: featurizer(scaled[end - RATE:end]))
+
+        spectrogram = StreamingMelSpectrogram(RATE)
+        spectrogram.push(audio[:RATE])
+
+        def step(end):
+            spectrogram.push(audio[end - hop:end])
+            spectrogram.features()
+
+        incremental = time_hops(audio, hop, step)
+        print(f"{hop_seconds:5.2f}s {full['fft']:8.2f}ms {full['polyphase']:8.2f}ms {incremental:10.2f}ms "
+              f"{full['fft'] / incremental:7.1f}x")
+
+    diffs = parity(audio)
+    worst_db = float(diffs.max())
+    print(f"\nparity vs Featurizer (polyphase), {len(diffs)} windows without the {EDGE_FRAMES} edge frames: "
+          f"median {np.median(diffs):.4f} dB, p99 {np.percentile(diffs, 99):.4f} dB, worst window {worst_db:.4f} dB")
+    if worst_db > PARITY_TOLERANCE_DB:
+        print("Parity check FAILED")
+        sys.exit(1)
+    print("Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+CSV_FIELDS = ["file", "start", "end", "label", "confidence"]
+
+# Per-process settings, filled in by the pool initializer
+_worker = {}
+
+
+def _init_worker(model, window_seconds, hop_seconds, batch_size, num_threads, cache_dir=None):
+    """
+    Load a private TFLite interpreter in each worker process.
+    """
+    import model_inference
+    model_inference.configure(model=model, num_threads=num_threads)
+    _worker.update(window_seconds=window_seconds, hop_seconds=hop_seconds, batch_size=batch_size, cache=None)
+    if cache_dir:
+        from feature_cache import FeatureCache
+        # Each file is read once per run, so only the shared on-disk tier is worth keeping
+        _worker["cache"] = FeatureCache(max_bytes=0, directory=cache_dir)
+    # Build the batch interpreter now rather than on the first file
+    model_inference.run_inference_batch(np.zeros((1, 16000), dtype=np.float32), batch_size=batch_size)
+
+
+def scan_file(path, rel_path):
+    """
+    Stream a WAV file in overlapping windows and score them in batches.
+    Returns (rel_path, rows, audio_seconds).
+    """
+    from file_stream import WavStream
+
+    if _worker["cache"] is not None:
+        return scan_file_cached(path, rel_path)
+    # Memory-mapped or block-decoded one batch at a time, so long recordings use constant memory
+    stream = WavStream(path, _worker["window_seconds"], _worker["hop_seconds"], batch_size=_worker["batch_size"])
+    rows = [{"file": rel_path, **detection} for detection in stream.detections()]
+    return rel_path, rows, stream.duration
+
+
+def scan_file_cached(path, rel_path):
+    """
+    Score the file from cached features, computing and storing them on the first run.
+    Returns (rel_path, rows, audio_seconds).
+    """
+    import soundfile as sf
+    from feature_cache import window_features
+    from model_inference import run_inference_batch_features
+
+    batch_size = _worker["batch_size"]
+    # Features are computed batch by batch into the cache file and come back memory-mapped
+    features, sr = window_features(path, _worker["window_seconds"], _worker["hop_seconds"], cache=_worker["cache"],
+                                   cache_audio=False, batch_size=batch_size)
+    window = int(_worker["window_seconds"] * sr)
+    hop = int(_worker["hop_seconds"] * sr)
+    rows = []
+    # Score one batch at a time so only that batch of the mapping is read in
+    for first in range(0, len(features), batch_size):
+        labels, confidences = run_inference_batch_features(np.asarray(features[first:first + batch_size]),
+                                                           batch_size=batch_size)
+        for i, (label, confidence) in enumerate(zip(labels, confidences), first):
+            rows.append({
+                "file": rel_path,
+                "start": round(i * hop / sr, 3),
+                "end": round((i * hop + window) / sr, 3),
+                "label": label,
+                "confidence": round(float(confidence), 2),
+            })
+    return rel_path, rows, sf.info(path).frames / sr
+
+
+def find_wav_files(root):
+    for directory, _, files in os.walk(root):
+        for name in sorted(files):
+            if name.lower().endswith(".wav"):
+                path = os.path.join(directory, name)
+                yield path, os.path.relpath(path, root)
+
+
+class DetectionWriter:
+    """
+    Appends per-window rows to a JSONL or CSV file and records finished files in a
+    `.done` sidecar so an interrupted scan can resume where it stopped. Each `.done` line
+    holds the file's relative path and the output size once its rows were written; on
+    resume the output is truncated to the last recorded size, so rows of a file that was
+    being written when the scan stopped are not duplicated.
+    """
+
+    def __init__(self, output_path, output_format):
+        self.output_format = output_format
+        self.done_path = output_path + ".done"
+        self._recover(output_path)
+        new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        self.output = open(output_path, "a", newline="")
+        self.done = open(self.done_path, "a")
+        self.csv_writer = None
+        if output_format == "csv":
+            self.csv_writer = csv.DictWriter(self.output, fieldnames=CSV_FIELDS)
+            if new_file:
+                self.csv_writer.writeheader()
+
+    def _done_lines(self):
+        if not os.path.exists(self.done_path):
+            return []
+        with open(self.done_path, "r") as f:
+            lines = f.readlines()
+        # A line cut short by a crash does not count
+        return [line[:-1] for line in lines if line.endswith("\n") and line.strip()]
+
+    def _recover(self, output_path):
+        lines = self._done_lines()
+        offset = 0
+        if lines:
+            path, _, size = lines[-1].rpartition("\t")
+            if not path or not size.isdigit():
+                return  # Written by an older version without sizes; keep the output as is
+            offset = int(size)
+        with open(self.done_path, "w") as f:
+            f.writelines(line + "\n" for line in lines)
+        if os.path.exists(output_path) and os.path.getsize(output_path) > offset:
+            with open(output_path, "r+") as f:
+                f.truncate(offset)
+
+    def completed_files(self):
+        return {line.rpartition("\t")[0] or line for line in self._done_lines()}
+
+    def write_file(self, rel_path, rows):
+        if self.csv_writer is not None:
+            self.csv_writer.writerows(rows)
+        else:
+            for row in rows:
+                self.output.write(json.dumps(row) + "\n")
+        self.output.flush()
+        # Only mark the file done once all of its rows are on disk, with the size to resume from
+        self.done.write(f"{rel_path}\t{self.output.tell()}\n")
+        self.done.flush()
+
+    def close(self):
+        self.output.close()
+        self.done.close()
+
+
+def print_progress(files_done, total_files, audio_seconds, started):
+    elapsed = max(time.monotonic() - started, 1e-9)
+    print(f"{files_done}/{total_files} files | {files_done / elapsed:.2f} files/s | "
+          f"{audio_seconds / 3600 / elapsed:.4f} audio-hours/s | {elapsed:.1f} s elapsed")
+
+
+def main():
+    import model_inference
+
+    parser = argparse.ArgumentParser(description="Score a directory tree of WAV recordings without the GUI.")
+    parser.add_argument("root", help="Directory to scan recursively for .wav files")
+    parser.add_argument("-o", "--output", default="detections.jsonl", help="Output file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Output format (default: from the extension)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--window", type=float, default=1.0, help="Window length in seconds")
+    parser.add_argument("--hop", type=float, default=0.5, help="Hop between windows in seconds")
+    parser.add_argument("--batch-size", type=int, default=model_inference.MAX_BATCH_SIZE, help="Windows per invoke")
+    parser.add_argument("--model", default=model_inference.MODEL_NAME or model_inference.MODEL_PATH,
+                        help="Registered model name or TFLite model path")
+    parser.add_argument("--threads", type=int, default=1, help="Interpreter threads per worker")
+    parser.add_argument("--cache-dir", help="Keep window features here so rescans of the same files skip decoding")
+    parser.add_argument("--progress-every", type=int, default=10, help="Report throughput every N files")
+    args = parser.parse_args()
+
+    output_format = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    writer = DetectionWriter(args.output, output_format)
+    completed = writer.completed_files()
+    files = [(path, rel) for path, rel in find_wav_files(args.root) if rel not in completed]
+    print(f"{len(files)} files to scan ({len(completed)} already done) with {args.workers} workers")
+
+    started = time.monotonic()
+    files_done = 0
+    audio_seconds = 0.0
+    # Spawned workers start clean instead of inheriting the parent's interpreter state
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(args.model, args.window, args.hop, args.batch_size, args.threads,
+                                           args.cache_dir)) as pool:
+            futures = {pool.submit(scan_file, path, rel): rel for path, rel in files}
+            for future in as_completed(futures):
+                try:
+                    rel_path, rows, seconds = future.result()
+                except Exception as e:
+                    logging.error(f"Error scanning {futures[future]}: {e}")
+                    continue
+                writer.write_file(rel_path, rows)
+                files_done += 1
+                audio_seconds += seconds
+                if files_done % args.progress_every == 0:
+                    print_progress(files_done, len(files), audio_seconds, started)
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt received. Progress saved; rerun the same command to resume.")
+    finally:
+        writer.close()
+    print_progress(files_done, len(files), audio_seconds, started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from audio_capture import AudioCapture, FileSource, SyntheticSource
+from detection_cascade import DetectionCascade, DEFAULT_CASCADE
+from event_aggregator import EventAggregator, SHOT_INTERVAL, event_log_entry
+from log_manager import LogManager
+from model_inference import BatchScorer
+from stream_detector import StreamingDetector
+import metrics
+
+# Subscribers (e.g. the GUI started with --connect) attach here
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8470
+VOLUME_RATE = 15  # Volume updates per second sent to subscribers
+SUBSCRIBER_QUEUE = 256  # Messages buffered per subscriber before the oldest are dropped
+
+
+def put_dropping_oldest(queue, item):
+    """
+    Put `item` without waiting, dropping the oldest queued item when `queue` is full.
+    Returns the dropped item, or None.
+    """
+    dropped = None
+    if queue.full():
+        dropped = queue.get_nowait()
+    queue.put_nowait(item)
+    return dropped
+
+
+class SoundwatcherDaemon:
+    """
+    GUI-free detection service on asyncio.
+
+    Capture, triggering, inference and logging run as pipeline stages connected by
+    bounded queues:
+
+    - capture waits for each hop of audio on a dedicated thread, so the event loop never
+      blocks on the source;
+    - trigger meters the hop and runs the detection cascade on the event loop (both take
+      microseconds), merges triggers into burst events and queues the windows to score,
+      dropping the oldest when inference falls behind; once a burst is confirmed its
+      further shots are counted but not scored;
+    - inference scores queued windows in batches on a single-thread executor; the model
+      is loaded on the first trigger, so an idle daemon never holds it in memory;
+    - log saves each finished event through LogManager and publishes it.
+
+    Volume readings, window results ("detection") and finished events ("event") are
+    broadcast as newline-delimited JSON to subscribers on a local TCP socket. Subscribers
+    may send {"type": "set_threshold", "value": dB SPL}.
+    """
+
+    def __init__(self, audio_capture, mic_id="Mic001", host=DEFAULT_HOST, port=DEFAULT_PORT, hop_seconds=0.05,
+                 queue_size=32, batch_size=8, num_threads=1, log_manager=None, aggregator=None):
+        self.capture = audio_capture
+        self.mic_id = mic_id
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.queue_size = queue_size
+        self.log_manager = log_manager
+        self.aggregator = aggregator or EventAggregator()
+        self._trigger_events = {}  # Trigger stream position -> event id
+        self._stream_time = 0.0  # Seconds of audio metered so far; the aggregator's clock
+        # One window centred on each trigger, like the GUI scoring one block per trigger
+        self.detector = StreamingDetector(audio_capture, hop_seconds=hop_seconds, pre_trigger_seconds=0.5,
+                                          post_trigger_seconds=0.5)
+
+        self._capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="daemon-capture")
+        self._inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="daemon-inference")
+        self._scorer = None
+        self._subscribers = set()
+        self._server = None
+        self._running = False
+        self._last_volume_time = 0.0
+        self._volume_peak = None
+        self.dropped_windows = 0
+        self.dropped_messages = 0
+        self.results = 0
+
+    @property
+    def threshold_db(self):
+        """
+        Trigger level in calibrated dB SPL.
+        """
+        if self.capture.cascade is not None:
+            return self.capture.cascade.level_gate.threshold_db
+        return self.capture.to_spl(self.capture.threshold_db)
+
+    def set_threshold(self, value):
+        if self.capture.cascade is not None:
+            self.capture.cascade.level_gate.threshold_db = value
+        else:
+            self.capture.threshold_db = value - self.capture.calibration_offset_db
+
+    async def run(self):
+        """
+        Serve until the source is exhausted or `stop()` is called.
+        """
+        loop = asyncio.get_running_loop()
+        self._running = True
+        self._capture_queue = asyncio.Queue(maxsize=self.queue_size)
+        self._window_queue = asyncio.Queue(maxsize=self.queue_size)
+        self._result_queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.log_manager is not None:
+            # Opening the store may import a logs.json; do it before audio starts piling up
+            await loop.run_in_executor(None, self.log_manager.initialize_log_file)
+        self._server = await asyncio.start_server(self._handle_subscriber, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"Daemon listening on {self.host}:{self.port}... Press Ctrl+C to stop.")
+        self.capture.start()
+        stages = [
+            asyncio.create_task(self._capture_stage()),
+            asyncio.create_task(self._trigger_stage()),
+            asyncio.create_task(self._inference_stage()),
+            asyncio.create_task(self._log_stage()),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            self._running = False
+            for stage in stages:
+                stage.cancel()
+            self._server.close()
+            await self._server.wait_closed()
+            self._capture_executor.shutdown(wait=True)
+            self._inference_executor.shutdown(wait=True)
+            self.capture.cleanup()
+            if self.log_manager is not None:
+                self.log_manager.close()
+
+    def stop(self):
+        self._running = False
+
+    def _source_finished(self):
+        finished = getattr(self.capture.source, "finished", None)
+        return finished is not None and finished.is_set()
+
+    async def _capture_stage(self):
+        loop = asyncio.get_running_loop()
+        target = self.detector.hop_end
+        while self._running:
+            target = max(target, self.detector.hop_end)
+            if not await loop.run_in_executor(self._capture_executor, self.capture.wait_for, target, 0.5):
+                if self._source_finished():
+                    break
+                continue
+            await self._capture_queue.put(target)
+            target += self.detector.hop
+        await self._capture_queue.put(None)
+
+    async def _trigger_stage(self):
+        while True:
+            position = await self._capture_queue.get()
+            if position is None:
+                break
+            while self.detector.ready():
+                detector = self.detector
+                triggers = detector.triggers
+                windows = detector.advance()
+                volume_db = self.capture.to_spl(detector.last_volume_db)
+                self._stream_time = detector.hop_end / detector.rate
+                self._publish_volume(volume_db)
+                if detector.triggers > triggers:
+                    trigger = detector.last_trigger
+                    self._trigger_events[trigger] = self.aggregator.on_trigger(trigger / detector.rate,
+                                                                               float(volume_db))
+                for window in windows:
+                    self._queue_window(window)
+        await self._window_queue.put(None)
+
+    def _queue_window(self, window):
+        event_id = self._trigger_events.get(window["trigger"])
+        # Windows carry the trigger that scheduled them and are ready in trigger order, so
+        # older mappings are no longer needed
+        for trigger in [t for t in self._trigger_events if t < window["trigger"]]:
+            del self._trigger_events[trigger]
+        if event_id is None or not self.aggregator.claim(event_id):
+            return
+        window["event"] = event_id
+        dropped = put_dropping_oldest(self._window_queue, window)
+        if dropped is not None:
+            self.aggregator.on_result(dropped["event"], None, None)
+            self.dropped_windows += 1
+            metrics.inc("dropped_windows_total", stage="daemon")
+
+    def _score(self, audio):
+        # Runs on the inference thread, which owns the interpreter
+        if self._scorer is None:
+            self._scorer = BatchScorer(num_threads=self.num_threads)
+        return self._scorer.score(audio, batch_size=self.batch_size)
+
+    async def _inference_stage(self):
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            window = await self._window_queue.get()
+            if window is None:
+                break
+            batch = [window]
+            while len(batch) < self.batch_size and not self._window_queue.empty():
+                window = self._window_queue.get_nowait()
+                if window is None:
+                    done = True
+                    break
+                batch.append(window)
+            try:
+                labels, confidences = await loop.run_in_executor(
+                    self._inference_executor, self._score, np.stack([w["audio"] for w in batch]))
+            except Exception as e:
+                logging.error(f"Error during inference: {e}")
+                for window in batch:
+                    self.aggregator.on_result(window["event"], None, None)
+                continue
+            for window, label, confidence in zip(batch, labels, confidences):
+                result = self.detector.make_result(window, str(label), confidence)
+                result["microphone"] = self.mic_id
+                result["event"] = window["event"]
+                self.aggregator.on_result(window["event"], result["label"], result["confidence"])
+                await self._result_queue.put(result)
+        await self._result_queue.put(None)
+
+    async def _log_stage(self):
+        while True:
+            try:
+                # Wake up regularly so events finish even when nothing is being scored
+                result = await asyncio.wait_for(self._result_queue.get(), timeout=0.25)
+            except asyncio.TimeoutError:
+                result = False
+            if result is None:
+                break
+            if result:
+                self.results += 1
+                self._publish({"type": "detection", "result": result})
+            for event in self.aggregator.poll(self._stream_time):
+                self._log_event(event)
+        for event in self.aggregator.flush():
+            self._log_event(event)
+
+    def _log_event(self, event):
+        entry = None
+        if self.log_manager is not None:
+            # LogStore.append only queues the entry; its writer thread commits in batches
+            entry = self.log_manager.save_log(event_log_entry(event, self.mic_id), id_prefix="RT")
+        self._publish({"type": "event", "event": event, "log": entry})
+
+    def _publish_volume(self, volume_db):
+        if volume_db is None:
+            return
+        volume_db = float(volume_db)
+        if self._volume_peak is None or volume_db > self._volume_peak:
+            self._volume_peak = volume_db
+        now = time.monotonic()
+        if now - self._last_volume_time < 1.0 / VOLUME_RATE:
+            return
+        self._last_volume_time = now
+        self._publish({"type": "volume", "volume_db": volume_db, "peak_db": self._volume_peak})
+        self._volume_peak = None
+
+    def _publish(self, message):
+        if not self._subscribers:
+            return
+        data = (json.dumps(message) + "\n").encode()
+        for queue in self._subscribers:
+            if put_dropping_oldest(queue, data) is not None:
+                self.dropped_messages += 1
+
+    async def _handle_subscriber(self, reader, writer):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        hello = {"type": "hello", "microphone": self.mic_id, "threshold_db": self.threshold_db}
+        queue.put_nowait((json.dumps(hello) + "\n").encode())
+        self._subscribers.add(queue)
+        sender = asyncio.create_task(self._send(queue, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._handle_command(line)
+        except ConnectionError:
+            pass
+        finally:
+            self._subscribers.discard(queue)
+            sender.cancel()
+            writer.close()
+
+    async def _send(self, queue, writer):
+        try:
+            while True:
+                writer.write(await queue.get())
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    def _handle_command(self, line):
+        try:
+            command = json.loads(line)
+            if command.get("type") == "set_threshold":
+                self.set_threshold(float(command["value"]))
+                self._publish({"type": "hello", "microphone": self.mic_id, "threshold_db": self.threshold_db})
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.error(f"Invalid subscriber command {line!r}: {e}")
+
+    def stats(self):
+        stats = self.detector.stats()
+        stats.update(self.aggregator.stats())
+        stats.update({
+            "results": self.results,
+            "dropped_windows": self.dropped_windows,
+            "dropped_messages": self.dropped_messages,
+            "subscribers": len(self._subscribers),
+        })
+        return stats
+
+
+class DaemonClient:
+    """
+    Subscribes to a running daemon from a background thread, calling `on_message(dict)`
+    for every message and reconnecting whenever the daemon goes away.
+    """
+
+    def __init__(self, on_message, host=DEFAULT_HOST, port=DEFAULT_PORT, retry_seconds=2.0):
+        self.on_message = on_message
+        self.host = host
+        self.port = port
+        self.retry_seconds = retry_seconds
+        self.connected = False
+        self._socket = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="daemon-client", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with socket.create_connection((self.host, self.port), timeout=self.retry_seconds) as sock:
+                    sock.settimeout(None)
+                    self._socket = sock
+                    self.connected = True
+                    for line in sock.makefile("rb"):
+                        self.on_message(json.loads(line))
+            except (OSError, ValueError) as e:
+                if self.connected:
+                    logging.error(f"Lost connection to daemon: {e}")
+            self.connected = False
+            self._socket = None
+            self._stop.wait(self.retry_seconds)
+
+    def send(self, message):
+        sock = self._socket
+        if sock is None:
+            return False
+        try:
+            sock.sendall((json.dumps(message) + "\n").encode())
+            return True
+        except OSError:
+            return False
+
+    def stop(self):
+        self._stop.set()
+        sock = self._socket
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+
+def parse_address(address):
+    """
+    "host:port", ":port" or "port" -> (host, port).
+    """
+    host, _, port = address.rpartition(":")
+    return host or DEFAULT_HOST, int(port)
+
+
+async def serve(daemon):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, daemon.stop)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+    await daemon.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Soundwatcher detection service.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address subscribers connect to")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Subscriber port (0 picks a free one)")
+    parser.add_argument("--file", help="Replay a WAV file instead of the default input device")
+    parser.add_argument("--synthetic", action="store_true", help="Use a synthetic noise + impulse source")
+    parser.add_argument("--burst-interval", type=float, default=3.0,
+                        help="Seconds between synthetic impulses (0 for background noise only)")
+    parser.add_argument("--threshold", type=float, default=90, help="Level gate in calibrated dB SPL")
+    parser.add_argument("--mic-id", default="Mic001", help="Microphone id attached to results")
+    parser.add_argument("--hop", type=float, default=0.05, help="Metering hop in seconds")
+    parser.add_argument("--batch-size", type=int, default=8, help="Windows per invoke")
+    parser.add_argument("--threads", type=int, default=1, help="Interpreter threads")
+    parser.add_argument("--merge-window", type=float, default=2.0,
+                        help="Triggers closer than this many seconds are merged into one event")
+    parser.add_argument("--no-log", action="store_true", help="Do not save results through LogManager")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this local port")
+    parser.add_argument("--metrics-file", help="Periodically write Prometheus metrics to this file")
+    args = parser.parse_args()
+
+    source = None
+    if args.file:
+        source = FileSource(args.file)
+    elif args.synthetic:
+        source = SyntheticSource(burst_interval=args.burst_interval)
+    cascade = DetectionCascade.from_config(DEFAULT_CASCADE, rate=AudioCapture.RATE)
+    cascade.level_gate.threshold_db = args.threshold
+    audio_capture = AudioCapture(source=source, cascade=cascade, cooldown_time=SHOT_INTERVAL)
+    daemon = SoundwatcherDaemon(audio_capture, mic_id=args.mic_id, host=args.host, port=args.port,
+                                hop_seconds=args.hop, batch_size=args.batch_size, num_threads=args.threads,
+                                log_manager=None if args.no_log else LogManager(),
+                                aggregator=EventAggregator(merge_window=args.merge_window))
+    metrics_server, metrics_writer = metrics.start_exporters(args.metrics_port, args.metrics_file)
+    try:
+        asyncio.run(serve(daemon))
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt received. Stopping daemon.")
+    finally:
+        print(f"Daemon stats: {daemon.stats()}")
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if metrics_writer is not None:
+            metrics_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import time
+import numpy as np
+
+# dB SPL corresponding to a 0 dBFS RMS signal. 120 puts a typical -26 dBFS reading for
+# 94 dB SPL (the usual 1 kHz calibrator level) in the right place; recalibrate per microphone.
+CALIBRATION_OFFSET_DB = 120.0
+
+
+class CascadeStage:
+    """
+    One cheap check in a DetectionCascade. Subclasses implement `check(samples)`;
+    calling the stage counts calls, hits and time spent. Stages that track state, such
+    as a background level, also implement `observe(samples)`, which the cascade calls
+    for every block before any stage can reject it; that time counts towards the stage's
+    cost too.
+    """
+
+    name = "stage"
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.observed = 0
+        self.total_ns = 0
+
+    def observe(self, samples):
+        pass
+
+    def check(self, samples):
+        raise NotImplementedError
+
+    def __call__(self, samples):
+        start = time.perf_counter_ns()
+        passed = bool(self.check(samples))
+        self.total_ns += time.perf_counter_ns() - start
+        self.calls += 1
+        self.hits += passed
+        return passed
+
+    def stats(self):
+        # Per block the stage saw, observed by the cascade or checked
+        blocks = max(self.calls, self.observed)
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.calls if self.calls else 0.0,
+            "mean_us": self.total_ns / blocks / 1000 if blocks else 0.0,
+            "total_ms": self.total_ns / 1e6,
+        }
+
+
+class LevelGate(CascadeStage):
+    """
+    Calibrated level gate: passes blocks whose RMS level in dB SPL exceeds `threshold_db`.
+    """
+
+    name = "level"
+
+    def __init__(self, threshold_db=90.0, calibration_offset_db=CALIBRATION_OFFSET_DB):
+        super().__init__()
+        self.threshold_db = threshold_db
+        self.calibration_offset_db = calibration_offset_db
+        self.last_level_db = -np.inf
+
+    def check(self, samples):
+        mean_square = float(np.dot(samples, samples)) / len(samples)
+        self.last_level_db = 10 * np.log10(mean_square) + self.calibration_offset_db if mean_square > 0 else -np.inf
+        return self.last_level_db > self.threshold_db
+
+
+class OnsetStage(CascadeStage):
+    """
+    Transient sharpness: the loudest short frame must rise `min_rise_db` above the
+    background level, tracked as a slow average of the median frame energy of every
+    block observed that is not itself a transient.
+    """
+
+    name = "onset"
+
+    def __init__(self, min_rise_db=12.0, frame_length=256, background_smoothing=0.05):
+        super().__init__()
+        self.min_rise_db = min_rise_db
+        self.frame_length = frame_length
+        self.background_smoothing = background_smoothing
+        self.background = None
+        self._observed = None  # Block the last rise was measured on
+        self._rise_db = -np.inf
+
+    def observe(self, samples):
+        self._observed = samples
+        n = len(samples) // self.frame_length * self.frame_length
+        if n == 0:
+            self._rise_db = -np.inf
+            return
+        frames = samples[:n].reshape(-1, self.frame_length)
+        energies = np.einsum("ij,ij->i", frames, frames) / self.frame_length + 1e-12
+        peak = energies.max()
+        floor = float(np.median(energies))
+        if self.background is None:
+            self.background = floor
+        self._rise_db = 10 * np.log10(peak / self.background)
+        # Transients do not update the background so an event does not raise its own floor
+        if self._rise_db <= self.min_rise_db:
+            self.background += self.background_smoothing * (floor - self.background)
+
+    def check(self, samples):
+        if self._observed is not samples:
+            self.observe(samples)
+        return self._rise_db > self.min_rise_db
+
+
+class CrestFactorStage(CascadeStage):
+    """
+    Impulsiveness: the peak-to-RMS ratio must exceed `min_crest_db`.
+    """
+
+    name = "crest"
+
+    def __init__(self, min_crest_db=10.0):
+        super().__init__()
+        self.min_crest_db = min_crest_db
+
+    def check(self, samples):
+        rms = np.sqrt(np.dot(samples, samples) / len(samples))
+        if rms <= 0:
+            return False
+        return 20 * np.log10(np.max(np.abs(samples)) / rms) > self.min_crest_db
+
+
+class SpectralStage(CascadeStage):
+    """
+    Spectral shape: impulsive events are broadband, so enough energy must sit above
+    `cutoff_hz` (rejects wind and traffic rumble) and the spectrum must be flat enough
+    (rejects tonal sounds such as sirens and horns).
+    """
+
+    name = "spectral"
+
+    def __init__(self, rate=44100, cutoff_hz=500.0, min_band_ratio=0.3, min_flatness=0.05):
+        super().__init__()
+        self.rate = rate
+        self.cutoff_hz = cutoff_hz
+        self.min_band_ratio = min_band_ratio
+        self.min_flatness = min_flatness
+
+    def check(self, samples):
+        power = np.abs(np.fft.rfft(samples)) ** 2 + 1e-12
+        total = power.sum()
+        cutoff_bin = int(self.cutoff_hz * len(samples) / self.rate)
+        if power[cutoff_bin:].sum() / total < self.min_band_ratio:
+            return False
+        flatness = np.exp(np.mean(np.log(power))) / (total / len(power))
+        return flatness > self.min_flatness
+
+
+STAGE_TYPES = {cls.name: cls for cls in (LevelGate, OnsetStage, CrestFactorStage, SpectralStage)}
+
+# Cheapest stages first; each entry is (stage name, keyword arguments)
+DEFAULT_CASCADE = [
+    ("level", {"threshold_db": 90.0}),
+    ("onset", {"min_rise_db": 12.0}),
+    ("crest", {"min_crest_db": 10.0}),
+    ("spectral", {"cutoff_hz": 500.0, "min_band_ratio": 0.3, "min_flatness": 0.05}),
+]
+
+
+class DetectionCascade:
+    """
+    Runs cheap vectorized stages in order and stops at the first one that rejects the
+    block, so the CNN only sees plausible impulsive events.
+
+    Every block is observed by every stage first, so stateful stages such as the onset
+    background tracker follow the ambient level even though the level gate only lets
+    loud blocks through to their checks.
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.evaluations = 0
+        self.passed = 0
+
+    @classmethod
+    def from_config(cls, config=None, rate=44100):
+        """
+        Build a cascade from a list of (stage name, kwargs) pairs; see DEFAULT_CASCADE.
+        """
+        stages = []
+        for name, kwargs in (config if config is not None else DEFAULT_CASCADE):
+            kwargs = dict(kwargs)
+            if name == "spectral":
+                kwargs.setdefault("rate", rate)
+            stages.append(STAGE_TYPES[name](**kwargs))
+        return cls(stages)
+
+    def stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        return None
+
+    @property
+    def level_gate(self):
+        return self.stage("level")
+
+    def evaluate(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        self.evaluations += 1
+        for stage in self.stages:
+            start = time.perf_counter_ns()
+            stage.observe(samples)
+            stage.total_ns += time.perf_counter_ns() - start
+            stage.observed += 1
+        for stage in self.stages:
+            if not stage(samples):
+                return False
+        self.passed += 1
+        return True
+
+    def stats(self):
+        stats = {stage.name: stage.stats() for stage in self.stages}
+        stats["cascade"] = {
+            "evaluations": self.evaluations,
+            "passed": self.passed,
+            "pass_rate": self.passed / self.evaluations if self.evaluations else 0.0,
+        }
+        return stats
@@ -0,0 +1,175 @@
+import itertools
+import threading
+import time
+
+# Minimum spacing between two triggers counted as separate shots; use it as the capture
+# cooldown so one report ringing over several chunks is counted once
+SHOT_INTERVAL = 0.15
+
+
+class EventAggregator:
+    """
+    Merges triggers into burst events.
+
+    A trigger within `merge_window` seconds of the previous one joins the open event,
+    so automatic fire or echoes become one event with a shot count, peak level, duration
+    and the highest confidence seen, instead of one inference and log entry per shot.
+    Once a result confirms the event (`confirm_label` at `confirm_confidence` % or more),
+    or `max_inferences` windows have been scored, further triggers are only counted.
+
+    Times are in seconds on any monotonic clock (wall time for live capture, stream
+    position for replays). Events are handed out by `poll` once the merge window has
+    passed and every inference claimed for them has reported back. All methods are
+    thread-safe, so results may arrive from inference workers.
+    """
+
+    def __init__(self, merge_window=2.0, confirm_label="Gunshot", confirm_confidence=80.0, max_inferences=3):
+        self.merge_window = merge_window
+        self.confirm_label = confirm_label
+        self.confirm_confidence = confirm_confidence
+        self.max_inferences = max_inferences
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._open = None
+        self._closing = {}  # Events past their merge window still waiting for results, by id
+        self.events = 0
+        self.inferences = 0
+        self.skipped = 0
+
+    def on_trigger(self, now, level_db):
+        """
+        Record a trigger and return the id of the event it belongs to.
+        """
+        with self._lock:
+            event = self._open
+            if event is not None and now - event["end"] > self.merge_window:
+                self._close(event)
+                event = None
+            if event is None:
+                event = {
+                    "id": next(self._ids),
+                    "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "start": now,
+                    "end": now,
+                    "shots": 0,
+                    "peak_db": level_db,
+                    "label": None,
+                    "confidence": None,
+                    "confirmed": False,
+                    "inferences": 0,
+                    "pending": 0,
+                }
+                self._open = event
+            event["shots"] += 1
+            # Triggers scored by several workers may be reported slightly out of order
+            event["start"] = min(event["start"], now)
+            event["end"] = max(event["end"], now)
+            if level_db is not None and (event["peak_db"] is None or level_db > event["peak_db"]):
+                event["peak_db"] = level_db
+            return event["id"]
+
+    def claim(self, event_id):
+        """
+        Return True if a window of `event_id` should be scored, in which case its result
+        must be reported with `on_result` (with label None if it was dropped or failed).
+        """
+        with self._lock:
+            event = self._find(event_id)
+            if event is None or event["confirmed"] or event["inferences"] >= self.max_inferences:
+                self.skipped += 1
+                return False
+            event["inferences"] += 1
+            event["pending"] += 1
+            self.inferences += 1
+            return True
+
+    def on_result(self, event_id, label, confidence):
+        with self._lock:
+            event = self._find(event_id)
+            if event is None:
+                return
+            event["pending"] -= 1
+            if label is None:
+                return
+            # The confirm label wins over any other label; otherwise keep the most confident one
+            current = event["label"]
+            if current is None:
+                better = True
+            elif (label == self.confirm_label) != (current == self.confirm_label):
+                better = label == self.confirm_label
+            else:
+                better = confidence > event["confidence"]
+            if better:
+                event["label"] = label
+                event["confidence"] = float(confidence)
+            if label == self.confirm_label and confidence >= self.confirm_confidence:
+                event["confirmed"] = True
+
+    def poll(self, now):
+        """
+        Return the events that are complete at time `now`, oldest first.
+        """
+        with self._lock:
+            event = self._open
+            if event is not None and now - event["end"] > self.merge_window:
+                self._close(event)
+            ready = [event for event in self._closing.values() if event["pending"] <= 0]
+            for event in ready:
+                del self._closing[event["id"]]
+            self.events += len(ready)
+            return [self._finish(event) for event in ready]
+
+    def flush(self):
+        """
+        Close and return every event regardless of the merge window or pending results.
+        """
+        with self._lock:
+            if self._open is not None:
+                self._close(self._open)
+            ready = list(self._closing.values())
+            self._closing.clear()
+            self.events += len(ready)
+            return [self._finish(event) for event in ready]
+
+    def _find(self, event_id):
+        if self._open is not None and self._open["id"] == event_id:
+            return self._open
+        return self._closing.get(event_id)
+
+    def _close(self, event):
+        self._closing[event["id"]] = event
+        self._open = None
+
+    @staticmethod
+    def _finish(event):
+        event = dict(event)
+        del event["pending"]
+        event["duration"] = event["end"] - event["start"]
+        return event
+
+    def stats(self):
+        with self._lock:
+            return {
+                "events": self.events,
+                "inferences": self.inferences,
+                "skipped_inferences": self.skipped,
+                "open": int(self._open is not None) + len(self._closing),
+            }
+
+
+def event_log_entry(event, microphone=None):
+    """
+    Log entry for a finished event.
+    """
+    entry = {
+        "time": event["time"],
+        "volume": "-" if event["peak_db"] is None else f"{event['peak_db']:.2f}",
+        "prediction": event["label"] or "Unscored",
+        "shots": event["shots"],
+        "duration": f"{event['duration']:.2f}",
+    }
+    if event["confidence"] is not None:
+        entry["confidence"] = f"{event['confidence']:.2f}"
+    if microphone is not None:
+        entry["microphone"] = microphone
+    return entry
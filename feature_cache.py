@@ -0,0 +1,287 @@
+import collections
+import hashlib
+import logging
+import os
+import threading
+import numpy as np
+import model_inference
+
+# Cache settings, overridable from the environment
+CACHE_BYTES = int(os.environ.get("SOUNDWATCHER_CACHE_BYTES", 256 * 1024 * 1024))  # In-memory budget
+CACHE_DIR = os.environ.get("SOUNDWATCHER_CACHE_DIR") or None  # On-disk .npy tier; off when unset
+
+
+class FeatureCache:
+    """
+    Content-addressed cache of decoded audio and model features.
+
+    Entries are numpy arrays keyed by the source file's content hash and mtime plus the
+    parameters that produced them, so editing a file or changing a feature setting never
+    returns stale data. Recently used entries are kept in memory up to `max_bytes`
+    (least recently used first out); with a `directory`, every entry is also written
+    there as `<key>.npy` and read back on a memory miss, so the cache survives restarts
+    and is shared between processes. Large entries can be filled in place on disk with
+    `create` and `commit` and read back memory-mapped. Cached arrays are read-only.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES, directory=CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries = collections.OrderedDict()
+        self._file_keys = {}  # (path, size, mtime_ns) -> file key, so unchanged files are hashed once
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def file_key(self, path):
+        """
+        Content hash and mtime of the file at `path`.
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            key = self._file_keys.get(memo_key)
+        if key is None:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            key = f"{digest.hexdigest()}-{stat.st_mtime_ns}"
+            with self._lock:
+                self._file_keys[memo_key] = key
+        return key
+
+    def key(self, path, kind, **params):
+        """
+        Cache key of the `kind` array derived from `path` with `params`.
+        """
+        description = "|".join([self.file_key(path), kind] + [f"{k}={params[k]!r}" for k in sorted(params)])
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npy")
+
+    def get(self, key, mmap=False):
+        """
+        Cached array for `key`, or None. With `mmap`, an entry read from disk is
+        memory-mapped instead of loaded.
+        """
+        with self._lock:
+            array = self._entries.get(key)
+            if array is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return array
+        if self.directory:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                try:
+                    array = np.load(path, mmap_mode="r" if mmap else None)
+                except (OSError, ValueError) as e:
+                    logging.error(f"Error reading cache entry {path}: {e}")
+                else:
+                    self._remember(key, array)
+                    with self._lock:
+                        self.disk_hits += 1
+                    return array
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, array):
+        array = self._remember(key, np.ascontiguousarray(array))
+        if self.directory:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write under a temporary name so readers never see half an entry
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, array)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.error(f"Error writing cache entry {path}: {e}")
+        return array
+
+    def create(self, key, shape, dtype=np.float32):
+        """
+        Writable memory-mapped .npy file to fill an entry in place, without holding it
+        in memory. Pass it to `commit` once filled, or to `discard` on failure. Needs a
+        cache directory.
+        """
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Filled under a temporary name so readers never see half an entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        return np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+
+    def commit(self, key, array):
+        """
+        Publish an array from `create` and return the entry, memory-mapped read-only.
+        """
+        array.flush()
+        tmp_path = array.filename
+        del array
+        path = self._disk_path(key)
+        os.replace(tmp_path, path)
+        return self._remember(key, np.load(path, mmap_mode="r"))
+
+    @staticmethod
+    def discard(array):
+        """
+        Remove the file of an array from `create` that will not be committed.
+        """
+        tmp_path = array.filename
+        del array
+        try:
+            os.remove(tmp_path)
+        except OSError as e:
+            logging.error(f"Error removing cache file {tmp_path}: {e}")
+
+    def _remember(self, key, array):
+        array.setflags(write=False)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            if array.nbytes <= self.max_bytes:
+                self._entries[key] = array
+                self.bytes += array.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+        return array
+
+    def get_or_compute(self, key, compute):
+        array = self.get(key)
+        if array is None:
+            array = self.put(key, compute())
+        return array
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+_default_lock = threading.Lock()
+_default = {"cache": None}
+
+
+def get_cache():
+    """
+    The process-wide cache, configured from SOUNDWATCHER_CACHE_BYTES / _DIR.
+    """
+    with _default_lock:
+        if _default["cache"] is None:
+            _default["cache"] = FeatureCache()
+        return _default["cache"]
+
+
+def _decode(path, sr):
+    if sr is None:
+        import soundfile as sf
+        audio, rate = sf.read(path, dtype="float32", always_2d=True)
+        audio = audio.mean(axis=1)
+    else:
+        import librosa
+        audio, rate = librosa.load(path, sr=sr, mono=True)
+    # The featurizer expects int16-scaled samples
+    return (audio * 32768.0).astype(np.float32), rate
+
+
+def load_audio(path, sr=None, cache=None):
+    """
+    Decode `path` to mono int16-scaled float32 samples, at the file's own rate when `sr`
+    is None (soundfile) or resampled to `sr` (librosa). Returns (audio, rate).
+    """
+    cache = cache or get_cache()
+    audio = cache.get_or_compute(cache.key(path, "pcm", sr=sr), lambda: _decode(path, sr)[0])
+    return audio, _rate(path, sr)
+
+
+def _rate(path, sr):
+    if sr is not None:
+        return sr
+    import soundfile as sf
+    return sf.info(path).samplerate
+
+
+def window_features(path, window_seconds=1.0, hop_seconds=0.5, sr=None, cache=None, cache_audio=True,
+                    batch_size=32):
+    """
+    Model features of the overlapping windows of `path` (see split_windows), as a
+    (N, 128, 128, 1) array. Returns (features, rate); window i starts at
+    i * int(hop_seconds * rate) samples. With `cache_audio=False` only the features are
+    cached, not the decoded audio they were computed from; at the file's own rate they
+    are then computed from a WavStream `batch_size` windows at a time and, with a cache
+    directory, written straight to the cache file and returned memory-mapped, so memory
+    use does not grow with the file.
+    """
+    cache = cache or get_cache()
+    rate = _rate(path, sr)
+    window, hop = int(window_seconds * rate), int(hop_seconds * rate)
+    key = cache.key(path, "features", sr=rate, window=window, hop=hop, target_sr=model_inference.TARGET_SR,
+                    n_fft=model_inference.N_FFT, hop_length=model_inference.HOP_LENGTH,
+                    n_mels=model_inference.N_MELS, n_frames=model_inference.N_FRAMES,
+                    top_db=model_inference.TOP_DB, resampler=model_inference.RESAMPLER)
+
+    if sr is None and not cache_audio:
+        features = cache.get(key, mmap=True)
+        if features is None:
+            features = _stream_features(path, window_seconds, hop_seconds, batch_size, cache, key)
+        return features, rate
+
+    def compute():
+        # Only decode when the features are not cached
+        audio = load_audio(path, sr=sr, cache=cache)[0] if cache_audio else _decode(path, sr)[0]
+        windows = model_inference.split_windows(audio, window, hop)
+        features = np.empty((len(windows), model_inference.N_MELS, model_inference.N_FRAMES, 1), dtype=np.float32)
+        for i, w in enumerate(windows):
+            model_inference.preprocess_audio(w, out=features[i:i + 1])
+        return features
+
+    return cache.get_or_compute(key, compute), rate
+
+
+def _stream_features(path, window_seconds, hop_seconds, batch_size, cache, key):
+    from file_stream import WavStream
+
+    stream = WavStream(path, window_seconds, hop_seconds, batch_size=batch_size)
+    shape = (len(stream), model_inference.N_MELS, model_inference.N_FRAMES, 1)
+    if not cache.directory:
+        features = np.empty(shape, dtype=np.float32)
+        _fill_features(stream, features)
+        return cache.put(key, features)
+    features = cache.create(key, shape)
+    try:
+        _fill_features(stream, features)
+    except BaseException:
+        cache.discard(features)
+        raise
+    return cache.commit(key, features)
+
+
+def _fill_features(stream, features):
+    i = 0
+    for _, windows in stream.batches():
+        for window in windows:
+            model_inference.preprocess_audio(window, out=features[i:i + 1])
+            i += 1
+    if i != len(features):
+        # Never cache rows that were not computed
+        raise ValueError(f"{stream.path}: read {i} windows, expected {len(features)}")
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import struct
+import time
+import numpy as np
+
+# WAV (format tag, bits per sample) -> numpy sample type, for formats that can be mapped directly
+PCM_DTYPES = {
+    (1, 8): np.dtype("u1"),
+    (1, 16): np.dtype("<i2"),
+    (1, 32): np.dtype("<i4"),
+    (3, 32): np.dtype("<f4"),
+    (3, 64): np.dtype("<f8"),
+}
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def pcm_layout(path):
+    """
+    Return (data_offset, dtype, channels, frames) of an uncompressed WAV file whose
+    samples can be memory-mapped, or None (compressed, 24-bit, RF64 or not a WAV).
+    """
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+            if chunk_id == b"fmt ":
+                data = f.read(size + size % 2)
+                if len(data) < 16:
+                    return None
+                tag, channels, _, _, block_align, bits = struct.unpack("<HHIIHH", data[:16])
+                if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                    tag = struct.unpack("<H", data[24:26])[0]  # First two bytes of the subformat GUID
+                fmt = tag, channels, bits, block_align
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                tag, channels, bits, block_align = fmt
+                dtype = PCM_DTYPES.get((tag, bits))
+                if dtype is None or channels == 0 or block_align != channels * dtype.itemsize:
+                    return None
+                offset = f.tell()
+                # Streaming writers may leave the size unset; never map past the end of the file
+                frames = min(size, os.path.getsize(path) - offset) // block_align
+                return offset, dtype, channels, frames
+            else:
+                f.seek(size + size % 2, 1)
+
+
+def _int16_scale(dtype):
+    """
+    Factor (and offset) turning raw samples of `dtype` into int16-scaled floats.
+    """
+    if dtype == np.dtype("u1"):
+        return 256.0, 128.0
+    if dtype.kind == "i":
+        return 32768.0 / 2.0 ** (8 * dtype.itemsize - 1), 0.0
+    return 32768.0, 0.0
+
+
+class WavStream:
+    """
+    Reads a WAV file as overlapping windows in constant memory, regardless of its length.
+
+    Uncompressed PCM/float WAVs are memory-mapped one batch of windows at a time (the
+    mapping is dropped after each batch, so resident memory does not grow with the
+    file); anything else soundfile can read is decoded in blocks. Windows are mono,
+    int16-scaled float32 at the file's own sample rate, as the featurizer expects, and
+    cover the file the same way as split_windows (the last one is zero-padded).
+    """
+
+    def __init__(self, path, window_seconds=1.0, hop_seconds=0.5, batch_size=32, use_mmap=True):
+        import soundfile as sf
+
+        self.path = path
+        info = sf.info(path)
+        self.rate = info.samplerate
+        self.channels = info.channels
+        self.frames = info.frames
+        self.window = int(window_seconds * self.rate)
+        self.hop = int(hop_seconds * self.rate)
+        self.batch_size = batch_size
+        self.layout = pcm_layout(path) if use_mmap else None
+        if self.layout is not None:
+            self.frames = self.layout[3]
+        self._batch = np.zeros((batch_size, self.window), dtype=np.float32)
+        self.windows_read = 0
+        self.audio_seconds = 0.0  # Audio scored so far by `detections`
+        self.started = None
+
+    @property
+    def duration(self):
+        return self.frames / self.rate
+
+    def __len__(self):
+        if self.frames <= self.window:
+            return 1
+        return -(-(self.frames - self.window) // self.hop) + 1
+
+    def batches(self):
+        """
+        Yield (starts, windows): sample offsets and a (k, window) array of up to
+        `batch_size` windows. The array is reused by the next batch; copy it to keep it.
+        """
+        reader = self._mapped_batches if self.layout is not None else self._decoded_batches
+        for starts, windows in reader():
+            self.windows_read += len(starts)
+            yield starts, windows
+
+    def _mapped_batches(self):
+        offset, dtype, channels, frames = self.layout
+        scale, bias = _int16_scale(dtype)
+        count = len(self)
+        for first in range(0, count, self.batch_size):
+            n = min(self.batch_size, count - first)
+            lo = first * self.hop
+            hi = min((first + n - 1) * self.hop + self.window, frames)
+            # Map only the frames this batch covers
+            if hi > lo:
+                mapped = np.memmap(self.path, dtype=dtype, mode="r", offset=offset + lo * channels * dtype.itemsize,
+                                   shape=(hi - lo, channels))
+            else:
+                mapped = np.zeros((0, channels), dtype=dtype)
+            starts = []
+            for i in range(n):
+                start = (first + i) * self.hop
+                samples = mapped[start - lo:min(start + self.window, frames) - lo]
+                row = self._batch[i]
+                if channels == 1:
+                    row[:len(samples)] = samples[:, 0]
+                else:
+                    np.mean(samples, axis=1, out=row[:len(samples)])
+                row[len(samples):] = 0.0
+                if bias:
+                    row[:len(samples)] -= bias
+                row[:len(samples)] *= scale
+                starts.append(start)
+            del mapped
+            yield starts, self._batch[:n]
+
+    def _decoded_batches(self):
+        import soundfile as sf
+
+        starts = []
+        position = 0
+        for block in sf.blocks(self.path, blocksize=self.window, overlap=self.window - self.hop, dtype="float32",
+                               always_2d=True):
+            if position > 0 and len(block) <= self.window - self.hop:
+                break  # Tail already covered by the previous window
+            row = self._batch[len(starts)]
+            np.mean(block, axis=1, out=row[:len(block)])
+            row[len(block):] = 0.0
+            row *= 32768.0
+            starts.append(position)
+            position += self.hop
+            if len(starts) == self.batch_size:
+                yield starts, self._batch
+                starts = []
+        if position == 0:
+            # An empty file still has one (silent) window, as in __len__ and split_windows
+            self._batch[0] = 0.0
+            starts.append(0)
+        if starts:
+            yield starts, self._batch[:len(starts)]
+
+    def detections(self, score=None):
+        """
+        Score the file batch by batch, yielding one dict per window as soon as its batch
+        is scored: start/end in seconds, label and confidence. `score(windows)` returns
+        (labels, confidences) and defaults to run_inference_batch. Throughput so far is
+        available from `stats()`.
+        """
+        if score is None:
+            from model_inference import run_inference_batch
+
+            def score(windows):
+                return run_inference_batch(windows, batch_size=self.batch_size)
+
+        self.started = time.perf_counter()
+        self.audio_seconds = 0.0
+        for starts, windows in self.batches():
+            labels, confidences = score(windows)
+            for start, label, confidence in zip(starts, labels, confidences):
+                end = min(start + self.window, self.frames)
+                self.audio_seconds = max(self.audio_seconds, end / self.rate)
+                yield {
+                    "start": round(start / self.rate, 3),
+                    "end": round((start + self.window) / self.rate, 3),
+                    "label": str(label),
+                    "confidence": round(float(confidence), 2),
+                }
+
+    def stats(self):
+        elapsed = 0.0 if self.started is None else time.perf_counter() - self.started
+        return {
+            "audio_seconds": self.audio_seconds,
+            "elapsed_seconds": elapsed,
+            # Audio seconds processed per wall-clock second
+            "throughput": self.audio_seconds / elapsed if elapsed > 0 else 0.0,
+            "windows": self.windows_read,
+            "mmap": self.layout is not None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a WAV file of any length through the model.")
+    parser.add_argument("path", help="WAV file")
+    parser.add_argument("--window", type=float, default=1.0, help="Window length in seconds")
+    parser.add_argument("--hop", type=float, default=0.5, help="Hop between windows in seconds")
+    parser.add_argument("--batch-size", type=int, default=32, help="Windows per invoke")
+    parser.add_argument("--all", action="store_true", help="Print every window, not only non-Other ones")
+    parser.add_argument("--jsonl", help="Also write every window as JSON lines to this file")
+    parser.add_argument("--no-mmap", action="store_true", help="Decode in blocks even for plain PCM files")
+    args = parser.parse_args()
+
+    stream = WavStream(args.path, args.window, args.hop, args.batch_size, use_mmap=not args.no_mmap)
+    print(f"{args.path}: {stream.duration:.1f} s, {len(stream)} windows, "
+          f"{'memory-mapped' if stream.layout is not None else 'decoded in blocks'}")
+    output = open(args.jsonl, "w") if args.jsonl else None
+    try:
+        for i, detection in enumerate(stream.detections()):
+            if output is not None:
+                output.write(json.dumps(detection) + "\n")
+            if args.all or detection["label"] != "Other":
+                print(f"[{detection['start']:10.2f}s - {detection['end']:10.2f}s] {detection['label']} "
+                      f"{detection['confidence']:.2f}%")
+            if (i + 1) % 1000 == 0:
+                stats = stream.stats()
+                print(f"... {stats['audio_seconds']:.0f} s of audio | {stats['throughput']:.1f} audio-s/s")
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt received. Stopping.")
+    finally:
+        if output is not None:
+            output.close()
+    stats = stream.stats()
+    print(f"{stats['windows']} windows, {stats['audio_seconds']:.1f} s of audio in {stats['elapsed_seconds']:.2f} s "
+          f"| {stats['throughput']:.1f} audio-seconds per second")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import collections
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from model_inference import BatchScorer
+import metrics
+
+
+class InferenceService:
+    """
+    Scores audio on a pool of worker threads, each owning its own TFLite interpreter,
+    fed from one bounded request queue.
+
+    When the queue is full, `drop_policy` decides what happens to a new request:
+    "block" waits for space, "drop_newest" rejects the new request and "drop_oldest"
+    cancels the oldest queued one to make room. Requests that are dropped come back as
+    cancelled futures. If a worker cannot load the model, queued and later requests fail
+    with that error instead of waiting forever.
+    """
+
+    DROP_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+    def __init__(self, num_workers=None, max_queue=64, drop_policy="drop_oldest", batch_size=8,
+                 threads_per_worker=1, model_path=None):
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.drop_policy = drop_policy
+        self.batch_size = batch_size
+        self.threads_per_worker = threads_per_worker
+        self.model_path = model_path
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._running = True
+        self._error = None  # Model load failure, re-raised by every request
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+
+        self._workers = []
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"inference-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _enqueue(self, request, timeout):
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("InferenceService has been shut down")
+            if self._error is not None:
+                self.failed += 1
+                request[0].set_exception(self._error)
+                return request[0]
+            if len(self._queue) >= self.max_queue:
+                if self.drop_policy == "block":
+                    if not self._cond.wait_for(lambda: len(self._queue) < self.max_queue or not self._running,
+                                               timeout=timeout):
+                        self.dropped += 1
+                        metrics.inc("dropped_windows_total", stage="service")
+                        request[0].cancel()
+                        return request[0]
+                    # Woken by shutdown rather than by free space
+                    if not self._running:
+                        raise RuntimeError("InferenceService has been shut down")
+                elif self.drop_policy == "drop_newest":
+                    self.dropped += 1
+                    metrics.inc("dropped_windows_total", stage="service")
+                    request[0].cancel()
+                    return request[0]
+                else:
+                    self.dropped += 1
+                    metrics.inc("dropped_windows_total", stage="service")
+                    self._queue.popleft()[0].cancel()
+            self._queue.append(request)
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify_all()
+        return request[0]
+
+    def submit(self, audio_data, callback=None, timeout=None):
+        """
+        Queue one int16-scaled audio window. Returns a Future resolving to
+        (label, confidence); `callback(label, confidence)` runs on the worker thread.
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: f.cancelled() or f.exception() or callback(*f.result()))
+        return self._enqueue((future, np.asarray(audio_data), None), timeout)
+
+    def submit_batch(self, windows, callback=None, timeout=None):
+        """
+        Queue a (N, window_length) array of windows as one request. Returns a Future
+        resolving to (labels, confidences) arrays.
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: f.cancelled() or f.exception() or callback(*f.result()))
+        return self._enqueue((future, np.asarray(windows), "audio"), timeout)
+
+    def submit_features(self, features, callback=None, timeout=None):
+        """
+        Queue a (N, 128, 128, 1) array of precomputed model features (e.g. from the
+        feature cache) as one request. Returns a Future resolving to (labels, confidences).
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: f.cancelled() or f.exception() or callback(*f.result()))
+        return self._enqueue((future, np.asarray(features), "features"), timeout)
+
+    def _take(self):
+        """
+        Pop the next request plus any queued single windows of the same length, so
+        backlogged realtime windows share one interpreter invoke.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or not self._running)
+            if not self._queue:
+                return None
+            requests = [self._queue.popleft()]
+            if not requests[0][2]:
+                length = len(requests[0][1])
+                while (self._queue and len(requests) < self.batch_size
+                       and not self._queue[0][2] and len(self._queue[0][1]) == length):
+                    requests.append(self._queue.popleft())
+            self._cond.notify_all()
+            return requests
+
+    def _fail_all(self, error):
+        """
+        Fail every queued request and all later ones with `error`.
+        """
+        with self._cond:
+            self._error = error
+            requests = list(self._queue)
+            self._queue.clear()
+            self.failed += len(requests)
+            self._cond.notify_all()
+        for future, _, _ in requests:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def _worker_loop(self):
+        try:
+            scorer = BatchScorer(self.model_path, num_threads=self.threads_per_worker)
+        except Exception as e:
+            logging.error(f"Error loading model for inference: {e}")
+            self._fail_all(e)
+            return
+        while True:
+            requests = self._take()
+            if requests is None:
+                return
+            requests = [r for r in requests if r[0].set_running_or_notify_cancel()]
+            if not requests:
+                continue
+            try:
+                if requests[0][2] == "features":
+                    future, features, _ = requests[0]
+                    future.set_result(scorer.score_features(features, batch_size=self.batch_size))
+                elif requests[0][2]:
+                    future, windows, _ = requests[0]
+                    future.set_result(scorer.score(windows, batch_size=self.batch_size))
+                else:
+                    labels, confidences = scorer.score(np.stack([r[1] for r in requests]),
+                                                       batch_size=self.batch_size)
+                    for (future, _, _), label, confidence in zip(requests, labels, confidences):
+                        future.set_result((label, float(confidence)))
+                with self._cond:
+                    self.completed += len(requests)
+            except Exception as e:
+                logging.error(f"Error during inference: {e}")
+                with self._cond:
+                    self.failed += len(requests)
+                for future, _, _ in requests:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.num_workers,
+                "queue_depth": len(self._queue),
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def shutdown(self, wait=True, cancel_pending=True):
+        with self._cond:
+            self._running = False
+            if cancel_pending:
+                while self._queue:
+                    self._queue.popleft()[0].cancel()
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join(timeout=5)
+
+
+if __name__ == "__main__":
+    # Quick load test: flood the service with synthetic windows and report throughput
+    service = InferenceService(max_queue=32, drop_policy="drop_oldest")
+    rng = np.random.default_rng(0)
+    windows = (3000 * rng.standard_normal((256, 44100))).astype(np.float32)
+    start = time.perf_counter()
+    futures = [service.submit(window) for window in windows]
+    for future in futures:
+        if not future.cancelled():
+            future.result()
+    elapsed = time.perf_counter() - start
+    stats = service.stats()
+    print(f"{stats['completed']} windows in {elapsed:.2f} s ({stats['completed'] / elapsed:.1f} windows/s), "
+          f"{stats['dropped']} dropped: {stats}")
+    service.shutdown()
@@ -0,0 +1,279 @@
+import argparse
+import collections
+import logging
+import threading
+import time
+from audio_capture import AudioCapture, DeviceSource, FileSource, NetworkSource, SyntheticSource
+from model_inference import BatchScorer
+from stream_detector import StreamingDetector, print_result
+import metrics
+
+
+class MicrophoneChannel:
+    """
+    One audio source with its own ring buffer, level meter and trigger.
+    """
+
+    def __init__(self, mic_id, source, threshold_db=-27, cooldown_time=2, continuous=False,
+                 hop_seconds=0.25, pre_trigger_seconds=0.5, post_trigger_seconds=1.0):
+        self.mic_id = mic_id
+        self.capture = AudioCapture(threshold_db=threshold_db, cooldown_time=cooldown_time, source=source)
+        self.detector = StreamingDetector(self.capture, hop_seconds=hop_seconds,
+                                          pre_trigger_seconds=pre_trigger_seconds,
+                                          post_trigger_seconds=post_trigger_seconds, continuous=continuous)
+        self.finished = False
+        self.peak_db = None
+
+    def stats(self):
+        stats = self.detector.stats()
+        stats.update({"volume_db": self.detector.last_volume_db, "peak_db": self.peak_db, "finished": self.finished})
+        return stats
+
+
+class InferenceScheduler:
+    """
+    Scores windows from every channel in shared batches.
+
+    Each microphone has its own bounded queue (oldest windows are dropped when it
+    overflows) and batches are filled round-robin across microphones, so one busy source
+    can neither starve the others nor grow memory without bound. Windows that cannot be
+    scored (including every window, if the model fails to load) are counted in `failed`.
+    """
+
+    def __init__(self, on_result, num_workers=1, batch_size=16, max_pending_per_source=32, threads_per_worker=1):
+        self.on_result = on_result
+        self.batch_size = batch_size
+        self.max_pending_per_source = max_pending_per_source
+        self.threads_per_worker = threads_per_worker
+        self._pending = collections.OrderedDict()  # mic_id -> deque of (channel, window)
+        self._cond = threading.Condition()
+        self._running = True
+        self.dropped = collections.Counter()
+        self.scored = collections.Counter()
+        self.failed = collections.Counter()
+        self.batches = 0
+        self._workers = [threading.Thread(target=self._worker_loop, name=f"scheduler-{i}", daemon=True)
+                         for i in range(num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, channel, windows):
+        if not windows:
+            return
+        with self._cond:
+            queue = self._pending.setdefault(channel.mic_id, collections.deque())
+            for window in windows:
+                if len(queue) >= self.max_pending_per_source:
+                    queue.popleft()
+                    self.dropped[channel.mic_id] += 1
+                    metrics.inc("dropped_windows_total", stage="scheduler")
+                queue.append((channel, window))
+            self._cond.notify()
+
+    def _next_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: any(self._pending.values()) or not self._running)
+            batch = []
+            while len(batch) < self.batch_size and any(self._pending.values()):
+                # One window per microphone per round; served microphones move to the back
+                for mic_id in list(self._pending):
+                    queue = self._pending[mic_id]
+                    if queue and len(batch) < self.batch_size:
+                        batch.append(queue.popleft())
+                        self._pending.move_to_end(mic_id)
+            return batch
+
+    def _fail(self, batch):
+        with self._cond:
+            for channel, _ in batch:
+                self.failed[channel.mic_id] += 1
+
+    def _worker_loop(self):
+        import numpy as np
+        try:
+            scorer = BatchScorer(num_threads=self.threads_per_worker)
+        except Exception as e:
+            # Keep consuming so the queues do not fill up, counting every window as failed
+            logging.error(f"Error loading model for inference: {e}")
+            scorer = None
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            if scorer is None:
+                self._fail(batch)
+                continue
+            try:
+                labels, confidences = scorer.score(np.stack([window["audio"] for _, window in batch]),
+                                                   batch_size=self.batch_size)
+            except Exception as e:
+                logging.error(f"Error during inference: {e}")
+                self._fail(batch)
+                continue
+            with self._cond:
+                self.batches += 1
+                results = []
+                for (channel, window), label, confidence in zip(batch, labels, confidences):
+                    self.scored[channel.mic_id] += 1
+                    result = channel.detector.make_result(window, label, confidence)
+                    result["microphone"] = channel.mic_id
+                    results.append(result)
+            for result in results:
+                self.on_result(result)
+
+    def pending(self):
+        with self._cond:
+            return sum(len(queue) for queue in self._pending.values())
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._pending.clear()
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=5)
+
+
+class IngestionEngine:
+    """
+    Runs N microphone channels concurrently, one metering thread each, feeding one
+    shared InferenceScheduler. Every result carries its "microphone" id.
+    """
+
+    def __init__(self, channels, on_result, num_workers=1, batch_size=16, max_pending_per_source=32):
+        self.channels = channels
+        self.scheduler = InferenceScheduler(on_result, num_workers=num_workers, batch_size=batch_size,
+                                            max_pending_per_source=max_pending_per_source)
+        self._running = True
+        self._threads = []
+
+    def _channel_loop(self, channel):
+        while self._running:
+            windows = channel.detector.advance(timeout=0.5)
+            if windows is None:
+                finished = getattr(channel.capture.source, "finished", None)
+                if finished is not None and finished.is_set():
+                    channel.finished = True
+                    return
+                continue
+            volume_db = channel.detector.last_volume_db
+            if channel.peak_db is None or volume_db > channel.peak_db:
+                channel.peak_db = volume_db
+            self.scheduler.submit(channel, windows)
+
+    def start(self):
+        for channel in self.channels:
+            channel.capture.start()
+            thread = threading.Thread(target=self._channel_loop, args=(channel,), name=f"mic-{channel.mic_id}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wait(self, timeout=None):
+        """
+        Wait for every finite source to run out (forever for live sources).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=2)
+        # Let queued windows drain before stopping the workers
+        deadline = time.monotonic() + 10
+        while self.scheduler.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.scheduler.stop()
+        for channel in self.channels:
+            channel.capture.cleanup()
+
+    def stats(self):
+        stats = {}
+        for channel in self.channels:
+            channel_stats = channel.stats()
+            channel_stats["scheduler_scored"] = self.scheduler.scored[channel.mic_id]
+            channel_stats["scheduler_dropped"] = self.scheduler.dropped[channel.mic_id]
+            channel_stats["scheduler_failed"] = self.scheduler.failed[channel.mic_id]
+            stats[channel.mic_id] = channel_stats
+        return stats
+
+
+def _pairs(values):
+    for value in values or []:
+        mic_id, _, target = value.partition("=")
+        if not target:
+            raise SystemExit(f"Expected MIC_ID=VALUE, got {value!r}")
+        yield mic_id, target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-microphone ingestion with a shared inference scheduler.")
+    parser.add_argument("--device", action="append", metavar="MIC=INDEX", help="Local input device")
+    parser.add_argument("--wav", action="append", metavar="MIC=PATH", help="Replay a WAV file in real time")
+    parser.add_argument("--udp", action="append", metavar="MIC=PORT", help="Listen for UDP PCM (pcm_sender.py)")
+    parser.add_argument("--tcp", action="append", metavar="MIC=PORT", help="Listen for TCP PCM (pcm_sender.py)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Add N synthetic microphones")
+    parser.add_argument("--threshold", type=float, default=-27, help="Trigger level in dBFS")
+    parser.add_argument("--continuous", action="store_true", help="Score every hop, ignoring the trigger")
+    parser.add_argument("--workers", type=int, default=1, help="Inference worker threads")
+    parser.add_argument("--batch-size", type=int, default=16, help="Windows per invoke")
+    parser.add_argument("--log", action="store_true", help="Save detections through LogManager")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this local port")
+    parser.add_argument("--metrics-file", help="Periodically write Prometheus metrics to this file")
+    args = parser.parse_args()
+
+    channels = []
+    for mic_id, index in _pairs(args.device):
+        channels.append(MicrophoneChannel(mic_id, DeviceSource(int(index)), args.threshold, continuous=args.continuous))
+    for mic_id, path in _pairs(args.wav):
+        channels.append(MicrophoneChannel(mic_id, FileSource(path), args.threshold, continuous=args.continuous))
+    for protocol, values in (("udp", args.udp), ("tcp", args.tcp)):
+        for mic_id, port in _pairs(values):
+            channels.append(MicrophoneChannel(mic_id, NetworkSource(int(port), protocol=protocol), args.threshold,
+                                              continuous=args.continuous))
+    for i in range(args.synthetic):
+        channels.append(MicrophoneChannel(f"Syn{i + 1:03d}", SyntheticSource(seed=i), args.threshold,
+                                          continuous=args.continuous))
+    if not channels:
+        parser.error("no microphones configured")
+
+    log_manager = None
+    if args.log:
+        from log_manager import LogManager
+        log_manager = LogManager()
+
+    def on_result(result):
+        print(f"{result['microphone']:>8s} ", end="")
+        print_result(result)
+        if log_manager is not None and result["label"] == "Gunshot":
+            log_manager.save_log({
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "volume": f"{result['volume_db']:.2f}",
+                "prediction": result["label"],
+                "microphone": result["microphone"],
+                "confidence": result["confidence"],
+            }, id_prefix=result["microphone"])
+
+    _, metrics_writer = metrics.start_exporters(args.metrics_port, args.metrics_file)
+    engine = IngestionEngine(channels, on_result, num_workers=args.workers, batch_size=args.batch_size)
+    engine.start()
+    print(f"Ingesting {len(channels)} microphones... Press Ctrl+C to stop.")
+    try:
+        engine.wait()
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt received. Stopping ingestion.")
+    finally:
+        engine.stop()
+        for mic_id, stats in engine.stats().items():
+            print(f"{mic_id}: {stats}")
+        if log_manager is not None:
+            log_manager.close()
+        if metrics_writer is not None:
+            metrics_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
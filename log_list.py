@@ -0,0 +1,141 @@
+import customtkinter as ctk
+
+
+class VirtualLogList(ctk.CTkFrame):
+    """
+    Scrollable list of log entries that only creates widgets for the rows on screen.
+
+    A pool of row buttons sized to the visible height is recycled as the view scrolls. History is pulled a page
+    at a time through `fetch_page(cursor, limit) -> (entries, next_cursor)` when the view
+    nears the end of what has been loaded, and live events are added with `append`.
+    Rows are shown newest first.
+    """
+
+    def __init__(self, master, fetch_page, on_select, row_height=28, page_size=100, **kwargs):
+        super().__init__(master, **kwargs)
+        self.fetch_page = fetch_page
+        self.on_select = on_select
+        self.row_height = row_height
+        self.page_size = page_size
+
+        self._history = []  # Entries loaded from the store, newest first
+        self._live = []  # Entries appended since startup, oldest first
+        self._cursor = None
+        self._has_more = True
+        self._offset = 0  # Index of the first visible row
+        self._rows = []  # Recycled row buttons
+        self._row_entries = []  # Entry currently shown by each row button
+
+        self._canvas = ctk.CTkFrame(self, fg_color="transparent")
+        self._canvas.pack(side="left", fill="both", expand=True)
+        self._scrollbar = ctk.CTkScrollbar(self, orientation="vertical", command=self._on_scrollbar)
+        self._scrollbar.pack(side="right", fill="y")
+
+        self._canvas.bind("<Configure>", self._on_resize)
+        self._bind_wheel(self._canvas)
+        self.load_more()
+
+    def __len__(self):
+        return len(self._live) + len(self._history)
+
+    def _entry_at(self, index):
+        if index < len(self._live):
+            return self._live[len(self._live) - 1 - index]
+        return self._history[index - len(self._live)]
+
+    def load_more(self):
+        """
+        Fetch the next page of history from the store.
+        """
+        if not self._has_more:
+            return
+        entries, self._cursor = self.fetch_page(self._cursor, self.page_size)
+        self._has_more = self._cursor is not None
+        self._history.extend(entries)
+        self._render()
+
+    def append(self, entry):
+        """
+        Add a live entry at the top. If the user has scrolled down, the view stays on
+        the rows they are looking at.
+        """
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """
+        Add several live entries (oldest first) with a single redraw.
+        """
+        self._live.extend(entries)
+        if self._offset > 0:
+            self._offset += len(entries)
+        self._render()
+
+    def _visible_rows(self):
+        height = self._canvas.winfo_height()
+        return max(1, int(height / self._apply_widget_scaling(self.row_height)) + 1)
+
+    def _on_resize(self, event=None):
+        needed = self._visible_rows()
+        while len(self._rows) < needed:
+            index = len(self._rows)
+            row = ctk.CTkButton(self._canvas, text="", height=self.row_height - 4,
+                                command=lambda index=index: self._on_click(index))
+            self._bind_wheel(row)
+            self._rows.append(row)
+            self._row_entries.append(None)
+        # Shrinking (e.g. restoring a maximised window) releases the rows no longer on screen
+        while len(self._rows) > needed:
+            self._rows.pop().destroy()
+            self._row_entries.pop()
+        self._render()
+
+    def _on_click(self, row_index):
+        entry = self._row_entries[row_index]
+        if entry is not None:
+            self.on_select(entry)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda e: self.scroll(-1))
+        widget.bind("<Button-5>", lambda e: self.scroll(1))
+
+    def scroll(self, rows):
+        self._set_offset(self._offset + rows)
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self._set_offset(int(float(value) * self._scroll_total()))
+        elif action == "scroll":
+            step = self._visible_rows() - 1 if unit == "pages" else 1
+            self.scroll(int(value) * step)
+
+    def _scroll_total(self):
+        # Unknown remaining history counts as one more page so the thumb never hits the end early
+        return len(self) + (self.page_size if self._has_more else 0)
+
+    def _set_offset(self, offset):
+        visible = len(self._rows)
+        if self._has_more and offset + 2 * visible >= len(self):
+            self.load_more()
+        self._offset = max(0, min(offset, len(self) - visible + 1))
+        self._render()
+
+    def _render(self):
+        visible = len(self._rows)
+        step = self.row_height
+        for i, row in enumerate(self._rows):
+            index = self._offset + i
+            entry = self._entry_at(index) if index < len(self) else None
+            if entry is self._row_entries[i]:
+                continue  # Unchanged row: skip the redraw
+            self._row_entries[i] = entry
+            if entry is None:
+                row.place_forget()
+            else:
+                row.configure(text=f"Log {entry['id']}")
+                row.place(x=0, y=i * step, relwidth=1.0)
+        total = self._scroll_total()
+        if total and visible:
+            self._scrollbar.set(self._offset / total, min(1.0, (self._offset + visible) / total))
+        else:
+            self._scrollbar.set(0.0, 1.0)
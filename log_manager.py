@@ -1,12 +1,19 @@
 import os
 import json
-from tkinter import filedialog
+import logging
+import threading
+from log_store import LogStore
+
+# The GUI kept its history here, relative to the working directory, before the SQLite store
+LEGACY_LOG_FILE = "logs.json"
 
 
 class LogManager:
     def __init__(self, default_log_file="logs.json", config_file="config.json"):
         self.config_file = config_file
         self.log_file_path = default_log_file
+        self.store = None
+        self._store_lock = threading.Lock()  # Ingestion threads may open the store concurrently
         self.load_config()
 
     def load_config(self):
@@ -36,43 +43,108 @@ class LogManager:
         """
         Prompt the user to select or confirm a directory for storing logs.
         """
+        from tkinter import filedialog  # Only the GUI prompts; headless services never load Tk
+
         directory = filedialog.askdirectory(title="Select Directory for Logs")
         if directory:
             self.log_file_path = os.path.join(directory, "logs.json")
             self.save_config()
+            self.close()
+
+    @property
+    def database_path(self):
+        """
+        The SQLite store lives next to the configured logs.json.
+        """
+        return os.path.splitext(self.log_file_path)[0] + ".db"
 
     def initialize_log_file(self):
         """
-        Create the log file if it doesn't exist.
+        Open the log store, importing an existing logs.json (the configured one and the
+        GUI's legacy ./logs.json) the first time.
         """
-        if not os.path.exists(self.log_file_path):
-            with open(self.log_file_path, "w") as f:
-                json.dump([], f, indent=4)
+        with self._store_lock:
+            if self.store is None:
+                store = LogStore(self.database_path)
+                sources = [self.log_file_path]
+                if os.path.abspath(LEGACY_LOG_FILE) != os.path.abspath(self.log_file_path):
+                    sources.append(LEGACY_LOG_FILE)
+                for json_path in sources:
+                    imported = store.migrate_json(json_path)
+                    if imported:
+                        print(f"Imported {imported} log entries from {json_path}")
+                # Publish only once the import is done, so no entry is saved before it
+                self.store = store
 
-    def save_log(self, log_entry):
+    def save_log(self, log_entry, id_prefix=None):
         """
-        Save a single log entry to the log file.
+        Save a single log entry to the log store. With `id_prefix` the entry is given a
+        unique "<prefix>-<n>" id. Returns the saved entry.
         """
         try:
             self.initialize_log_file()
-            with open(self.log_file_path, "r") as f:
-                logs = json.load(f)
+            return self.store.append(log_entry, id_prefix=id_prefix)
+        except Exception as e:
+            logging.error(f"Error saving log: {e}")
+            return None
 
-            logs.append(log_entry)
+    def fetch_logs(self, start=None, end=None, labels=None, microphones=None, limit=None):
+        """
+        Fetch logs from the log store, newest first, optionally filtered by time range
+        ("YYYY-MM-DD HH:MM:SS"), labels and microphones. Without a limit this returns the
+        whole history; use query_logs to page through large stores.
+        """
+        try:
+            self.initialize_log_file()
+            self.store.flush()
+            if limit is None:
+                limit = self.store.count(start, end, labels, microphones) or 1
+            logs, _ = self.store.query(start, end, labels, microphones, limit=limit)
+            return logs
+        except Exception as e:
+            logging.error(f"Error fetching logs: {e}")
+            return []
 
-            with open(self.log_file_path, "w") as f:
-                json.dump(logs, f, indent=4)
+    def query_logs(self, start=None, end=None, labels=None, microphones=None, limit=100, cursor=None,
+                   newest_first=True):
+        """
+        Fetch one page of logs. Returns (logs, next_cursor); next_cursor is None on the last page.
+        """
+        try:
+            self.initialize_log_file()
+            self.store.flush()
+            return self.store.query(start, end, labels, microphones, limit=limit, cursor=cursor,
+                                    newest_first=newest_first)
         except Exception as e:
-            print(f"Error saving log: {e}")
+            logging.error(f"Error fetching logs: {e}")
+            return [], None
 
-    def fetch_logs(self):
+    def count_logs(self, start=None, end=None, labels=None, microphones=None):
+        try:
+            self.initialize_log_file()
+            self.store.flush()
+            return self.store.count(start, end, labels, microphones)
+        except Exception as e:
+            logging.error(f"Error counting logs: {e}")
+            return 0
+
+    def event_counts(self, start=None, end=None, labels=None, microphones=None, bucket="hour"):
         """
-        Fetch all logs from the log file.
+        Aggregate counts per time bucket and label, e.g. events per hour per label.
         """
         try:
             self.initialize_log_file()
-            with open(self.log_file_path, "r") as f:
-                return json.load(f)
+            self.store.flush()
+            return self.store.counts(start, end, labels, microphones, bucket=bucket)
         except Exception as e:
-            print(f"Error fetching logs: {e}")
+            logging.error(f"Error counting logs: {e}")
             return []
+
+    def close(self):
+        """
+        Commit pending entries and close the store.
+        """
+        with self._store_lock:
+            if self.store is not None:
+                self.store.close()
+                self.store = None
@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import metrics
+
+# Columns stored natively; any other keys of a log entry go into the `extra` JSON column
+LOG_COLUMNS = ["id", "time", "volume", "prediction", "microphone", "confidence"]
+
+
+def _entry_to_row(entry):
+    extra = {k: v for k, v in entry.items() if k not in LOG_COLUMNS}
+    return tuple(entry.get(column) for column in LOG_COLUMNS) + (json.dumps(extra) if extra else None,)
+
+
+def _row_to_entry(row):
+    entry = {"id": row[0], "time": row[1], "volume": row[2], "prediction": row[3]}
+    if row[4] is not None:
+        entry["microphone"] = row[4]
+    if row[5] is not None:
+        entry["confidence"] = row[5]
+    if row[6]:
+        entry.update(json.loads(row[6]))
+    return entry
+
+
+class LogStore:
+    """
+    Append-only event log in SQLite (WAL mode).
+
+    `append` only queues the entry; a background writer thread group-commits everything
+    queued so far in a single transaction, so an event costs O(1) I/O regardless of how
+    many events are stored, and there is exactly one writer.
+    """
+
+    SELECT = "SELECT id, time, volume, prediction, microphone, confidence, extra, seq FROM logs"
+    BUCKETS = {"minute": 16, "hour": 13, "day": 10}  # Prefix length of "YYYY-MM-DD HH:MM:SS"
+
+    def __init__(self, db_path, max_batch=1000, synchronous="NORMAL"):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.synchronous = synchronous
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._read_lock = threading.Lock()
+        self._reader = self._connect(check_same_thread=False)
+        self._create_schema(self._reader)
+
+        self._seq_lock = threading.Lock()
+        self._next_seq = self._max_seq() + 1
+
+        self._queue = queue.Queue()
+        self.written = 0
+        self.commits = 0
+        self._writer = threading.Thread(target=self._writer_loop, name="log-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.db_path, check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS logs (
+                    seq INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL,
+                    time TEXT,
+                    volume TEXT,
+                    prediction TEXT,
+                    microphone TEXT,
+                    confidence REAL,
+                    extra TEXT
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Every query filters or orders by time, so each index ends in (time, seq)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_time ON logs (time, seq)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_id ON logs (id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_prediction ON logs (prediction, time, seq)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_microphone ON logs (microphone, time, seq)")
+
+    def _max_seq(self):
+        with self._read_lock:
+            return self._reader.execute("SELECT COALESCE(MAX(seq), 0) FROM logs").fetchone()[0]
+
+    def _writer_loop(self):
+        conn = self._connect()
+        insert = f"INSERT INTO logs ({', '.join(LOG_COLUMNS)}, extra, seq) VALUES ({', '.join('?' * (len(LOG_COLUMNS) + 2))})"
+        while True:
+            item = self._queue.get()
+            batch = []
+            waiters = []
+            stop = False
+            # Take whatever else is already queued and commit it together
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with metrics.timer("log_write_seconds"), conn:
+                        conn.executemany(insert, batch)
+                    self.written += len(batch)
+                    self.commits += 1
+                except Exception as e:
+                    logging.error(f"Error saving logs: {e}")
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                conn.close()
+                return
+
+    def append(self, entry, id_prefix=None):
+        """
+        Queue a log entry for the background writer and return it. With `id_prefix` the
+        entry gets a unique id of the form "<prefix>-<seq>".
+        """
+        with self._seq_lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            if id_prefix is not None:
+                entry = dict(entry, id=f"{id_prefix}-{seq}")
+            self._queue.put(_entry_to_row(entry) + (seq,))
+        return entry
+
+    def flush(self, timeout=None):
+        """
+        Block until every entry queued before this call has been committed.
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    @staticmethod
+    def _filters(start=None, end=None, labels=None, microphones=None, event_id=None):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("time >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("time < ?")
+            params.append(end)
+        if labels:
+            clauses.append(f"prediction IN ({', '.join('?' * len(labels))})")
+            params.extend(labels)
+        if microphones:
+            clauses.append(f"microphone IN ({', '.join('?' * len(microphones))})")
+            params.extend(microphones)
+        if event_id is not None:
+            clauses.append("id = ?")
+            params.append(event_id)
+        return clauses, params
+
+    def query(self, start=None, end=None, labels=None, microphones=None, limit=100, cursor=None,
+              newest_first=True):
+        """
+        One page of entries with `start <= time < end` (times as "YYYY-MM-DD HH:MM:SS"),
+        optionally restricted to some labels or microphones. Returns (entries, next_cursor);
+        pass next_cursor back to get the following page, None means there are no more.
+        """
+        clauses, params = self._filters(start, end, labels, microphones)
+        if cursor is not None:
+            cursor_time, cursor_seq = cursor.rsplit("|", 1)
+            clauses.append("(time, seq) < (?, ?)" if newest_first else "(time, seq) > (?, ?)")
+            params.extend([cursor_time, int(cursor_seq)])
+        order = "DESC" if newest_first else "ASC"
+        sql = self.SELECT
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY time {order}, seq {order} LIMIT ?"
+        params.append(limit)
+        with self._read_lock:
+            rows = self._reader.execute(sql, params).fetchall()
+        next_cursor = f"{rows[-1][1]}|{rows[-1][7]}" if len(rows) == limit else None
+        return [_row_to_entry(row) for row in rows], next_cursor
+
+    def count(self, start=None, end=None, labels=None, microphones=None):
+        clauses, params = self._filters(start, end, labels, microphones)
+        sql = "SELECT COUNT(*) FROM logs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchone()[0]
+
+    def exists(self, event_id):
+        with self._read_lock:
+            return self._reader.execute("SELECT 1 FROM logs WHERE id = ? LIMIT 1", (event_id,)).fetchone() is not None
+
+    def counts(self, start=None, end=None, labels=None, microphones=None, bucket="hour"):
+        """
+        Event counts per time bucket ("minute", "hour" or "day") and label, oldest first,
+        as a list of {"bucket", "prediction", "count"} dicts.
+        """
+        width = self.BUCKETS[bucket]
+        clauses, params = self._filters(start, end, labels, microphones)
+        sql = f"SELECT substr(time, 1, {width}) AS bucket, prediction, COUNT(*) FROM logs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " GROUP BY bucket, prediction ORDER BY bucket, prediction"
+        with self._read_lock:
+            rows = self._reader.execute(sql, params).fetchall()
+        return [{"bucket": row[0], "prediction": row[1], "count": row[2]} for row in rows]
+
+    def fetch_all(self):
+        with self._read_lock:
+            return [_row_to_entry(row) for row in self._reader.execute(self.SELECT + " ORDER BY seq")]
+
+    def migrate_json(self, json_path):
+        """
+        One-time import of a legacy logs.json array. The JSON file is left untouched and
+        the import is recorded so it never runs twice; a file that cannot be parsed is not
+        recorded, so it is retried once fixed. Returns the number of entries imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        key = "migrated:" + os.path.abspath(json_path)
+        with self._read_lock:
+            if self._reader.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+            with open(json_path, "r") as f:
+                try:
+                    logs = json.load(f)
+                except json.JSONDecodeError as e:
+                    logging.error(f"Error reading legacy log file {json_path}: {e}")
+                    return 0
+            with self._reader:
+                self._reader.executemany(
+                    f"INSERT INTO logs ({', '.join(LOG_COLUMNS)}, extra) VALUES ({', '.join('?' * (len(LOG_COLUMNS) + 1))})",
+                    [_entry_to_row(entry) for entry in logs])
+                self._reader.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(len(logs))))
+        with self._seq_lock:
+            self._next_seq = max(self._next_seq, self._max_seq() + 1)
+        return len(logs)
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+        with self._read_lock:
+            self._reader.close()
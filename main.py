@@ -1,50 +1,102 @@
+import argparse
 import customtkinter as ctk
 from tkintermapview import TkinterMapView
 from tkinter import messagebox, filedialog
+import logging
 import threading
 import time
-import json
 import os
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeoutError
+import numpy as np
 from audio_capture import AudioCapture
-from model_inference import run_inference
+from daemon import DaemonClient, DEFAULT_HOST, DEFAULT_PORT, parse_address
+from detection_cascade import DetectionCascade, DEFAULT_CASCADE
+from event_aggregator import EventAggregator, SHOT_INTERVAL, event_log_entry
+from feature_cache import window_features
+from file_stream import WavStream
+from inference_service import InferenceService
+from model_inference import summarize_predictions
+from process_pipeline import ProcessPipeline
 from log_manager import LogManager
-import librosa
-import numpy as np
+from log_list import VirtualLogList
+import metrics
+from ui_bus import UiEventBus, PeakHold
 
 
 class SoundwatcherApp(ctk.CTk):
-    def __init__(self):
+    UI_FPS = 15  # Rate at which background updates are applied to the widgets
+    SIMULATION_CACHE_SECONDS = 60  # Longer recordings are streamed batch by batch instead of decoded whole
+    SIMULATION_BATCH_TIMEOUT = 30  # Seconds to wait for one streamed batch before giving up
+
+    def __init__(self, ui_fps=UI_FPS, daemon_address=None, processes=None):
         super().__init__()
         self.title("Soundwatcher PoC - Full Layout with Info Buttons")
         self.geometry("1280x720")
         self.running = True
-        self.loaded_log_ids = set()
-        self.threshold_value = 90
+        self.threshold_value = 90  # Calibrated dB SPL
         self.audio_file_path = None
-        self.log_file_path = "logs.json"
 
         # Log Manager
         self.log_manager = LogManager()
 
-        # Initialize AudioCapture
-        self.audio_capture = AudioCapture()
+        self.pipeline = None
+        if daemon_address is None and processes:
+            # Capture, burst merging and inference run in child processes over shared memory;
+            # this process only logs finished events and starts an inference pool if a
+            # simulation is requested
+            self.daemon_client = None
+            self.cascade = None
+            self.audio_capture = None
+            self.pipeline = ProcessPipeline(workers=processes, threshold_db=self.threshold_value,
+                                            cooldown_time=SHOT_INTERVAL)
+            self.aggregator = None
+            self.inference_service = None
+        elif daemon_address is None:
+            # Initialize AudioCapture; the cascade's level gate follows the threshold slider
+            self.daemon_client = None
+            self.cascade = DetectionCascade.from_config(DEFAULT_CASCADE, rate=AudioCapture.RATE)
+            self.cascade.level_gate.threshold_db = self.threshold_value
+            self.audio_capture = AudioCapture(cascade=self.cascade, cooldown_time=SHOT_INTERVAL)
+            # Triggers close together become one burst event with a single log entry
+            self.aggregator = EventAggregator()
+
+            # Inference runs on its own worker pool so capture, simulation and the UI never wait on it
+            self.inference_service = InferenceService(max_queue=32, drop_policy="drop_oldest")
+        else:
+            # A running daemon captures, detects and logs; the GUI only subscribes to it and
+            # starts an inference pool if a simulation is requested
+            host, port = daemon_address
+            self.daemon_client = DaemonClient(self.handle_daemon_message, host=host, port=port)
+            self.cascade = None
+            self.audio_capture = None
+            self.aggregator = None
+            self.inference_service = None
+
+        # Background threads publish here; the main loop applies updates at a fixed frame rate
+        self.ui_bus = UiEventBus(fps=ui_fps)
+
+        # Optional metrics endpoint/file, configured through SOUNDWATCHER_METRICS_PORT / _FILE
+        self.metrics_server, self.metrics_writer = metrics.start_exporters()
+        self.volume_peak = PeakHold()
 
         # Configure grid layout
         self.configure_grid()
 
         # Sidebar (Logs Section)
-        self.sidebar = ctk.CTkScrollableFrame(self, width=300)
+        self.sidebar = ctk.CTkFrame(self, width=300)
         self.sidebar.grid(row=0, column=0, rowspan=2, sticky="ns", padx=10, pady=10)
         self.sidebar_label = ctk.CTkLabel(self.sidebar, text="Logs", font=ctk.CTkFont(size=16, weight="bold"))
         self.sidebar_label.pack(pady=5)
 
-        self.logs_container = ctk.CTkFrame(self.sidebar)
-        self.logs_container.pack(fill="both", expand=True, padx=5, pady=5)
-
         # Info button for Logs section
-        info_logs_button = ctk.CTkButton(self.logs_container, text="?", width=25, height=25, command=self.show_logs_info)
+        info_logs_button = ctk.CTkButton(self.sidebar, text="?", width=25, height=25, command=self.show_logs_info)
         info_logs_button.pack(side="bottom", anchor="se", pady=5, padx=5)
 
+        # Only visible rows get widgets; history is paged in from the log store while scrolling
+        self.logs_container = VirtualLogList(self.sidebar, fetch_page=self.fetch_logs_page,
+                                             on_select=self.show_log_popup, width=280)
+        self.logs_container.pack(fill="both", expand=True, padx=5, pady=5)
+
         # Map Section
         self.map_view = TkinterMapView(self, width=800, height=400, corner_radius=0)
         self.map_view.grid(row=0, column=1, sticky="nsew", padx=10, pady=10)
@@ -87,6 +139,8 @@ class SoundwatcherApp(ctk.CTk):
         ctk.CTkLabel(self.realtime_frame, text="Microphone ID# Realtime Volume", font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
         self.realtime_volume_label = ctk.CTkLabel(self.realtime_frame, text="- dB", font=ctk.CTkFont(size=36, weight="bold"))
         self.realtime_volume_label.pack(pady=10)
+        self.peak_volume_label = ctk.CTkLabel(self.realtime_frame, text="Peak: - dB", font=ctk.CTkFont(size=12))
+        self.peak_volume_label.pack()
 
         self.threshold_slider = ctk.CTkSlider(self.realtime_frame, from_=70, to=130, number_of_steps=50, command=self.update_threshold_label)
         self.threshold_slider.set(self.threshold_value)
@@ -133,12 +187,25 @@ class SoundwatcherApp(ctk.CTk):
         info_prediction_button = ctk.CTkButton(self.prediction_frame, text="?", width=25, height=25, command=self.show_prediction_info)
         info_prediction_button.pack(side="bottom", anchor="se", pady=5, padx=5)
 
-        # Start Threads
-        self.audio_thread = threading.Thread(target=self.start_realtime_audio, daemon=True)
-        self.audio_thread.start()
+        # UI update pipeline
+        self.ui_bus.subscribe_volume(self.update_volume)
+        self.ui_bus.subscribe("detection", self.handle_realtime_results)
+        self.ui_bus.subscribe("daemon_detection", self.handle_daemon_detections)
+        self.ui_bus.subscribe("daemon_threshold", lambda values: self.show_threshold(values[-1]))
+        self.ui_bus.subscribe("simulation", self.handle_simulation_results)
+        self.ui_bus.subscribe("simulation_progress", lambda updates: self.show_simulation_progress(*updates[-1]))
+        self.ui_bus.subscribe("simulation_error", lambda errors: self.show_simulation_error())
+        self.ui_bus.start(self)
 
-        self.logs_thread = threading.Thread(target=self.fetch_logs, daemon=True)
-        self.logs_thread.start()
+        # Start Threads
+        if self.daemon_client is not None:
+            self.daemon_client.start()
+        elif self.pipeline is not None:
+            self.audio_thread = threading.Thread(target=self.start_process_pipeline, daemon=True)
+            self.audio_thread.start()
+        else:
+            self.audio_thread = threading.Thread(target=self.start_realtime_audio, daemon=True)
+            self.audio_thread.start()
 
         # Closing Event
         self.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -153,6 +220,17 @@ class SoundwatcherApp(ctk.CTk):
 
     def set_threshold(self):
         self.threshold_value = self.threshold_slider.get()
+        if self.daemon_client is not None:
+            self.daemon_client.send({"type": "set_threshold", "value": self.threshold_value})
+        elif self.pipeline is not None:
+            self.pipeline.set_threshold(self.threshold_value)
+        else:
+            self.cascade.level_gate.threshold_db = self.threshold_value
+
+    def show_threshold(self, value):
+        self.threshold_value = value
+        self.threshold_slider.set(value)
+        self.update_threshold_label(value)
 
     def add_microphone_markers(self):
         microphones = [
@@ -175,17 +253,66 @@ class SoundwatcherApp(ctk.CTk):
         try:
             while self.running:
                 audio_data, volume_db = self.audio_capture.get_audio_data()
-                self.realtime_volume_label.configure(text=f"{volume_db:.2f} dB")
-
-                # Check if the volume exceeds the threshold
-                if volume_db > self.threshold_value:
-                    label, confidence = run_inference(audio_data)
-                    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                    event_id = f"RT-{len(self.loaded_log_ids) + 1}"
-                    self.register_log(event_id, timestamp, f"{volume_db:.2f}", label)
-                    self.show_camera_view("Camera #1")  # Trigger camera
+                now = time.monotonic()
+                for event in self.aggregator.poll(now):
+                    self.ui_bus.publish("detection", event)
+                if volume_db is None:
+                    continue
+                # Display and log calibrated dB SPL so readings match the threshold slider
+                volume_db = self.audio_capture.to_spl(volume_db)
+                self.ui_bus.publish_volume(volume_db)
+
+                # Audio is only returned once the detection cascade has passed the block
+                # Once a burst is confirmed its further shots are only counted, not scored
+                if audio_data is not None:
+                    event_id = self.aggregator.on_trigger(now, volume_db)
+                    if self.aggregator.claim(event_id):
+                        future = self.inference_service.submit(audio_data)
+                        future.add_done_callback(
+                            lambda f, event_id=event_id: self.aggregator.on_result(
+                                event_id, *(f.result() if not f.cancelled() and f.exception() is None
+                                            else (None, None)))
+                        )
         except Exception as e:
-            print(f"Error in real-time audio: {e}")
+            logging.error(f"Error in real-time audio: {e}")
+
+    def start_process_pipeline(self):
+        try:
+            self.pipeline.start()
+            while self.running:
+                # Window results only pace the loop; events arrive already merged
+                results = self.pipeline.results(timeout=1.0 / self.UI_FPS)
+                if self.pipeline.volume_db is not None:
+                    self.ui_bus.publish_volume(self.pipeline.volume_db)
+                for event in self.pipeline.events():
+                    self.ui_bus.publish("detection", event)
+                if results is None:
+                    break
+        except Exception as e:
+            logging.error(f"Error in capture pipeline: {e}")
+
+    def update_volume(self, volume_db, peak_db):
+        self.realtime_volume_label.configure(text=f"{volume_db:.2f} dB")
+        self.peak_volume_label.configure(text=f"Peak: {self.volume_peak.update(peak_db):.2f} dB")
+
+    def handle_realtime_results(self, events):
+        self.register_logs([("RT", event_log_entry(event)) for event in events])
+        self.show_camera_view("Camera #1")  # Trigger camera
+
+    def handle_daemon_message(self, message):
+        # Called on the daemon client thread
+        kind = message.get("type")
+        if kind == "volume":
+            self.ui_bus.publish_volume(message["volume_db"])
+        elif kind == "event" and message.get("log") is not None:
+            self.ui_bus.publish("daemon_detection", message["log"])
+        elif kind == "hello":
+            self.ui_bus.publish("daemon_threshold", message["threshold_db"])
+
+    def handle_daemon_detections(self, logs):
+        # The daemon has already saved these entries
+        self.logs_container.append_many(logs)
+        self.show_camera_view("Camera #1")  # Trigger camera
 
     def simulate_audio(self):
         file_path = filedialog.askopenfilename(filetypes=[("WAV Files", "*.wav")])
@@ -200,66 +327,98 @@ class SoundwatcherApp(ctk.CTk):
             self.confidence_label.configure(text="Confidence: Error")
             return
 
-        try:
-            audio_data, sr = librosa.load(self.audio_file_path, sr=16000)
-            audio_data = (audio_data * 32768).astype(np.int16)
-
-            label, confidence = run_inference(audio_data)
-            self.prediction_label.configure(text=f"Prediction: {label}")
-            self.confidence_label.configure(text=f"Confidence: {confidence:.2f}%")
+        # Decode off the Tk thread; the result comes back through the UI bus
+        self.prediction_label.configure(text="Prediction: ...")
+        self.confidence_label.configure(text="Confidence: ...")
+        if self.inference_service is None:
+            self.inference_service = InferenceService(max_queue=32, drop_policy="drop_oldest")
+        threading.Thread(target=self.run_simulation, args=(self.audio_file_path,), daemon=True).start()
 
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            event_id = f"Sim-{len(self.loaded_log_ids) + 1}"
-            self.register_log(event_id, timestamp, "-", label)
-            self.show_camera_view("Simulated Camera")  # Trigger camera for simulation
-        except Exception as e:
-            print(f"Error during simulation: {e}")
-            self.prediction_label.configure(text="Prediction: Error")
-            self.confidence_label.configure(text="Confidence: Error")
-
-    def fetch_logs(self):
-        try:
-            if not os.path.exists(self.log_file_path):
-                with open(self.log_file_path, "w") as f:
-                    json.dump([], f)
-
-            with open(self.log_file_path, "r") as f:
-                logs = json.load(f)
-                for log in logs:
-                    if log["id"] not in self.loaded_log_ids:
-                        self.register_log(log["id"], log["time"], log["volume"], log["prediction"])
-        except Exception as e:
-            print(f"Error fetching logs: {e}")
-
-    def register_log(self, event_id, timestamp, volume, prediction):
-        if event_id not in self.loaded_log_ids:
-            self.loaded_log_ids.add(event_id)
-
-            # Add the log to the UI
-            log_button = ctk.CTkButton(
-                self.logs_container,
-                text=f"Log {event_id}",
-                command=lambda: self.show_log_popup({"id": event_id, "time": timestamp, "volume": volume, "prediction": prediction})
-            )
-            log_button.pack(pady=2)
-
-            # Save the log to logs.json
-            self.save_log_to_file(event_id, timestamp, volume, prediction)
-
-    def save_log_to_file(self, event_id, timestamp, volume, prediction):
+    def run_simulation(self, audio_file_path):
         try:
-            with open(self.log_file_path, "r") as f:
-                logs = json.load(f)
-
-            logs.append({"id": event_id, "time": timestamp, "volume": volume, "prediction": prediction})
-
-            with open(self.log_file_path, "w") as f:
-                json.dump(logs, f, indent=4)
-        except Exception as e:
-            print(f"Error saving log: {e}")
+            stream = WavStream(audio_file_path, window_seconds=1.0, hop_seconds=0.5)
+            if stream.duration > self.SIMULATION_CACHE_SECONDS:
+                self.stream_simulation(stream)
+                return
+            # Decoded audio and spectrograms of overlapping 1 s windows come from the feature
+            # cache, so simulating the same file again skips straight to inference
+            features, _ = window_features(audio_file_path, window_seconds=1.0, hop_seconds=0.5, sr=16000)
+            future = self.inference_service.submit_features(features)
+            future.add_done_callback(lambda f: self.ui_bus.publish("simulation", f))
+        except (Exception, CancelledError) as e:
+            logging.error(f"Error during simulation: {e}")
+            self.ui_bus.publish("simulation_error", e)
+
+    def stream_simulation(self, stream):
+        # Long recordings are scored one batch of windows at a time and only the running
+        # clip-level result is kept, so memory stays flat however long the file is
+        labels = np.array([], dtype=object)
+        confidences = np.array([], dtype=np.float32)
+        total = len(stream)
+        for _, windows in stream.batches():
+            future = self.inference_service.submit_batch(windows.copy())
+            try:
+                batch_labels, batch_confidences = future.result(timeout=self.SIMULATION_BATCH_TIMEOUT)
+            except CancelledError:
+                # The service is shared with realtime audio and drops the oldest request when full
+                raise RuntimeError("a batch was dropped by the busy inference service")
+            except FutureTimeoutError:
+                future.cancel()
+                raise RuntimeError(f"a batch was not scored within {self.SIMULATION_BATCH_TIMEOUT} s")
+            label, confidence = summarize_predictions(np.concatenate([labels, batch_labels]),
+                                                      np.concatenate([confidences, batch_confidences]))
+            labels, confidences = np.array([label], dtype=object), np.array([confidence], dtype=np.float32)
+            self.ui_bus.publish("simulation_progress", (stream.windows_read / total, label))
+        future = Future()
+        future.set_result((labels, confidences))
+        self.ui_bus.publish("simulation", future)
+
+    def show_simulation_progress(self, fraction, label):
+        self.prediction_label.configure(text=f"Prediction: {label} ({fraction:.0%})")
+
+    def handle_simulation_results(self, futures):
+        for future in futures:
+            self.handle_simulation_result(future)
+
+    def handle_simulation_result(self, future):
+        if future.cancelled() or future.exception() is not None:
+            logging.error(f"Error during simulation: {'dropped' if future.cancelled() else future.exception()}")
+            self.show_simulation_error()
+            return
+        label, confidence = summarize_predictions(*future.result())
+        self.prediction_label.configure(text=f"Prediction: {label}")
+        self.confidence_label.configure(text=f"Confidence: {confidence:.2f}%")
+
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.register_logs([("Sim", {"time": timestamp, "volume": "-", "prediction": label})])
+        self.show_camera_view("Simulated Camera")  # Trigger camera for simulation
+
+    def show_simulation_error(self):
+        self.prediction_label.configure(text="Prediction: Error")
+        self.confidence_label.configure(text="Confidence: Error")
+
+    def fetch_logs_page(self, cursor, limit):
+        return self.log_manager.query_logs(limit=limit, cursor=cursor)
+
+    def register_logs(self, events):
+        """
+        Save (id_prefix, log_entry) events and add them to the log list with a single redraw.
+        """
+        logs = []
+        for id_prefix, entry in events:
+            # The log manager assigns a unique "<prefix>-<n>" id and queues the entry for the writer
+            log = self.log_manager.save_log(entry, id_prefix=id_prefix)
+            if log is not None:
+                logs.append(log)
+        if logs:
+            self.logs_container.append_many(logs)
 
     def show_log_popup(self, log):
         details = f"Time: {log['time']}\nVolume: {log['volume']}\nPrediction: {log['prediction']}"
+        if "shots" in log:
+            details += f"\nShots: {log['shots']}\nDuration: {log['duration']} s"
+        if "confidence" in log:
+            details += f"\nConfidence: {log['confidence']}%"
         messagebox.showinfo("Log Details", details)
 
     def show_logs_info(self):
@@ -299,9 +458,36 @@ class SoundwatcherApp(ctk.CTk):
 
     def on_close(self):
         self.running = False
+        self.ui_bus.stop()
+        if self.daemon_client is not None:
+            self.daemon_client.stop()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            # Bursts that were still open when the window closed
+            for event in self.pipeline.events():
+                self.log_manager.save_log(event_log_entry(event), id_prefix="RT")
+        if self.inference_service is not None:
+            self.inference_service.shutdown(wait=False)
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        if self.metrics_writer is not None:
+            self.metrics_writer.stop()
+        if self.aggregator is not None:
+            # Keep bursts that were still open when the window closed
+            for event in self.aggregator.flush():
+                self.log_manager.save_log(event_log_entry(event), id_prefix="RT")
+        self.log_manager.close()
         self.destroy()
 
 
 if __name__ == "__main__":
-    app = SoundwatcherApp()
+    parser = argparse.ArgumentParser(description="Soundwatcher GUI.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--connect", nargs="?", const=f"{DEFAULT_HOST}:{DEFAULT_PORT}", metavar="HOST:PORT",
+                      help="Subscribe to a running daemon (daemon.py) instead of capturing audio in-process")
+    mode.add_argument("--processes", type=int, metavar="N",
+                      help="Capture in a child process and score in N inference processes")
+    args = parser.parse_args()
+    app = SoundwatcherApp(daemon_address=parse_address(args.connect) if args.connect else None,
+                          processes=args.processes)
     app.mainloop()
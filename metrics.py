@@ -0,0 +1,293 @@
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Instrumentation is off unless enabled here, with enable() or by starting an exporter.
+# When off, every helper returns immediately, so hot paths pay one function call.
+ENABLED = os.environ.get("SOUNDWATCHER_METRICS", "0") != "0"
+PREFIX = "soundwatcher_"
+
+# Histogram buckets in seconds, from 50 us up to 2.5 s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HELP = {
+    "capture_wait_seconds": "Time spent waiting for audio to arrive in the ring buffer",
+    "resample_seconds": "Time spent resampling a window to the model rate",
+    "mel_seconds": "Time spent computing the dB mel spectrogram of a window",
+    "invoke_seconds": "Time spent in interpreter.invoke()",
+    "postprocess_seconds": "Time spent turning model outputs into labels and confidences",
+    "log_write_seconds": "Time spent committing a batch of log entries",
+    "dropped_samples_total": "Captured samples overwritten before they were read",
+    "input_overflows_total": "Input device overflows reported by PortAudio",
+    "dropped_windows_total": "Windows dropped before inference by a bounded queue",
+    "triggers_total": "Times the trigger fired",
+    "detections_total": "Scored windows per predicted label",
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile (inf if it is in the last one).
+        """
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return 0.0
+        target = q * total
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """
+    Named counters and histograms, each optionally split by labels.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Plain-dict view: counter values, and count/sum/p50/p95/p99 per histogram.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        result = {}
+        for (name, key), value in counters.items():
+            result[name + _format_labels(key)] = value
+        for (name, key), histogram in histograms.items():
+            result[name + _format_labels(key)] = {
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99),
+            }
+        return result
+
+    def render(self):
+        """
+        Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+        lines = []
+        seen = set()
+        for (name, key), value in counters:
+            if name not in seen:
+                seen.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+            lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+        for (name, key), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+            with histogram._lock:
+                counts, total, value_sum = list(histogram.counts), histogram.count, histogram.sum
+            running = 0
+            for bound, count in zip(histogram.buckets, counts):
+                running += count
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, ('le', repr(bound)))} {running}")
+            lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, ('le', '+Inf'))} {total}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {value_sum}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {total}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        REGISTRY.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enable(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+
+
+def inc(name, amount=1, **labels):
+    if ENABLED:
+        REGISTRY.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    if ENABLED:
+        REGISTRY.observe(name, value, **labels)
+
+
+def timer(name, **labels):
+    """
+    Context manager recording the elapsed monotonic time of its block in histogram `name`.
+    """
+    if ENABLED:
+        return _Timer(name, labels)
+    return _NULL_TIMER
+
+
+def render():
+    return REGISTRY.render()
+
+
+def snapshot():
+    return REGISTRY.snapshot()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """
+    Enable metrics and serve them at http://host:port/metrics from a daemon thread.
+    Returns the server; call shutdown() on it to stop.
+    """
+    enable()
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class MetricsFileWriter:
+    """
+    Enable metrics and rewrite `path` with the Prometheus text every `interval` seconds
+    (atomically, so a collector never reads half a file).
+    """
+
+    def __init__(self, path, interval=10.0):
+        enable()
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(render())
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        self.write()
+
+
+def start_exporters(port=None, path=None, interval=10.0):
+    """
+    Start the HTTP endpoint and/or the metrics file writer, falling back to the
+    SOUNDWATCHER_METRICS_PORT and SOUNDWATCHER_METRICS_FILE environment variables.
+    Returns (server, file_writer); either may be None.
+    """
+    if port is None and os.environ.get("SOUNDWATCHER_METRICS_PORT"):
+        port = int(os.environ["SOUNDWATCHER_METRICS_PORT"])
+    path = path or os.environ.get("SOUNDWATCHER_METRICS_FILE") or None
+    server = start_http_server(port) if port else None
+    writer = MetricsFileWriter(path, interval) if path else None
+    return server, writer
@@ -1,22 +1,587 @@
+import importlib
+import json
+import logging
+import os
+import threading
+from math import gcd
 import numpy as np
-import tensorflow.lite as tflite
-from scipy.signal import resample
-import librosa
+import metrics
 
-# Load the TFLite model
+# The TFLite model is loaded lazily on first use (see get_interpreter)
 MODEL_PATH = "model/Low Cost Gunshot Detection Model.tflite"
-interpreter = tflite.Interpreter(model_path=MODEL_PATH)
-interpreter.allocate_tensors()
 
-# Get input and output tensors
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
+# Model variants by name. SOUNDWATCHER_MODEL picks one at startup, otherwise the registry default
+MODEL_REGISTRY_PATH = os.environ.get("SOUNDWATCHER_MODEL_REGISTRY", "model/models.json")
+MODEL_NAME = os.environ.get("SOUNDWATCHER_MODEL") or None
+
+
+
+def _env_threads():
+    # A malformed value must not make importing this module fail
+    value = os.environ.get("SOUNDWATCHER_TFLITE_THREADS")
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        logging.error(f"Ignoring SOUNDWATCHER_TFLITE_THREADS={value!r}: expected a number of threads")
+        return None
+
+
+# Runtime settings, overridable from the environment or with configure()
+RUNTIME = os.environ.get("SOUNDWATCHER_TFLITE_RUNTIME") or None  # None picks the lightest installed runtime
+NUM_THREADS = _env_threads()
+USE_XNNPACK = os.environ.get("SOUNDWATCHER_XNNPACK", "1") != "0"
+
+# Interpreter runtimes in order of preference: standalone LiteRT, tflite_runtime, full TensorFlow
+RUNTIMES = [
+    ("litert", "ai_edge_litert.interpreter"),
+    ("tflite_runtime", "tflite_runtime.interpreter"),
+    ("tensorflow", "tensorflow.lite"),
+]
+
+DEFAULT_LABELS = ["Other", "Gunshot"]
+CLASS_LABELS = list(DEFAULT_LABELS)  # Labels of the configured model, in output order
+MAX_BATCH_SIZE = 32  # Windows per interpreter invoke in run_inference_batch
+
+_interpreter_lock = threading.Lock()
+_interpreter_state = {"interpreter": None, "input_details": None, "output_details": None}
+
+
+def load_model_registry(path=None):
+    """
+    Read the model registry, {"default": name, "models": {name: {"path", "labels", "description"}}},
+    with model paths resolved against the registry's directory. Without a registry file
+    only the bundled model is known.
+    """
+    path = path or MODEL_REGISTRY_PATH
+    try:
+        with open(path, "r") as f:
+            registry = json.load(f)
+    except FileNotFoundError:
+        return {"default": "float", "models": {"float": {"path": MODEL_PATH, "labels": list(DEFAULT_LABELS)}}}
+    base = os.path.dirname(path)
+    for spec in registry.get("models", {}).values():
+        spec["path"] = os.path.join(base, spec["path"])
+        spec.setdefault("labels", list(DEFAULT_LABELS))
+    return registry
+
+
+def register_model(name, model_path, labels=None, description=None, registry_path=None):
+    """
+    Add or replace a model variant in the registry file.
+    """
+    registry_path = registry_path or MODEL_REGISTRY_PATH
+    try:
+        with open(registry_path, "r") as f:
+            registry = json.load(f)
+    except FileNotFoundError:
+        registry = {"default": name, "models": {}}
+    spec = {
+        "path": os.path.relpath(model_path, os.path.dirname(registry_path) or "."),
+        "labels": list(labels or DEFAULT_LABELS),
+    }
+    if description:
+        spec["description"] = description
+    registry.setdefault("models", {})[name] = spec
+    with open(registry_path, "w") as f:
+        json.dump(registry, f, indent=4)
+        f.write("\n")
+
+
+def resolve_model(model):
+    """
+    Look up a model by registry name, or accept a path to a .tflite file.
+    Returns (model_path, labels).
+    """
+    if model.endswith(".tflite") or os.path.isfile(model):
+        return model, list(DEFAULT_LABELS)
+    models = load_model_registry()["models"]
+    if model not in models:
+        raise ValueError(f"Unknown model: {model} (registered: {', '.join(sorted(models))})")
+    return models[model]["path"], list(models[model]["labels"])
+
+
+def load_runtime(preferred=None):
+    """
+    Import the requested TFLite runtime, or the first installed one.
+    Returns (runtime_name, module exposing Interpreter).
+    """
+    candidates = [r for r in RUNTIMES if r[0] == preferred] if preferred else RUNTIMES
+    if not candidates:
+        raise ValueError(f"Unknown TFLite runtime: {preferred}")
+    errors = []
+    for name, module_name in candidates:
+        try:
+            return name, importlib.import_module(module_name)
+        except ImportError as e:
+            errors.append(f"{module_name}: {e}")
+    raise ImportError("No TFLite runtime available (" + "; ".join(errors) + ")")
+
+
+def load_interpreter(model_path=None, num_threads=None, use_xnnpack=None, runtime=None):
+    """
+    Create and allocate a new TFLite interpreter using the configured runtime settings.
+    """
+    _, module = load_runtime(runtime or RUNTIME)
+    kwargs = {"model_path": model_path or MODEL_PATH}
+    num_threads = NUM_THREADS if num_threads is None else num_threads
+    if num_threads:
+        kwargs["num_threads"] = num_threads
+    if not (USE_XNNPACK if use_xnnpack is None else use_xnnpack):
+        # XNNPACK is applied as a default delegate; opt out by skipping default delegates
+        resolver_type = getattr(module, "OpResolverType", None)
+        if resolver_type is None:
+            resolver_type = module.experimental.OpResolverType
+        kwargs["experimental_op_resolver_type"] = resolver_type.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    new_interpreter = module.Interpreter(**kwargs)
+    new_interpreter.allocate_tensors()
+    return new_interpreter
+
+
+def configure(model_path=None, num_threads=None, use_xnnpack=None, runtime=None, model=None):
+    """
+    Change the model or runtime settings. `model` is a registry name (or .tflite path) and
+    also sets CLASS_LABELS. Interpreters are rebuilt on next use.
+    """
+    global MODEL_PATH, MODEL_NAME, CLASS_LABELS, NUM_THREADS, USE_XNNPACK, RUNTIME
+    if model is not None:
+        MODEL_PATH, CLASS_LABELS = resolve_model(model)
+        MODEL_NAME = model
+    if model_path is not None:
+        MODEL_PATH = model_path
+    if num_threads is not None:
+        NUM_THREADS = num_threads
+    if use_xnnpack is not None:
+        USE_XNNPACK = use_xnnpack
+    if runtime is not None:
+        RUNTIME = runtime
+    with _interpreter_lock:
+        _interpreter_state["interpreter"] = None
+    with _batch_lock:
+        _batch_state["scorer"] = None
+
+
+def get_interpreter():
+    """
+    Return the shared single-window interpreter with its input and output details,
+    creating it on first use.
+    """
+    state = _interpreter_state
+    if state["interpreter"] is None:
+        with _interpreter_lock:
+            if state["interpreter"] is None:
+                new_interpreter = load_interpreter()
+                state["input_details"] = new_interpreter.get_input_details()
+                state["output_details"] = new_interpreter.get_output_details()
+                state["interpreter"] = new_interpreter
+    return state["interpreter"], state["input_details"], state["output_details"]
+
+
+def quantize_input(features, detail, out=None):
+    """
+    Convert float features to the input type of an integer-quantized model using the
+    tensor's (scale, zero_point). Float inputs are returned unchanged.
+    """
+    dtype = detail["dtype"]
+    if dtype == np.float32:
+        return features
+    scale, zero_point = detail["quantization"]
+    if out is None:
+        out = np.empty(features.shape, dtype=dtype)
+    limits = np.iinfo(dtype)
+    scaled = np.rint(features / scale + zero_point)
+    np.clip(scaled, limits.min, limits.max, out=scaled)
+    out[...] = scaled
+    return out
+
+
+def dequantize_output(values, detail):
+    """
+    Convert an integer-quantized output tensor back to float; float outputs pass through.
+    """
+    if detail["dtype"] == np.float32:
+        return values
+    scale, zero_point = detail["quantization"]
+    return (values.astype(np.float32) - zero_point) * scale
+
+
+# Feature parameters shared by every preprocessing path
+TARGET_SR = 16000
+N_FFT = 2048
+HOP_LENGTH = 128
+N_MELS = 128
+N_FRAMES = 128
+TOP_DB = 80.0
+AMIN = 1e-10
+RESAMPLER = "fft"  # "fft" matches the original scipy.signal.resample path exactly; "polyphase" is anti-aliased
+
+
+def _hz_to_mel(frequencies):
+    # Slaney-style mel scale (librosa's default, htk=False)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    f_sp = 200.0 / 3
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    mels = frequencies / f_sp
+    log_region = frequencies >= min_log_hz
+    mels[log_region] = min_log_mel + np.log(frequencies[log_region] / min_log_hz) / logstep
+    return mels
+
+
+def _mel_to_hz(mels):
+    mels = np.asarray(mels, dtype=np.float64)
+    f_sp = 200.0 / 3
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    frequencies = f_sp * mels
+    log_region = mels >= min_log_mel
+    frequencies[log_region] = min_log_hz * np.exp(logstep * (mels[log_region] - min_log_mel))
+    return frequencies
+
+
+def mel_filterbank(sr=TARGET_SR, n_fft=N_FFT, n_mels=N_MELS):
+    """
+    Slaney-normalized mel filterbank, equal to librosa.filters.mel(sr=sr, n_fft=n_fft,
+    n_mels=n_mels) but without importing librosa.
+    """
+    fft_freqs = np.fft.rfftfreq(n=n_fft, d=1.0 / sr)
+    mel_freqs = _mel_to_hz(np.linspace(_hz_to_mel([0.0])[0], _hz_to_mel([sr / 2.0])[0], n_mels + 2))
+    fdiff = np.diff(mel_freqs)
+    ramps = np.subtract.outer(mel_freqs, fft_freqs)
+    weights = np.zeros((n_mels, len(fft_freqs)), dtype=np.float32)
+    for i in range(n_mels):
+        lower = -ramps[i] / fdiff[i]
+        upper = ramps[i + 2] / fdiff[i + 1]
+        weights[i] = np.maximum(0, np.minimum(lower, upper))
+    weights *= (2.0 / (mel_freqs[2:n_mels + 2] - mel_freqs[:n_mels]))[:, np.newaxis]
+    return weights
+
+
+class Featurizer:
+    """
+    Turns fixed-length int16-scaled audio into a (1, 128, 128, 1) dB mel-spectrogram.
+
+    The resampler, STFT window, frame view and mel filterbank are built once, and every
+    intermediate array is preallocated, so a call only allocates the FFT outputs. The
+    returned array is reused by the next call unless `out` is given.
+    """
+
+    def __init__(self, input_length=44100, resampler=RESAMPLER):
+        self.input_length = int(input_length)
+        self.resampler = resampler
+        import scipy.fft
+        self._fft = scipy.fft
+        self._input = np.empty(self.input_length, dtype=np.float32)
+
+        # Resampler: any length is squeezed to TARGET_SR samples, as in the original path
+        g = gcd(self.input_length, TARGET_SR)
+        self.up, self.down = TARGET_SR // g, self.input_length // g
+        if self.input_length == TARGET_SR:
+            self.resampler = "identity"
+        elif resampler == "polyphase" and max(self.up, self.down) > 1000:
+            # The filter would be enormous for awkward ratios; the FFT path is exact anyway
+            self.resampler = "fft"
+        if self.resampler == "polyphase":
+            self._build_polyphase()
+        elif self.resampler == "fft":
+            n = min(TARGET_SR, self.input_length)
+            self._fft_bins = n // 2 + 1
+            self._fft_nyquist_gain = 1.0
+            if n % 2 == 0:
+                self._fft_nyquist_gain = 2.0 if TARGET_SR < self.input_length else 0.5
+            self._fft_spectrum = np.zeros(TARGET_SR // 2 + 1, dtype=np.complex64)
+            self._fft_scale = np.float32(TARGET_SR / self.input_length)
+
+        # Centered STFT over a zero-padded signal buffer, as librosa does with center=True
+        pad = N_FFT // 2
+        self._padded = np.zeros(TARGET_SR + 2 * pad, dtype=np.float32)
+        self._signal = self._padded[pad:pad + TARGET_SR]
+        self.n_frames = 1 + TARGET_SR // HOP_LENGTH
+        self._frames = np.lib.stride_tricks.as_strided(
+            self._padded, shape=(self.n_frames, N_FFT),
+            strides=(HOP_LENGTH * self._padded.itemsize, self._padded.itemsize), writeable=False)
+        # Periodic Hann window, as scipy.signal.get_window("hann", N_FFT) builds it
+        self._window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+        self._windowed = np.empty((self.n_frames, N_FFT), dtype=np.float32)
+        self._power = np.empty((self.n_frames, N_FFT // 2 + 1), dtype=np.float32)
+        self._mel_basis = mel_filterbank()
+        self._mel = np.empty((N_MELS, self.n_frames), dtype=np.float32)
+        self._used_frames = min(self.n_frames, N_FRAMES)
+        self._output = np.zeros((1, N_MELS, N_FRAMES, 1), dtype=np.float32)
+
+    def _build_polyphase(self):
+        # Same filter design and alignment as scipy.signal.resample_poly, computed once
+        from scipy.signal import firwin
+        max_rate = max(self.up, self.down)
+        half_len = 10 * max_rate
+        h = firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * self.up
+        n_out = self.input_length * self.up
+        n_out = n_out // self.down + bool(n_out % self.down)
+        n_pre_pad = self.down - half_len % self.down
+        n_pre_remove = (half_len + n_pre_pad) // self.down
+        n_post_pad = 0
+        while ((self.input_length - 1) * self.up + len(h) + n_pre_pad + n_post_pad - 1) // self.down + 1 \
+                < n_out + n_pre_remove:
+            n_post_pad += 1
+        self._poly_filter = np.concatenate(
+            (np.zeros(n_pre_pad), h, np.zeros(n_post_pad))).astype(np.float32)
+        self._poly_start = n_pre_remove
+        from scipy.signal import upfirdn
+        self._upfirdn = upfirdn
+
+    def _resample(self):
+        x = self._input
+        if self.resampler == "identity":
+            self._signal[:] = x
+        elif self.resampler == "polyphase":
+            y = self._upfirdn(self._poly_filter, x, self.up, self.down)
+            self._signal[:] = y[self._poly_start:self._poly_start + TARGET_SR]
+        else:
+            spectrum = self._fft.rfft(x)
+            self._fft_spectrum[:self._fft_bins] = spectrum[:self._fft_bins]
+            if self._fft_nyquist_gain != 1.0:
+                self._fft_spectrum[self._fft_bins - 1] *= self._fft_nyquist_gain
+            np.multiply(self._fft.irfft(self._fft_spectrum, n=TARGET_SR), self._fft_scale, out=self._signal)
+
+    def __call__(self, audio_data, out=None, full_scale=32768.0):
+        # `full_scale` is the sample value of a full-scale signal: 32768 for int16-scaled
+        # audio, 1.0 for float audio read straight from a capture ring buffer
+        if len(audio_data) != self.input_length:
+            raise ValueError(f"Expected {self.input_length} samples, got {len(audio_data)}")
+        with metrics.timer("resample_seconds"):
+            np.multiply(audio_data, np.float32(1.0 / full_scale), out=self._input, casting="unsafe")
+            self._resample()
+
+        with metrics.timer("mel_seconds"):
+            # Power spectrogram
+            np.multiply(self._frames, self._window, out=self._windowed)
+            np.abs(self._fft.rfft(self._windowed, axis=1), out=self._power)
+            np.square(self._power, out=self._power)
+
+            # Mel projection and power_to_db(ref=np.max, top_db=80) in place
+            mel = self._mel
+            np.dot(self._mel_basis, self._power.T, out=mel)
+            np.maximum(mel, AMIN, out=mel)
+            np.log10(mel, out=mel)
+            mel *= 10.0
+            mel -= mel.max()
+            np.maximum(mel, -TOP_DB, out=mel)
+
+        if out is None:
+            out = self._output
+        out[0, :, :self._used_frames, 0] = mel[:, :self._used_frames]
+        out[0, :, self._used_frames:, 0] = 0.0
+        return out
+
+
+class StreamingMelSpectrogram:
+    """
+    Incremental Featurizer for continuous audio fed chunk by chunk.
+
+    Input is resampled to TARGET_SR by a stateful polyphase filter (the design of the
+    "polyphase" resampler), and only STFT frames completed by the new audio are
+    transformed. Their log-mel columns go into a circular buffer holding one window's
+    worth of frames, together with each column's maximum, so power_to_db(ref=np.max,
+    top_db=80) is reduced to one subtraction and clip per window. `features()` returns
+    the model input for the 1 s window ending at the newest frame, laid out like
+    Featurizer's output. Frames are centred as with center=True, so the newest frame
+    trails the input by half an FFT (64 ms). The frames within half an FFT of either
+    window edge are recomputed per window over Featurizer's zero padding rather than
+    the neighbouring audio, so a loud sound just outside the window does not shift it.
+
+    Input is float audio at `rate`; `full_scale` is as in Featurizer (1.0 for audio from
+    the capture ring buffer). Not thread-safe.
+    """
+
+    def __init__(self, rate=44100, full_scale=1.0):
+        self.rate = int(rate)
+        self.full_scale = full_scale
+        import scipy.fft
+        self._fft = scipy.fft
+
+        g = gcd(self.rate, TARGET_SR)
+        self.up, self.down = TARGET_SR // g, self.rate // g
+        if self.up != self.down:
+            from scipy.signal import firwin, upfirdn
+            max_rate = max(self.up, self.down)
+            self._half_len = 10 * max_rate
+            self._filter = (firwin(2 * self._half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+                            * self.up).astype(np.float32)
+            self._upfirdn = upfirdn
+            # upfirdn over a history starting at input s yields the outputs we need exactly
+            # when s * up = half_len (mod down); keep the history start on that grid
+            self._grid = self._half_len * pow(self.up, -1, self.down) % self.down
+
+        self.n_frames = 1 + TARGET_SR // HOP_LENGTH  # Frames per window, as in Featurizer
+        self._used_frames = min(self.n_frames, N_FRAMES)
+        self._edge = -(-(N_FFT // 2) // HOP_LENGTH)  # Frames per side that reach past the window
+        self._interior = np.arange(self._edge, self.n_frames - self._edge)
+        self._window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+        self._mel_basis = mel_filterbank()
+        self._output = np.zeros((1, N_MELS, N_FRAMES, 1), dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all audio, e.g. after a gap in the stream.
+        """
+        if self.up != self.down:
+            # Silent history before the first sample, so the filter starts on silence
+            self._history_start = self._on_grid(-(len(self._filter) // self.up) - 1)
+            self._history = np.zeros(-self._history_start, dtype=np.float32)
+            self._inputs = 0
+            self._outputs = 0
+        # Centre padding at the start of the stream, as for a single window
+        self._signal = np.zeros(N_FFT // 2, dtype=np.float32)
+        # Resampled audio of the newest window, for its edge frames; silence before the stream
+        self._recent = np.zeros(TARGET_SR + N_FFT, dtype=np.float32)
+        self._log_mel = np.full((N_MELS, self.n_frames), 10.0 * np.log10(AMIN), dtype=np.float32)
+        self._frame_max = np.full(self.n_frames, 10.0 * np.log10(AMIN), dtype=np.float32)
+        self.frames = 0  # STFT frames computed so far
+
+    def _on_grid(self, position):
+        # Latest history start at or before `position`
+        return position - (position - self._grid) % self.down
+
+    def _resample(self, audio):
+        if self.up == self.down:
+            return audio
+        self._history = np.concatenate((self._history, audio))
+        self._inputs += len(audio)
+        # Output m sits at t = m * down + half_len on the upsampled grid and needs input t // up
+        last = (self._inputs * self.up - 1 - self._half_len) // self.down
+        if last < self._outputs:
+            return np.empty(0, dtype=np.float32)
+        first = (self._history_start * self.up - self._half_len) // self.down  # Output of upfirdn's first sample
+        out = self._upfirdn(self._filter, self._history, self.up, self.down)[self._outputs - first:last + 1 - first]
+        self._outputs = last + 1
+        # Keep only the history the next output still needs
+        start = self._on_grid((self._outputs * self.down + self._half_len - len(self._filter) + 1) // self.up)
+        if start > self._history_start:
+            self._history = self._history[start - self._history_start:]
+            self._history_start = start
+        return out.astype(np.float32, copy=False)
+
+    def push(self, audio):
+        """
+        Add a chunk of audio and transform the frames it completes. Returns the number of
+        new frames.
+        """
+        with metrics.timer("resample_seconds"):
+            audio = np.asarray(audio, dtype=np.float32)
+            if self.full_scale != 1.0:
+                audio = audio * np.float32(1.0 / self.full_scale)
+            resampled = self._resample(audio)
+            signal = np.concatenate((self._signal, resampled))
+            self._recent = np.concatenate((self._recent[len(resampled):], resampled[-len(self._recent):]))
+        if len(signal) < N_FFT:
+            self._signal = signal
+            return 0
+        count = (len(signal) - N_FFT) // HOP_LENGTH + 1
+        # Frames older than one window would be overwritten before they are used
+        skip = max(0, count - self.n_frames)
+        with metrics.timer("mel_seconds"):
+            mel = self._log_mel_frames(self._frames(signal[skip * HOP_LENGTH:], count - skip))
+            columns = (self.frames + np.arange(skip, count)) % self.n_frames
+            self._log_mel[:, columns] = mel
+            self._frame_max[columns] = mel.max(axis=0)
+        self.frames += count
+        self._signal = signal[count * HOP_LENGTH:].copy()
+        return count
+
+    @staticmethod
+    def _frames(signal, count):
+        # The first `count` STFT frames of `signal`, without copying
+        return np.lib.stride_tricks.as_strided(
+            signal, shape=(count, N_FFT), strides=(HOP_LENGTH * signal.itemsize, signal.itemsize), writeable=False)
+
+    def _log_mel_frames(self, frames):
+        power = np.abs(self._fft.rfft(frames * self._window, axis=1))
+        np.square(power, out=power)
+        mel = np.dot(self._mel_basis, power.T)
+        np.maximum(mel, AMIN, out=mel)
+        np.log10(mel, out=mel)
+        mel *= 10.0
+        return mel
+
+    def _edge_frames(self):
+        # The window's resampled audio ends where the newest frame is centred; the unused
+        # signal tail starts one hop after that frame's start
+        pad = N_FFT // 2
+        end = len(self._recent) - len(self._signal) - HOP_LENGTH + pad
+        window = self._recent[end - TARGET_SR:end]
+        zeros = np.zeros(pad, dtype=np.float32)
+        span = (self._edge - 1) * HOP_LENGTH + pad
+        head = self._frames(np.concatenate((zeros, window[:span])), self._edge)
+        tail = self._frames(np.concatenate((window[(self.n_frames - self._edge) * HOP_LENGTH - pad:], zeros)),
+                            self._edge)
+        # One transform for both edges
+        mel = self._log_mel_frames(np.concatenate((head, tail)))
+        return mel[:, :self._edge], mel[:, self._edge:]
+
+    def features(self, out=None):
+        """
+        Model input (1, 128, 128, 1) for the window ending at the newest frame. The
+        returned array is reused by the next call unless `out` is given.
+        """
+        if out is None:
+            out = self._output
+        oldest = self.frames % self.n_frames
+        used = self._used_frames
+        head, tail = self._edge_frames()
+        peak = max(self._frame_max[(oldest + self._interior) % self.n_frames].max(), head.max(), tail.max())
+        # Circular buffer back into time order, with power_to_db's reference and floor
+        target = out[0, :, :used, 0]
+        newer = self.n_frames - oldest
+        np.subtract(self._log_mel[:, oldest:oldest + min(newer, used)], peak, out=target[:, :min(newer, used)])
+        if newer < used:
+            np.subtract(self._log_mel[:, :used - newer], peak, out=target[:, newer:])
+        edge = self.n_frames - self._edge
+        np.subtract(head[:, :used], peak, out=target[:, :min(self._edge, used)])
+        if edge < used:
+            np.subtract(tail[:, :used - edge], peak, out=target[:, edge:])
+        np.maximum(target, -TOP_DB, out=target)
+        out[0, :, used:, 0] = 0.0
+        return out
+
+
+# Featurizers hold scratch buffers, so each thread keeps its own, keyed by input length
+_featurizers = threading.local()
+
+
+def get_featurizer(input_length):
+    cache = getattr(_featurizers, "cache", None)
+    if cache is None:
+        cache = _featurizers.cache = {}
+    featurizer = cache.get(input_length)
+    if featurizer is None:
+        if len(cache) >= 8:
+            cache.clear()
+        featurizer = cache[input_length] = Featurizer(input_length)
+    return featurizer
+
 
 # Function to preprocess audio for model input
-def preprocess_audio(audio_data):
+def preprocess_audio(audio_data, out=None):
     """
     Preprocess audio data to generate a 2D spectrogram and match the TFLite model input shape.
+    The returned array is reused by the next call on the same thread unless `out` is given.
+    """
+    audio_data = np.asarray(audio_data)
+    return get_featurizer(len(audio_data))(audio_data, out=out)
+
+
+# Original per-call librosa/scipy implementation, kept as the reference for parity checks
+def preprocess_audio_reference(audio_data):
     """
+    Preprocess audio data to generate a 2D spectrogram and match the TFLite model input shape.
+    """
+    from scipy.signal import resample
+    import librosa
+
     # Normalize audio data
     audio_data = np.array(audio_data, dtype=np.float32) / 32768.0  # Scale to [-1, 1]
 
@@ -48,28 +613,211 @@ def run_inference(audio_data):
     """
     # Preprocess the audio data
     model_input = preprocess_audio(audio_data)
-
-    # Debugging: Print input shape
-    print(f"Model input shape: {input_details[0]['shape']}")
-    print(f"Provided input shape: {model_input.shape}")
+    interpreter, input_details, output_details = get_interpreter()
 
     # Set input tensor and invoke interpreter
-    interpreter.set_tensor(input_details[0]['index'], model_input)
-    interpreter.invoke()
+    interpreter.set_tensor(input_details[0]['index'], quantize_input(model_input, input_details[0]))
+    with metrics.timer("invoke_seconds"):
+        interpreter.invoke()
 
     # Get output tensor and interpret results
-    output_data = interpreter.get_tensor(output_details[0]['index'])
-    class_labels = ["Other", "Gunshot"]
-    predicted_class_index = np.argmax(output_data)
-    predicted_class_label = class_labels[predicted_class_index]
-    confidence = output_data[0][predicted_class_index] * 100  # Confidence as percentage
-
-    # Output the result
-    result_text = f"Model: {MODEL_PATH}\nPredicted class: {predicted_class_label}\nConfidence: {confidence:.2f}%\n"
-    print(result_text)
+    with metrics.timer("postprocess_seconds"):
+        output_data = dequantize_output(interpreter.get_tensor(output_details[0]['index']), output_details[0])
+        predicted_class_index = np.argmax(output_data)
+        predicted_class_label = CLASS_LABELS[predicted_class_index]
+        confidence = output_data[0][predicted_class_index] * 100  # Confidence as percentage
+    metrics.inc("detections_total", label=predicted_class_label)
 
     return predicted_class_label, confidence
 
+class BatchScorer:
+    """
+    Scores batches of equal-length windows on one private interpreter. The input is
+    resized to the window count rounded up to a power of two (at most the batch size)
+    and short batches are zero-padded, so a single window costs one single-window invoke
+    while changing counts reuse a few shapes instead of reallocating every tensor each
+    time. Not thread-safe: give each thread its own scorer.
+    """
+
+    def __init__(self, model_path=None, num_threads=None, labels=None):
+        self.interpreter = load_interpreter(model_path, num_threads=num_threads)
+        self.labels = labels
+        self.size = 1
+        self.resizable = True
+        self._features = {}  # Batch buffers by size
+        self._quantized = None
+
+    def _prepare(self, batch_size):
+        """
+        Resize the input to `batch_size` windows when the model allows it; otherwise keep
+        the single-window shape. Returns True if the interpreter is batched.
+        """
+        if self.resizable and self.size != batch_size:
+            input_index = self.interpreter.get_input_details()[0]["index"]
+            try:
+                self.interpreter.resize_tensor_input(input_index, [batch_size, N_MELS, N_FRAMES, 1])
+                self.interpreter.allocate_tensors()
+                self.size = batch_size
+            except Exception as e:
+                logging.warning(f"Model input cannot be resized, falling back to per-window invokes: {e}")
+                self.resizable = False
+                self.interpreter.resize_tensor_input(input_index, [1, N_MELS, N_FRAMES, 1])
+                self.interpreter.allocate_tensors()
+                self.size = 1
+        return self.size == batch_size and batch_size > 1
+
+    def score(self, windows, batch_size=MAX_BATCH_SIZE, full_scale=32768.0):
+        """
+        Run inference on a (N, window_length) array of int16-scaled audio windows, or on a
+        list of equal-length windows, which are read in place (e.g. views of a shared ring
+        buffer; pass full_scale=1.0 for float audio in [-1, 1]).
+        Returns per-window labels and confidences (percent) as arrays of length N.
+        """
+        if isinstance(windows, list):
+            length = len(windows[0]) if windows else 0
+        else:
+            windows = np.asarray(windows)
+            if windows.ndim == 1:
+                windows = windows[np.newaxis, :]
+            length = windows.shape[1]
+        featurizer = get_featurizer(length) if len(windows) else None
+
+        def fill(features, start, count):
+            for i in range(count):
+                featurizer(windows[start + i], out=features[i:i + 1], full_scale=full_scale)
+
+        return self._score(len(windows), fill, batch_size)
+
+    def score_features(self, features, batch_size=MAX_BATCH_SIZE):
+        """
+        Like `score`, for windows already turned into a (N, 128, 128, 1) array of model
+        features (see preprocess_audio), e.g. from the feature cache.
+        """
+        features = np.asarray(features, dtype=np.float32)
+
+        def fill(batch, start, count):
+            batch[:count] = features[start:start + count]
+
+        return self._score(len(features), fill, batch_size)
+
+    def _score(self, n, fill, batch_size):
+        """
+        Score `n` windows; `fill(features, start, count)` writes the features of windows
+        start..start+count into the first `count` rows of the batch buffer.
+        """
+        if n == 0:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.float32)
+
+        size = min(batch_size, 1 << (min(n, batch_size) - 1).bit_length())
+        features = self._features.get(size)
+        if features is None:
+            features = self._features[size] = np.empty((size, N_MELS, N_FRAMES, 1), dtype=np.float32)
+        probabilities = np.empty((n, len(self.labels or CLASS_LABELS)), dtype=np.float32)
+
+        batched = self._prepare(size)
+        input_detail = self.interpreter.get_input_details()[0]
+        output_detail = self.interpreter.get_output_details()[0]
+        input_index, output_index = input_detail["index"], output_detail["index"]
+        if input_detail["dtype"] != np.float32 and (self._quantized is None or self._quantized.shape != features.shape):
+            self._quantized = np.empty(features.shape, dtype=input_detail["dtype"])
+        for start in range(0, n, size):
+            count = min(size, n - start)
+            fill(features, start, count)
+            if batched:
+                # Pad the last batch instead of resizing the interpreter again
+                features[count:] = 0.0
+                self.interpreter.set_tensor(input_index, quantize_input(features, input_detail, out=self._quantized))
+                with metrics.timer("invoke_seconds"):
+                    self.interpreter.invoke()
+                output = self.interpreter.get_tensor(output_index)[:count]
+                probabilities[start:start + count] = dequantize_output(output, output_detail)
+            else:
+                for i in range(count):
+                    model_input = quantize_input(features[i:i + 1], input_detail,
+                                                 out=None if self._quantized is None else self._quantized[i:i + 1])
+                    self.interpreter.set_tensor(input_index, model_input)
+                    with metrics.timer("invoke_seconds"):
+                        self.interpreter.invoke()
+                    probabilities[start + i] = dequantize_output(self.interpreter.get_tensor(output_index),
+                                                                 output_detail)[0]
+
+        class_labels = self.labels or CLASS_LABELS
+        with metrics.timer("postprocess_seconds"):
+            predicted = np.argmax(probabilities, axis=1)
+            labels = np.asarray(class_labels, dtype=object)[predicted]
+            confidences = probabilities[np.arange(n), predicted] * 100
+        if metrics.ENABLED:
+            for index, count in enumerate(np.bincount(predicted, minlength=len(class_labels))):
+                if count:
+                    metrics.inc("detections_total", int(count), label=class_labels[index])
+        return labels, confidences
+
+
+# run_inference_batch shares one scorer, separate from run_inference's interpreter
+_batch_lock = threading.Lock()
+_batch_state = {"scorer": None}
+
+
+# Function to run inference on many equal-length windows at once
+def run_inference_batch(windows, batch_size=MAX_BATCH_SIZE):
+    """
+    Run inference on a (N, window_length) array of int16-scaled audio windows.
+    Returns per-window labels and confidences (percent) as arrays of length N.
+    """
+    with _batch_lock:
+        if _batch_state["scorer"] is None:
+            _batch_state["scorer"] = BatchScorer()
+        return _batch_state["scorer"].score(windows, batch_size=batch_size)
+
+
+def run_inference_batch_features(features, batch_size=MAX_BATCH_SIZE):
+    """
+    Run inference on a (N, 128, 128, 1) array of precomputed model features.
+    Returns per-window labels and confidences (percent) as arrays of length N.
+    """
+    with _batch_lock:
+        if _batch_state["scorer"] is None:
+            _batch_state["scorer"] = BatchScorer()
+        return _batch_state["scorer"].score_features(features, batch_size=batch_size)
+
+
+def split_windows(audio_data, window_length, hop_length):
+    """
+    View `audio_data` as overlapping windows of `window_length` samples every `hop_length`
+    samples. Short or ragged input is zero-padded so the whole signal is covered.
+    """
+    audio_data = np.asarray(audio_data)
+    length = len(audio_data)
+    if length < window_length:
+        padded_length = window_length
+    else:
+        padded_length = length + (-(length - window_length)) % hop_length
+    if padded_length != length:
+        audio_data = np.pad(audio_data, (0, padded_length - length))
+    return np.lib.stride_tricks.sliding_window_view(audio_data, window_length)[::hop_length]
+
+
+def summarize_predictions(labels, confidences):
+    """
+    Collapse per-window results into one clip-level (label, confidence): the most confident
+    Gunshot window if there is one, otherwise the least confident Other window.
+    """
+    gunshot = labels == "Gunshot"
+    if np.any(gunshot):
+        return "Gunshot", float(np.max(confidences[gunshot]))
+    return "Other", float(np.min(confidences))
+
+
+# Apply the selected model variant (SOUNDWATCHER_MODEL, otherwise the registry default).
+# Every entry point imports this module, so a bad selection falls back to the bundled model
+if MODEL_NAME or os.path.isfile(MODEL_REGISTRY_PATH):
+    try:
+        configure(model=MODEL_NAME or load_model_registry().get("default", "float"))
+    except (ValueError, KeyError, OSError) as e:
+        logging.error(f"Cannot select model {MODEL_NAME or 'from the registry'}, using {MODEL_PATH}: {e}")
+        MODEL_NAME = None
+
+
 if __name__ == "__main__":
     # Example usage:
     test_audio_data = np.zeros(16000, dtype=np.int16)  # Placeholder for testing
@@ -0,0 +1,58 @@
+import argparse
+import socket
+import time
+import numpy as np
+from audio_capture import FileSource, SyntheticSource
+
+
+def send_stream(source, host, port, protocol="udp", realtime=True):
+    """
+    Stream float32 PCM blocks from a FileSource/SyntheticSource to a NetworkSource.
+    """
+    kind = socket.SOCK_DGRAM if protocol == "udp" else socket.SOCK_STREAM
+    sock = socket.socket(socket.AF_INET, kind)
+    if protocol != "udp":
+        sock.connect((host, port))
+    sent = 0
+    start = time.monotonic()
+    try:
+        for block in source.blocks():
+            payload = np.ascontiguousarray(block, dtype="<f4").tobytes()
+            if protocol == "udp":
+                sock.sendto(payload, (host, port))
+            else:
+                sock.sendall(payload)
+            sent += len(block)
+            if realtime:
+                delay = start + sent / source.rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    finally:
+        sock.close()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in microphone: stream PCM to an ingestion NetworkSource.")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--protocol", choices=["udp", "tcp"], default="udp")
+    parser.add_argument("--file", help="WAV file to stream (default: synthetic noise with impulses)")
+    parser.add_argument("--loop", action="store_true", help="Loop the WAV file")
+    parser.add_argument("--duration", type=float, help="Seconds of synthetic audio (default: endless)")
+    parser.add_argument("--fast", action="store_true", help="Send as fast as possible")
+    args = parser.parse_args()
+
+    if args.file:
+        source = FileSource(args.file, loop=args.loop)
+    else:
+        source = SyntheticSource(duration=args.duration)
+    try:
+        sent = send_stream(source, args.host, args.port, args.protocol, realtime=not args.fast)
+        print(f"Sent {sent / source.rate:.1f} s of audio")
+    except KeyboardInterrupt:
+        print("Sender stopped.")
+
+
+if __name__ == "__main__":
+    main()
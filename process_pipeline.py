@@ -0,0 +1,414 @@
+import argparse
+import functools
+import logging
+import math
+import multiprocessing
+import queue
+import signal
+import time
+from audio_capture import AudioCapture, FileSource, SharedRingBuffer, SyntheticSource
+from event_aggregator import SHOT_INTERVAL
+
+WORKERS = 2  # Inference processes
+QUEUE_SIZE = 64  # Window positions waiting for an inference process before new ones are dropped
+
+
+def _capture_main(ring, source_factory, settings, windows, results, feedback, events, threshold, volume, triggers,
+                  stop, workers):
+    """
+    Capture process: fills the shared ring, meters and triggers every hop, merges triggers
+    into burst events and queues the stream positions of the windows still worth scoring.
+    """
+    from detection_cascade import DetectionCascade, DEFAULT_CASCADE
+    from event_aggregator import EventAggregator
+    from stream_detector import StreamingDetector
+
+    # The parent handles Ctrl+C and stops the pipeline through `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cascade = DetectionCascade.from_config(DEFAULT_CASCADE, rate=AudioCapture.RATE) if settings["cascade"] else None
+    capture = AudioCapture(cooldown_time=settings["cooldown_time"], source=source_factory() if source_factory else None,
+                           cascade=cascade, ring=ring)
+    detector = StreamingDetector(capture, window_seconds=settings["window_seconds"],
+                                 hop_seconds=settings["hop_seconds"],
+                                 pre_trigger_seconds=settings["pre_trigger_seconds"],
+                                 post_trigger_seconds=settings["post_trigger_seconds"], copy_audio=False)
+    # The aggregator lives here so windows of a confirmed burst are never queued; workers
+    # report each window's label back through `feedback`
+    aggregator = EventAggregator(merge_window=settings["merge_window"])
+    trigger_events = {}  # Trigger stream position -> event id
+    seen_triggers = 0
+    exited = 0
+
+    def collect_feedback(timeout=None):
+        nonlocal exited
+        while True:
+            try:
+                item = feedback.get(timeout=timeout) if timeout else feedback.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                exited += 1
+                if exited == workers:
+                    return
+            else:
+                aggregator.on_result(*item)
+
+    applied = None
+    try:
+        while not stop.is_set():
+            if threshold.value != applied:
+                applied = threshold.value
+                if cascade is not None:
+                    cascade.level_gate.threshold_db = applied
+                else:
+                    capture.threshold_db = applied - capture.calibration_offset_db
+            ready = detector.advance(timeout=0.5)
+            collect_feedback()
+            if ready is None:
+                finished = getattr(capture.source, "finished", None)
+                if finished is not None and finished.is_set():
+                    break
+                continue
+            volume.value = float(capture.to_spl(detector.last_volume_db))
+            if detector.triggers > seen_triggers:
+                # Every trigger is one shot, whether or not any of its windows get scored
+                seen_triggers = triggers.value = detector.triggers
+                trigger = detector.last_trigger
+                trigger_events[trigger] = aggregator.on_trigger(trigger / detector.rate,
+                                                                float(capture.to_spl(detector.last_volume_db)))
+            for window in ready:
+                event_id = trigger_events.get(window["trigger"])
+                # Windows are ready in trigger order, so older mappings are no longer needed
+                for trigger in [t for t in trigger_events if t < window["trigger"]]:
+                    del trigger_events[trigger]
+                if event_id is None or not aggregator.claim(event_id):
+                    continue
+                # Only the position travels; inference processes read the audio from the ring
+                item = (window["start"], window["trigger"], float(capture.to_spl(window["volume_db"])),
+                        window["ready_time"], event_id)
+                try:
+                    windows.put_nowait(item)
+                except queue.Full:
+                    aggregator.on_result(event_id, None, None)
+                    results.put(item + (None, None, "dropped"))
+            for event in aggregator.poll(detector.hop_end / detector.rate):
+                events.put(event)
+    except Exception as e:
+        logging.error(f"Error in capture process: {e}")
+    finally:
+        capture.cleanup()
+        for _ in range(workers):
+            windows.put(None)
+        # Wait for the last labels so open bursts are not logged unscored
+        collect_feedback(timeout=1.0)
+        for event in aggregator.flush():
+            events.put(event)
+        ring.close()
+
+
+def _inference_main(ring, windows, results, feedback, window_length, batch_size, num_threads, model_path):
+    """
+    Inference process: scores queued windows in place in the shared ring, sends compact
+    result tuples to the caller and each label back to the capture process.
+    """
+    from model_inference import BatchScorer
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    def report(item, label, confidence, status):
+        results.put(item + (label, confidence, status))
+        feedback.put((item[4], label, confidence))
+
+    scorer = None
+    done = False
+    while not done:
+        item = windows.get()
+        if item is None:
+            break
+        batch = [item]
+        while len(batch) < batch_size:
+            try:
+                item = windows.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                done = True
+                break
+            batch.append(item)
+
+        views, scored = [], []
+        for item in batch:
+            view = ring.view(item[0], window_length)
+            if view is None:
+                report(item, None, None, "missed")
+            else:
+                views.append(view)
+                scored.append(item)
+        if not views:
+            continue
+        try:
+            if scorer is None:
+                scorer = BatchScorer(model_path, num_threads=num_threads)
+            labels, confidences = scorer.score(views, batch_size=batch_size, full_scale=1.0)
+        except Exception as e:
+            logging.error(f"Error during inference: {e}")
+            labels = confidences = None
+        del views
+        for i, item in enumerate(scored):
+            if labels is None:
+                report(item, None, None, "failed")
+            elif not ring.valid(item[0]):
+                # The capture process lapped the window while it was being scored
+                report(item, None, None, "missed")
+            else:
+                report(item, str(labels[i]), float(confidences[i]), "scored")
+    feedback.put(None)
+    ring.close()
+
+
+class ProcessPipeline:
+    """
+    Capture and inference in separate processes, so neither shares a GIL with the other
+    or with the caller (e.g. the Tk main loop).
+
+    A capture process writes the source into a SharedRingBuffer, meters and triggers
+    every hop like StreamingDetector, merges triggers into burst events with an
+    EventAggregator and queues only the stream positions of windows to score; once a
+    burst is confirmed, its further windows are not queued at all. `workers` inference
+    processes each own an interpreter, score those windows in place in shared memory and
+    send back compact results; a window the capture process overwrote before it was
+    scored is reported as "missed" rather than scored on the wrong audio. Capture never
+    waits for inference: when every worker is busy and the queue is full, new windows
+    are reported as "dropped". Finished events are collected with `events()`.
+
+    Thresholds and levels are in calibrated dB SPL. `source_factory` builds the audio
+    source inside the capture process (the default input device when None) and must be
+    picklable, e.g. functools.partial(FileSource, "replay.wav").
+    """
+
+    def __init__(self, source_factory=None, workers=WORKERS, threshold_db=90, cascade=True,
+                 cooldown_time=SHOT_INTERVAL, window_seconds=1.0, hop_seconds=0.05, pre_trigger_seconds=0.5, post_trigger_seconds=0.5,
+                 buffer_seconds=AudioCapture.BUFFER_SECONDS, batch_size=8, num_threads=1, model_path=None,
+                 queue_size=QUEUE_SIZE, merge_window=2.0):
+        self.source_factory = source_factory
+        self.workers = workers
+        self.rate = AudioCapture.RATE
+        self.window = int(window_seconds * self.rate)
+        self.buffer_seconds = buffer_seconds
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.model_path = model_path
+        self.queue_size = queue_size
+        self.settings = {
+            "cascade": cascade,
+            "cooldown_time": cooldown_time,
+            "window_seconds": window_seconds,
+            "hop_seconds": hop_seconds,
+            "pre_trigger_seconds": pre_trigger_seconds,
+            "post_trigger_seconds": post_trigger_seconds,
+            "merge_window": merge_window,
+        }
+        # Spawned rather than forked, so children never inherit the caller's threads or Tk state
+        self._context = multiprocessing.get_context("spawn")
+        self._threshold = self._context.Value("d", threshold_db, lock=False)
+        self._volume = self._context.Value("d", math.nan, lock=False)
+        self._triggers = self._context.Value("q", 0, lock=False)
+        self._stop = self._context.Event()
+        self.ring = None
+        self._processes = []
+        self._late_events = []  # Events collected while stopping
+        self.counts = {"scored": 0, "dropped": 0, "missed": 0, "failed": 0}
+
+    @property
+    def threshold_db(self):
+        return self._threshold.value
+
+    def set_threshold(self, value):
+        # Picked up by the capture process at its next hop
+        self._threshold.value = value
+
+    @property
+    def volume_db(self):
+        """
+        Level of the latest hop in dB SPL, or None before the first one.
+        """
+        value = self._volume.value
+        return None if math.isnan(value) else value
+
+    @property
+    def stream_time(self):
+        """
+        Seconds of audio captured so far.
+        """
+        return 0.0 if self.ring is None else self.ring.write_pos / self.rate
+
+    def start(self):
+        if self.ring is not None:
+            return
+        # Mirror one window past the end so every window can be read as one contiguous view
+        self.ring = SharedRingBuffer(int(self.buffer_seconds * self.rate), mirror=self.window)
+        self._windows = self._context.Queue(maxsize=self.queue_size)
+        self._results = self._context.Queue()
+        self._feedback = self._context.Queue()
+        self._events = self._context.Queue()
+        self._stop.clear()
+        self._processes = [self._context.Process(
+            target=_capture_main, name="soundwatcher-capture", daemon=True,
+            args=(self.ring, self.source_factory, self.settings, self._windows, self._results, self._feedback,
+                  self._events, self._threshold, self._volume, self._triggers, self._stop, self.workers))]
+        for i in range(self.workers):
+            self._processes.append(self._context.Process(
+                target=_inference_main, name=f"soundwatcher-inference-{i}", daemon=True,
+                args=(self.ring, self._windows, self._results, self._feedback, self.window, self.batch_size,
+                      self.num_threads, self.model_path)))
+        for process in self._processes:
+            process.start()
+
+    def results(self, timeout=None):
+        """
+        Wait up to `timeout` seconds for results and return every one available, as dicts
+        shaped like StreamingDetector results plus a "status" ("scored", or "dropped",
+        "missed" or "failed" with label None). Returns None once all processes have exited
+        and every result has been collected.
+        """
+        # Checked first: anything sent by processes that had already exited is in the queue
+        alive = any(process.is_alive() for process in self._processes)
+        items = []
+        try:
+            items.append(self._results.get(timeout=timeout))
+            while True:
+                items.append(self._results.get_nowait())
+        except queue.Empty:
+            if not items and not alive:
+                return None
+        now = time.perf_counter()
+        write_pos = self.ring.write_pos
+        results = []
+        for start, trigger, volume_db, ready_time, event_id, label, confidence, status in items:
+            self.counts[status] += 1
+            results.append({
+                "start": start / self.rate,
+                "end": (start + self.window) / self.rate,
+                "trigger": None if trigger is None else trigger / self.rate,
+                "label": label,
+                "confidence": confidence,
+                "volume_db": volume_db,
+                "event": event_id,
+                # perf_counter is a system-wide monotonic clock, so it is comparable across processes
+                "latency_ms": (now - ready_time) * 1000,
+                "lag_ms": (write_pos - start - self.window) / self.rate * 1000,
+                "status": status,
+            })
+        return results
+
+    def events(self):
+        """
+        Return the burst events finished so far (see EventAggregator), without waiting.
+        Events flushed while stopping are returned after `stop()`.
+        """
+        events, self._late_events = self._late_events, []
+        if self.ring is not None:
+            events.extend(self._drain(self._events))
+        return events
+
+    @staticmethod
+    def _drain(q):
+        items = []
+        try:
+            while True:
+                items.append(q.get_nowait())
+        except queue.Empty:
+            return items
+
+    def stop(self, timeout=2.0):
+        if self.ring is None:
+            return
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            # Keep reading so exiting processes never block on a full pipe
+            while process.is_alive() and time.monotonic() < deadline:
+                self._late_events.extend(self._drain(self._events))
+                self._drain(self._results)
+                process.join(timeout=0.1)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=timeout)
+        self._late_events.extend(self._drain(self._events))
+        for q in (self._windows, self._results, self._feedback, self._events):
+            q.cancel_join_thread()
+            q.close()
+        self.ring.close()
+        self.ring = None
+        self._processes = []
+
+    def stats(self):
+        stats = dict(self.counts)
+        stats.update({
+            "written": 0 if self.ring is None else self.ring.write_pos,
+            "triggers": self._triggers.value,
+            "workers": self.workers,
+            "alive": sum(process.is_alive() for process in self._processes),
+        })
+        return stats
+
+
+def print_result(result):
+    if result["status"] != "scored":
+        print(f"[{result['start']:8.2f}s - {result['end']:8.2f}s] {result['status']}")
+        return
+    print(f"[{result['start']:8.2f}s - {result['end']:8.2f}s] {result['label']} "
+          f"{result['confidence']:.2f}% | latency {result['latency_ms']:.1f} ms | lag {result['lag_ms']:.1f} ms")
+
+
+def print_event(event):
+    print(f"Event {event['id']}: {event['shots']} shot(s) over {event['duration']:.2f} s, "
+          f"{event['label'] or 'Unscored'} ({event['inferences']} window(s) scored)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture and inference in separate processes over shared memory.")
+    parser.add_argument("--file", help="Replay a WAV file instead of the default input device")
+    parser.add_argument("--synthetic", action="store_true", help="Use a synthetic noise + impulse source")
+    parser.add_argument("--duration", type=float, help="Stop the synthetic source after this many seconds")
+    parser.add_argument("--burst-interval", type=float, default=3.0, help="Seconds between synthetic impulses")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Inference processes")
+    parser.add_argument("--threshold", type=float, default=90, help="Trigger level in dB SPL")
+    parser.add_argument("--no-cascade", action="store_true", help="Trigger on the plain level threshold")
+    parser.add_argument("--hop", type=float, default=0.05, help="Hop between level checks in seconds")
+    parser.add_argument("--batch-size", type=int, default=8, help="Windows per invoke")
+    parser.add_argument("--threads", type=int, default=1, help="Interpreter threads per inference process")
+    args = parser.parse_args()
+
+    source_factory = None
+    if args.file:
+        source_factory = functools.partial(FileSource, args.file)
+    elif args.synthetic:
+        source_factory = functools.partial(SyntheticSource, duration=args.duration,
+                                           burst_interval=args.burst_interval)
+    pipeline = ProcessPipeline(source_factory, workers=args.workers, threshold_db=args.threshold,
+                               cascade=not args.no_cascade, hop_seconds=args.hop, batch_size=args.batch_size,
+                               num_threads=args.threads)
+    pipeline.start()
+    print(f"Capture process and {args.workers} inference processes started... Press Ctrl+C to stop.")
+    try:
+        while True:
+            results = pipeline.results(timeout=1.0)
+            if results is None:
+                break
+            for result in results:
+                print_result(result)
+            for event in pipeline.events():
+                print_event(event)
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt received. Stopping.")
+    finally:
+        stats = pipeline.stats()
+        pipeline.stop()
+        for event in pipeline.events():
+            print_event(event)
+        print(f"Pipeline stats: {stats}")
+
+
+if __name__ == "__main__":
+    main()
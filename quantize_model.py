@@ -0,0 +1,144 @@
+"""
+Build a full-integer (int8 weights and activations, int8 input/output) variant of a
+registered model and add it to the model registry.
+
+Activation ranges are calibrated on representative windows cut from WAV recordings, so
+use audio from the microphones the model will run on (background as well as events).
+Needs the optional `ai-edge-quantizer` package.
+
+    python quantize_model.py recordings/ [--source float] [--output model/gunshot_int8.tflite] [--name int8]
+"""
+import argparse
+import os
+import numpy as np
+import model_inference
+from bulk_scan import find_wav_files
+
+SIGNATURE_KEY = "serving_default"
+
+
+def prepare_float_model(model_path):
+    """
+    Return the model as a float flatbuffer the quantizer can calibrate:
+    - operator codes are upgraded from the legacy `deprecated_builtin_code` field, which
+      older converters filled in and the quantizer does not read;
+    - weight-only int8 tensors are dequantized back to float so that weights, biases
+      and activations are quantized together;
+    - a signature is added if the model has none.
+    """
+    from ai_edge_litert.tools import flatbuffer_utils
+    from ai_edge_litert import schema_py_generated as schema
+
+    model = flatbuffer_utils.read_model(model_path)
+    for code in model.operatorCodes:
+        code.builtinCode = max(code.builtinCode, code.deprecatedBuiltinCode)
+
+    subgraph = model.subgraphs[0]
+    for tensor in subgraph.tensors:
+        params = tensor.quantization
+        if tensor.type != schema.TensorType.INT8 or params is None or params.scale is None or not len(params.scale):
+            continue
+        buffer = model.buffers[tensor.buffer]
+        weights = np.frombuffer(bytes(buffer.data), dtype=np.int8).reshape(tensor.shape).astype(np.float32)
+        scale = np.asarray(params.scale, dtype=np.float32)
+        zero_point = np.asarray(params.zeroPoint if params.zeroPoint is not None else 0, dtype=np.float32)
+        if scale.size > 1:
+            shape = [1] * weights.ndim
+            shape[params.quantizedDimension] = -1
+            scale = scale.reshape(shape)
+            zero_point = zero_point.reshape(shape) if zero_point.size > 1 else zero_point
+        buffer.data = np.frombuffer(((weights - zero_point) * scale).astype(np.float32).tobytes(), dtype=np.uint8)
+        tensor.type = schema.TensorType.FLOAT32
+        tensor.quantization = None
+
+    if not model.signatureDefs:
+        signature = schema.SignatureDefT()
+        signature.signatureKey = SIGNATURE_KEY
+        signature.subgraphIndex = 0
+        signature.inputs, signature.outputs = [], []
+        for names, indices, target in (("input", subgraph.inputs, signature.inputs),
+                                       ("output", subgraph.outputs, signature.outputs)):
+            for i, index in enumerate(indices):
+                tensor_map = schema.TensorMapT()
+                tensor_map.name = names if len(indices) == 1 else f"{names}_{i}"
+                tensor_map.tensorIndex = index
+                target.append(tensor_map)
+        model.signatureDefs = [signature]
+    return bytes(flatbuffer_utils.convert_object_to_bytearray(model))
+
+
+def representative_windows(paths, window_seconds=1.0, hop_seconds=0.5, max_windows=500):
+    """
+    Yield model-ready features for overlapping windows of the given WAV files, spread
+    evenly over the files when there are more windows than `max_windows`.
+    """
+    import soundfile as sf
+
+    per_file = max(1, max_windows // max(len(paths), 1))
+    produced = 0
+    for path in paths:
+        audio, sr = sf.read(path, dtype="float32", always_2d=True)
+        audio = audio.mean(axis=1) * 32768.0
+        windows = model_inference.split_windows(audio, int(window_seconds * sr), int(hop_seconds * sr))
+        step = max(1, len(windows) // per_file)
+        for window in windows[::step][:per_file]:
+            yield model_inference.preprocess_audio(window).copy()
+            produced += 1
+            if produced >= max_windows:
+                return
+
+
+def quantize(model_path, features, output_path):
+    """
+    Calibrate on `features` and write a full-integer model to `output_path`.
+    Returns the number of calibration windows used.
+    """
+    from ai_edge_litert.tools import flatbuffer_utils
+    from ai_edge_quantizer import quantizer, recipe
+
+    float_model = prepare_float_model(model_path)
+    signature = flatbuffer_utils.convert_bytearray_to_object(bytearray(float_model)).signatureDefs[0]
+    key = signature.signatureKey.decode() if isinstance(signature.signatureKey, bytes) else signature.signatureKey
+    input_name = signature.inputs[0].name
+    input_name = input_name.decode() if isinstance(input_name, bytes) else input_name
+
+    samples = [{input_name: x} for x in features]
+    if not samples:
+        raise ValueError("No representative windows found")
+    q = quantizer.Quantizer(float_model, recipe.static_wi8_ai8())
+    calibration = q.calibrate({key: samples})
+    q.quantize(calibration).export_model(output_path, overwrite=True)
+    return len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a full-integer quantized model variant.")
+    parser.add_argument("data", nargs="+", help="Representative WAV files or directories")
+    parser.add_argument("--source", default="float", help="Registered model (or .tflite path) to quantize")
+    parser.add_argument("--output", default="model/gunshot_int8.tflite", help="Quantized model path")
+    parser.add_argument("--name", default="int8", help="Registry name for the quantized model")
+    parser.add_argument("--max-windows", type=int, default=500, help="Calibration windows")
+    parser.add_argument("--hop", type=float, default=0.5, help="Hop between calibration windows in seconds")
+    parser.add_argument("--no-register", action="store_true", help="Do not add the model to the registry")
+    args = parser.parse_args()
+
+    source_path, labels = model_inference.resolve_model(args.source)
+    paths = []
+    for item in args.data:
+        if os.path.isdir(item):
+            paths.extend(path for path, _ in find_wav_files(item))
+        else:
+            paths.append(item)
+    features = representative_windows(paths, hop_seconds=args.hop, max_windows=args.max_windows)
+    count = quantize(source_path, features, args.output)
+    print(f"Quantized {source_path} -> {args.output} "
+          f"({os.path.getsize(source_path) / 1024:.0f} KiB -> {os.path.getsize(args.output) / 1024:.0f} KiB, "
+          f"{count} calibration windows from {len(paths)} files)")
+    if not args.no_register:
+        model_inference.register_model(args.name, args.output, labels,
+                                       f"Full-integer build of {args.source}, calibrated on {count} windows")
+        print(f"Registered as '{args.name}' in {model_inference.MODEL_REGISTRY_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import argparse
+import time
+import numpy as np
+from audio_capture import AudioCapture, FileSource, SyntheticSource
+from detection_cascade import DetectionCascade, DEFAULT_CASCADE
+import metrics
+from model_inference import StreamingMelSpectrogram, run_inference, run_inference_batch_features
+
+
+class StreamingDetector:
+    """
+    Runs the model on overlapping windows pulled from an AudioCapture ring buffer.
+
+    The ring buffer doubles as the pre-trigger history: when the level gate fires at
+    stream position t, windows starting from t - pre_trigger up to t + post_trigger are
+    scored as soon as the audio they cover has arrived. With `continuous=True` every hop
+    is scored and the level gate is ignored; `incremental_features=True` then computes
+    model features hop by hop with a StreamingMelSpectrogram, transforming only the new
+    STFT frames, and windows carry them under "features" instead of audio. With
+    `copy_audio=False` windows carry only their position, for consumers that read the
+    ring themselves (see process_pipeline).
+    """
+
+    def __init__(self, audio_capture, window_seconds=1.0, hop_seconds=0.25,
+                 pre_trigger_seconds=0.5, post_trigger_seconds=1.0, continuous=False, copy_audio=True,
+                 incremental_features=False):
+        self.capture = audio_capture
+        self.rate = audio_capture.RATE
+        self.window = int(window_seconds * self.rate)
+        self.hop = int(hop_seconds * self.rate)
+        self.pre_trigger = int(pre_trigger_seconds * self.rate)
+        self.post_trigger = int(post_trigger_seconds * self.rate)
+        self.continuous = continuous
+        self.copy_audio = copy_audio
+        if incremental_features and not continuous:
+            raise ValueError("Incremental features need continuous scoring")
+        self.spectrogram = StreamingMelSpectrogram(self.rate) if incremental_features else None
+        if self.pre_trigger + self.window > audio_capture.ring.capacity:
+            raise ValueError("Ring buffer is too short for the requested pre-trigger history")
+
+        self._hop_buffer = np.empty(self.hop, dtype=np.float32)
+        self._pending = []  # (start, trigger, volume_db) of windows waiting to be scored
+        self._cursor = audio_capture.ring.read_pos  # Start of the next hop to meter
+        self._history = self.pre_trigger + self.window  # Samples kept behind the cursor
+        self._next_start = 0  # First window start not yet scheduled
+        self._last_trigger = None
+        self.last_volume_db = None
+        self.triggers = 0
+        self.windows_scored = 0
+        self.windows_missed = 0  # Scheduled windows that fell out of the history
+
+    def _schedule(self, first, last, trigger, volume_db):
+        # Each window keeps the trigger and level that scheduled it, even if a newer
+        # trigger fires before the window is ready
+        start = max(first, self._next_start, 0)
+        while start <= last:
+            self._pending.append((start, trigger, volume_db))
+            start += self.hop
+        self._next_start = start
+
+    def _extract(self, start, trigger, volume_db):
+        ring = self.capture.ring
+        window = {
+            "start": start,
+            "trigger": trigger,
+            "volume_db": volume_db,
+            "ready_time": time.perf_counter(),
+        }
+        if self.spectrogram is not None:
+            # Continuous windows end at the newest hop, which the spectrogram has already seen
+            window["features"] = self.spectrogram.features(out=np.empty((1, 128, 128, 1), dtype=np.float32))
+            return window
+        if not self.copy_audio:
+            if start < ring.write_pos - ring.capacity:
+                self.windows_missed += 1
+                return None
+            return window
+        audio = np.empty(self.window, dtype=np.float32)
+        if not ring.copy_at(start, self.window, audio):
+            self.windows_missed += 1
+            return None
+        # preprocess_audio expects int16-scaled samples
+        audio *= 32768.0
+        window["audio"] = audio
+        return window
+
+    def make_result(self, window, label, confidence):
+        """
+        Build the result dict for a window returned by `advance` once it has been scored.
+        """
+        latency = time.perf_counter() - window["ready_time"]
+        start, trigger, volume_db = window["start"], window["trigger"], window["volume_db"]
+        self.windows_scored += 1
+        return {
+            "start": start / self.rate,
+            "end": (start + self.window) / self.rate,
+            "trigger": None if trigger is None else trigger / self.rate,
+            "label": label,
+            "confidence": float(confidence),
+            "volume_db": None if volume_db is None else float(volume_db),
+            "latency_ms": latency * 1000,
+            # How far behind the live edge of the stream this result arrived
+            "lag_ms": (self.capture.ring.write_pos - start - self.window) / self.rate * 1000,
+        }
+
+    @property
+    def last_trigger(self):
+        """
+        Stream position of the most recent trigger, or None.
+        """
+        return self._last_trigger
+
+    @property
+    def hop_end(self):
+        """
+        Stream position the audio must reach before the next hop can be consumed.
+        """
+        return self._cursor + self.hop
+
+    @property
+    def finished(self):
+        """
+        True once a finite source is exhausted; live sources never finish.
+        """
+        finished = getattr(self.capture.source, "finished", None)
+        return finished is not None and finished.is_set()
+
+    def ready(self):
+        """
+        True when `advance` can consume a hop without waiting.
+        """
+        return self.capture.ring.write_pos >= self.hop_end
+
+    def advance(self, timeout=1.0):
+        """
+        Consume one hop of audio, update the trigger and return the windows that became
+        ready to score (dicts holding an int16-scaled copy of the audio under "audio").
+        Returns None once the source is exhausted or nothing arrived within `timeout`
+        (see `finished`).
+        """
+        capture = self.capture
+        ring = capture.ring
+        if not capture.wait_for(self._cursor + self.hop, timeout=timeout):
+            return None
+        ring.check_overrun()
+        if self._cursor < ring.read_pos:
+            # Fell more than a buffer behind; resume from the oldest retained audio
+            self._cursor = ring.read_pos
+            if self.spectrogram is not None:
+                self.spectrogram.reset()
+        block_start = self._cursor
+        block = self._hop_buffer
+        if not ring.copy_at(block_start, self.hop, block):
+            return []
+        self._cursor += self.hop
+        # Keep the pre-trigger history readable while letting the producer reuse older audio
+        ring.release(self._cursor - self._history)
+        if self.spectrogram is not None:
+            self.spectrogram.push(block)
+        volume_db = capture.calculate_db(capture.moving_average(capture.get_rms(block)))
+        self.last_volume_db = volume_db
+
+        cooldown = capture.cooldown_time * self.rate
+        if self.continuous:
+            self._schedule(block_start + self.hop - self.window, block_start + self.hop - self.window,
+                           self._last_trigger, volume_db)
+        elif (self._last_trigger is None or block_start - self._last_trigger > cooldown) and \
+                capture.should_trigger(block, volume_db):
+            self._last_trigger = block_start
+            self.triggers += 1
+            metrics.inc("triggers_total")
+            last = max(block_start - self.pre_trigger, block_start + self.post_trigger - self.window)
+            self._schedule(block_start - self.pre_trigger, last, block_start, volume_db)
+
+        windows = []
+        write_pos = ring.write_pos
+        while self._pending and self._pending[0][0] + self.window <= write_pos:
+            window = self._extract(*self._pending.pop(0))
+            if window is not None:
+                windows.append(window)
+        return windows
+
+    def process_next(self):
+        """
+        Consume one hop of audio and score every window that became ready.
+        Returns a list of result dicts (empty if no audio arrived in time), or None once
+        the source is exhausted.
+        """
+        windows = self.advance()
+        if windows is None:
+            # A slow source is not an exhausted one
+            return None if self.finished and not self.ready() else []
+        results = []
+        for window in windows:
+            if "features" in window:
+                labels, confidences = run_inference_batch_features(window["features"], batch_size=1)
+                label, confidence = labels[0], confidences[0]
+            else:
+                label, confidence = run_inference(window["audio"])
+            results.append(self.make_result(window, label, confidence))
+        return results
+
+    def run(self, on_result=None, should_stop=None):
+        """
+        Process the stream until it ends or `should_stop()` returns True.
+        """
+        while should_stop is None or not should_stop():
+            results = self.process_next()
+            if results is None:
+                break
+            for result in results:
+                if on_result is not None:
+                    on_result(result)
+
+    def stats(self):
+        stats = self.capture.stats()
+        stats.update({
+            "triggers": self.triggers,
+            "windows_scored": self.windows_scored,
+            "windows_missed": self.windows_missed,
+        })
+        return stats
+
+
+def print_result(result):
+    print(f"[{result['start']:8.2f}s - {result['end']:8.2f}s] {result['label']} "
+          f"{result['confidence']:.2f}% | latency {result['latency_ms']:.1f} ms | lag {result['lag_ms']:.1f} ms")
+
+
+def start_streaming_detector_process():
+    parser = argparse.ArgumentParser(description="Sliding-window streaming gunshot detection.")
+    parser.add_argument("--file", help="Replay a WAV file instead of the default input device")
+    parser.add_argument("--synthetic", action="store_true", help="Use a synthetic noise + impulse source")
+    parser.add_argument("--fast", action="store_true", help="Replay sources as fast as possible")
+    parser.add_argument("--hop", type=float, default=0.25, help="Hop between windows in seconds")
+    parser.add_argument("--pre", type=float, default=0.5, help="Pre-trigger history in seconds")
+    parser.add_argument("--post", type=float, default=1.0, help="Post-trigger span in seconds")
+    parser.add_argument("--threshold", type=float, default=-27, help="Trigger level in dBFS")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Trigger on the detection cascade instead of the plain level threshold")
+    parser.add_argument("--spl-threshold", type=float, default=None,
+                        help="Level gate of the cascade in calibrated dB SPL")
+    parser.add_argument("--continuous", action="store_true", help="Score every hop, ignoring the trigger")
+    parser.add_argument("--incremental", action="store_true",
+                        help="With --continuous, compute features incrementally instead of per window")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this local port")
+    parser.add_argument("--metrics-file", help="Periodically write Prometheus metrics to this file")
+    args = parser.parse_args()
+    _, metrics_writer = metrics.start_exporters(args.metrics_port, args.metrics_file)
+
+    source = None
+    if args.file:
+        source = FileSource(args.file, realtime=not args.fast)
+    elif args.synthetic:
+        source = SyntheticSource(realtime=not args.fast, duration=30 if args.fast else None)
+    cascade = None
+    if args.cascade:
+        cascade = DetectionCascade.from_config(DEFAULT_CASCADE, rate=AudioCapture.RATE)
+        if args.spl_threshold is not None:
+            cascade.level_gate.threshold_db = args.spl_threshold
+    audio_capture = AudioCapture(threshold_db=args.threshold, source=source, cascade=cascade)
+    detector = StreamingDetector(audio_capture, hop_seconds=args.hop, pre_trigger_seconds=args.pre,
+                                 post_trigger_seconds=args.post, continuous=args.continuous,
+                                 incremental_features=args.incremental)
+    print("Streaming detector started... Press Ctrl+C to stop.")
+    try:
+        detector.run(on_result=print_result)
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt received. Exiting streaming detector.")
+    finally:
+        print(f"Detector stats: {detector.stats()}")
+        audio_capture.cleanup()
+        if metrics_writer is not None:
+            metrics_writer.stop()
+
+
+if __name__ == "__main__":
+    start_streaming_detector_process()
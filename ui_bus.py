@@ -0,0 +1,130 @@
+import collections
+import logging
+import threading
+import time
+
+
+class PeakHold:
+    """
+    Peak-hold meter: keeps the highest reading for `hold_seconds`, then decays towards
+    the current level by `decay_db_per_second`.
+    """
+
+    def __init__(self, hold_seconds=1.5, decay_db_per_second=20.0):
+        self.hold_seconds = hold_seconds
+        self.decay_db_per_second = decay_db_per_second
+        self.peak = None
+        self._peak_time = 0.0
+        self._last_update = None
+
+    def update(self, value, now=None):
+        now = time.monotonic() if now is None else now
+        if self.peak is None or value >= self.peak:
+            self.peak = value
+            self._peak_time = now
+        elif now - self._peak_time > self.hold_seconds:
+            elapsed = now - max(self._peak_time + self.hold_seconds, self._last_update or now)
+            self.peak = max(value, self.peak - self.decay_db_per_second * elapsed)
+        self._last_update = now
+        return self.peak
+
+
+class UiEventBus:
+    """
+    Thread-safe hand-off from the capture and inference threads to the Tk main loop.
+
+    Background threads publish freely; the main thread drains the bus with `after()` at
+    `fps` frames per second. Volume readings are coalesced into the latest value and the
+    peak since the previous frame, and other events are delivered to their handler as one
+    list per frame. At most `max_queued` events wait for the main thread; beyond that the
+    oldest are dropped and counted, so a stalled UI cannot grow the queue without bound.
+    """
+
+    def __init__(self, fps=15, max_events_per_frame=200, max_queued=10000):
+        self.fps = fps
+        self.max_events_per_frame = max_events_per_frame
+        self._lock = threading.Lock()
+        self._volume = None
+        self._volume_peak = None
+        self._events = collections.deque(maxlen=max_queued)
+        self._handlers = {}
+        self._volume_handler = None
+        self._widget = None
+        self._after_id = None
+        self.frames = 0
+        self.coalesced_volumes = 0
+        self.dropped_events = 0
+
+    def publish_volume(self, volume_db):
+        with self._lock:
+            if self._volume is not None:
+                self.coalesced_volumes += 1
+            self._volume = volume_db
+            if self._volume_peak is None or volume_db > self._volume_peak:
+                self._volume_peak = volume_db
+
+    def publish(self, kind, payload):
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped_events += 1
+                if self.dropped_events == 1:
+                    logging.error("UI event queue is full, dropping the oldest events")
+            self._events.append((kind, payload))
+
+    def subscribe(self, kind, handler):
+        """
+        `handler(payloads)` is called on the main thread with a list of payloads.
+        """
+        self._handlers[kind] = handler
+
+    def subscribe_volume(self, handler):
+        """
+        `handler(latest_db, peak_db)` is called on the main thread at most once per frame.
+        """
+        self._volume_handler = handler
+
+    def start(self, widget):
+        self._widget = widget
+        self._schedule()
+
+    def stop(self):
+        if self._widget is not None and self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+        self._after_id = None
+        self._widget = None
+
+    def _schedule(self):
+        if self._widget is not None:
+            self._after_id = self._widget.after(max(1, int(1000 / self.fps)), self.drain)
+
+    def drain(self):
+        """
+        Deliver everything published since the last frame. Runs on the main thread.
+        """
+        with self._lock:
+            volume, peak = self._volume, self._volume_peak
+            self._volume = self._volume_peak = None
+            batch = []
+            while self._events and len(batch) < self.max_events_per_frame:
+                batch.append(self._events.popleft())
+        try:
+            # Each handler runs on its own, so one failing handler cannot discard the
+            # events of the others (detections are logged by their handler)
+            if volume is not None and self._volume_handler is not None:
+                try:
+                    self._volume_handler(volume, peak)
+                except Exception as e:
+                    logging.error(f"Error updating UI volume: {e}")
+            grouped = collections.OrderedDict()
+            for kind, payload in batch:
+                grouped.setdefault(kind, []).append(payload)
+            for kind, payloads in grouped.items():
+                handler = self._handlers.get(kind)
+                if handler is not None:
+                    try:
+                        handler(payloads)
+                    except Exception as e:
+                        logging.error(f"Error handling UI event {kind}: {e}")
+        finally:
+            self.frames += 1
+            self._schedule()